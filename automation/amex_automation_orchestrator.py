@@ -1,13 +1,22 @@
+import functools
 import os
 import time
 
+import pandas as pd
+
 from dataclasses import dataclass, field
 
 from business_logic.workbook_manager import TemplateWorkbookManager, AmexWorkbookManager
-from business_logic.pdf_processor import PDFPlumberProcessor, PDFOCRProcessor, GeneralPattern, VendorSpecificPattern
+from business_logic.pdf_processor import PDFPlumberProcessor, PDFOCRProcessor, GeneralPattern, VendorSpecificPattern, VendorOCRProfile
 from business_logic.pdf_processing_manager import PDFProcessingManager
+from business_logic.extraction_cache import ExtractionCache
 from business_logic.invoice_matching_manager import invoice_matching_manager
-from utils.utilities import print_dataframe
+from business_logic.invoice_manifest import InvoiceManifest
+from business_logic.invoice_pipeline import InvoicePipeline
+from business_logic.update_strategies import TemplateInvoiceUpdateStrategy, TemplateTransactionDetails2UpdateStrategy
+from utils.utilities import print_dataframe, progress_reporting
+from utils.invoice_discovery import InvoiceDiscovery
+from utils.instrumentation import instrumentation
 
 
 @dataclass
@@ -31,12 +40,37 @@ class SystemConfigurations:
 
 	amex_template_workbooks_path: str = field(default="H:/Amex Automation")  # The directory where the AMEX Statement workbook and Template - Master workbook is located 6/16/2024
 	template_workbook_name: str = field(default="Template - Master.xlsm")  # This is the workbook that we will be storing the intermediary data for matching AMEX Statement transactions and invoices for 6/15/2024.
+	pdf_processing_workers: int = field(default=1)  # Number of worker processes extracting invoice pdf data, 1 extracts every pdf one at a time in this process
+	streaming_extraction: bool = field(default=False)  # Read invoice pages in page_priority order and stop once a total and date are found
+	page_priority: tuple = field(default=('first', 'last', 'rest'))
+	use_ocr_profiles: bool = field(default=True)  # OCR image-only invoices with their vendor's VendorOCRProfile (resolution, preprocessing, bands) instead of every whole page at 200 dpi
+	use_extraction_cache: bool = field(default=True)  # Reuse extraction results of unchanged invoice pdfs from previous runs
+	extraction_cache_folder_name: str = field(default=".extraction_cache")  # Created inside amex_template_workbooks_path
+	extraction_cache_max_size_bytes: int = field(default=512 * 1024 * 1024)
+	invoice_discovery: str = field(default="macro")  # "macro" lists the invoices with template_list_invoice_name_and_path_macro_name, "python" with InvoiceDiscovery without the worksheet
+	invoice_discovery_workers: int = field(default=16)  # Threads listing the invoices folder on the share when invoice_discovery is "python"
+	workbook_backend: str = field(default="xlwings")  # "xlwings" drives the workbooks in Excel, "openpyxl" edits the files without Excel and runs the Python equivalents of the macros
+	matching_assignment_mode: str = field(default="greedy")  # "greedy" matches invoices in invoice order, "global" assigns the exact matches of all invoices at once
+	incremental_processing: bool = field(default=False)  # Only extract the invoices added or changed since the last run and update the worksheet rows in place
+	invoice_manifest_file_name: str = field(default=".invoice_manifest.json")  # Created inside amex_template_workbooks_path, remembers the invoices of the last run
+	instrumentation_enabled: bool = field(default=True)  # Record stage timings and counters, see write_instrumentation_report
+	instrumentation_folder_name: str = field(default=".instrumentation")  # Created inside amex_template_workbooks_path, a summary and a Chrome trace per run
+	progress_mode: str = field(default="bar")  # "bar" shows progress bars and DataFrame tables, "log" writes JSON lines to progress_log_file_name instead, "off" for unattended batch runs
+	progress_log_file_name: str = field(default="progress.log")  # Created inside amex_template_workbooks_path when progress_mode is "log"
+	pipeline_queue_size: int = field(default=32)  # run_invoice_pipeline: most invoices waiting between two stages and most pdfs being extracted at once
+	pipeline_write_batch_size: int = field(default=200)  # run_invoice_pipeline: most Invoices worksheet rows written at once
+	excel_bulk_sessions: bool = field(default=True)  # Run every stage with manual calculation, no screen updates and no events, recalculating Template - Master.xlsm once at the end of the stage
 
 	# init=False ensures that can't be set when creating a new instance, will be calculated in __post_init__ 7/29/2024
 	amex_workbook_path: str = field(default=None, init=False)
 	template_workbook_path: str = field(default=None, init=False)
+	extraction_cache_path: str = field(default=None, init=False)
+	invoice_manifest_path: str = field(default=None, init=False)
+	instrumentation_path: str = field(default=None, init=False)
+	progress_log_path: str = field(default=None, init=False)
 
 	vendor_specific_pattern = VendorSpecificPattern()
+	vendor_ocr_profile = VendorOCRProfile()
 	general_pattern = GeneralPattern()
 	# primary_strategy = []
 	# fallback_strategy = VendorOnlyStrategy()
@@ -50,6 +84,25 @@ class SystemConfigurations:
 			self.template_workbook_path = os.path.join(self.amex_template_workbooks_path, self.template_workbook_name)
 		if self.amex_workbook_name and self.amex_template_workbooks_path:
 			self.amex_workbook_path = os.path.join(self.amex_template_workbooks_path, self.amex_workbook_name)
+		if self.extraction_cache_folder_name and self.amex_template_workbooks_path:
+			self.extraction_cache_path = os.path.join(self.amex_template_workbooks_path, self.extraction_cache_folder_name)
+		if self.invoice_manifest_file_name and self.amex_template_workbooks_path:
+			self.invoice_manifest_path = os.path.join(self.amex_template_workbooks_path, self.invoice_manifest_file_name)
+		if self.instrumentation_folder_name and self.amex_template_workbooks_path:
+			self.instrumentation_path = os.path.join(self.amex_template_workbooks_path, self.instrumentation_folder_name)
+		if self.progress_log_file_name and self.amex_template_workbooks_path:
+			self.progress_log_path = os.path.join(self.amex_template_workbooks_path, self.progress_log_file_name)
+
+
+def _in_bulk_session(stage):
+	# The stage's writes to Template - Master.xlsm don't each trigger a recalculation of its XLOOKUP/TEXTJOIN formulas and a repaint
+	@functools.wraps(stage)
+	def stage_in_bulk_session(self, *args, **kwargs):
+		if not self.systemconfig.excel_bulk_sessions:
+			return stage(self, *args, **kwargs)
+		with self.template_workbook_manager.workbook.bulk_session():
+			return stage(self, *args, **kwargs)
+	return stage_in_bulk_session
 
 
 class AmexAutomationOrchestrator:
@@ -71,15 +124,35 @@ class AmexAutomationOrchestrator:
 		# self.macro_parameter_2 = macro_parameter_2
 
 		self.systemconfig = system_configurations
+		# A new run starts with empty spans and counters
+		instrumentation.enabled = self.systemconfig.instrumentation_enabled
+		instrumentation.reset()
+		progress_reporting.set_mode(self.systemconfig.progress_mode, self.systemconfig.progress_log_path if self.systemconfig.progress_mode == "log" else None)
+		# Shared by the extraction cache and the invoice manifest, both are only valid for the same patterns, statement dates and extraction settings
+		self.extraction_fingerprint = ExtractionCache.build_fingerprint(
+			self.systemconfig.general_pattern, self.systemconfig.vendor_specific_pattern, self.systemconfig.start_date, self.systemconfig.end_date,
+			{'streaming_extraction': self.systemconfig.streaming_extraction, 'page_priority': list(self.systemconfig.page_priority),
+			 'ocr_profiles': list(self.systemconfig.vendor_ocr_profile.get_profiles().items()) if self.systemconfig.use_ocr_profiles else None}
+		)
+		self.extraction_cache = None
+		if self.systemconfig.use_extraction_cache:
+			self.extraction_cache = ExtractionCache(self.systemconfig.extraction_cache_path, self.extraction_fingerprint, self.systemconfig.extraction_cache_max_size_bytes)
 		self.pdf_proc_mng = PDFProcessingManager(
 			PDFPlumberProcessor(self.systemconfig.start_date, self.systemconfig.end_date, self.systemconfig.vendor_specific_pattern, self.systemconfig.general_pattern),
-			PDFOCRProcessor(self.systemconfig.start_date, self.systemconfig.end_date, self.systemconfig.general_pattern)
+			PDFOCRProcessor(self.systemconfig.start_date, self.systemconfig.end_date, self.systemconfig.general_pattern, self.systemconfig.vendor_ocr_profile if self.systemconfig.use_ocr_profiles else None),
+			max_workers=self.systemconfig.pdf_processing_workers,
+			extraction_cache=self.extraction_cache,
+			streaming_extraction=self.systemconfig.streaming_extraction,
+			page_priority=self.systemconfig.page_priority
 		)
 		self.invoice_matching_manager = invoice_matching_manager  # Using a list of strategies to match invoices to transactions. ONLY ONE INSTANCE 6/22/2024.
-		self.template_workbook_manager = TemplateWorkbookManager(self.systemconfig.template_workbook_name, self.systemconfig.template_workbook_path)
+		self.invoice_matching_manager.set_assignment_mode(self.systemconfig.matching_assignment_mode)
+		self.template_workbook_manager = TemplateWorkbookManager(self.systemconfig.template_workbook_name, self.systemconfig.template_workbook_path, self.systemconfig.workbook_backend)
 
-	# self.amex_workbook_manager = AmexWorkbookManager(self.amex_statement, self.amex_workbook_path)  # When this is not commented and program runs then confusion of macro to run Workbook error 7/21/2024
+	# self.amex_workbook_manager = AmexWorkbookManager(self.amex_statement, self.amex_workbook_path, self.systemconfig.workbook_backend)  # When this is not commented and program runs then confusion of macro to run Workbook error 7/21/2024
 
+	@instrumentation.span('prepare_template_workbook')
+	@_in_bulk_session
 	def prepare_template_workbook(self):
 
 		amex_statement = self.amex_workbook_manager.get_worksheet(self.systemconfig.amex_transaction_details_worksheet_name)
@@ -96,8 +169,18 @@ class AmexAutomationOrchestrator:
 		# After updating the worksheet, resize the table 7/7/2024
 		self.template_workbook_manager.workbook.call_macro_workbook(self.systemconfig.template_resize_table_macro_name)
 
+	@instrumentation.span('process_invoices_worksheet')
+	@_in_bulk_session
 	def process_invoices_worksheet(self):
 
+		if self.systemconfig.incremental_processing:
+			self._process_invoices_incrementally()
+			return
+
+		if self.systemconfig.invoice_discovery == "python":
+			self._process_discovered_invoices()
+			return
+
 		# Get initial invoice names and invoice file paths for the "Invoices" worksheet of Template workbook calling the macro "ListFilesInSpecificOrder"
 		self.template_workbook_manager.workbook.call_macro_workbook(self.systemconfig.template_list_invoice_name_and_path_macro_name, self.systemconfig.macro_parameter_1, self.systemconfig.macro_parameter_2)
 		invoice_worksheet = self.template_workbook_manager.get_worksheet(self.systemconfig.template_invoices_worksheet_name)
@@ -115,6 +198,76 @@ class AmexAutomationOrchestrator:
 		# Save the changes
 		self.template_workbook_manager.workbook.save()
 
+	def _process_discovered_invoices(self):
+		# Invoices are listed in Python and handed straight to the pdf_processing_manager, the Invoices worksheet is only written once at the end
+		invoice_discovery = InvoiceDiscovery(max_workers=self.systemconfig.invoice_discovery_workers)
+		invoice_records = invoice_discovery.discover(self.systemconfig.macro_parameter_1, self.systemconfig.macro_parameter_2)
+
+		xlookup_table_worksheet = self.template_workbook_manager.get_worksheet(self.systemconfig.template_x_lookup_table_worksheet_name)
+		self.pdf_proc_mng.populate_pdf_proc_mng_df_from_records(invoice_records, xlookup_table_worksheet)
+
+		# Every discovered invoice gets a row, the failed pdfs with only their File Name and File Path like a listing by the macro
+		invoice_worksheet = self.template_workbook_manager.get_worksheet(self.systemconfig.template_invoices_worksheet_name)
+		invoice_worksheet.set_strategy(TemplateInvoiceUpdateStrategy(replace_rows=True))
+		invoice_worksheet.update_sheet(self.pdf_proc_mng.get_invoices_df())
+
+		self.template_workbook_manager.workbook.save()
+
+	def _process_invoices_incrementally(self):
+		# The folder is always listed in Python here, the manifest needs the size and modification time of every pdf
+		invoices_folder_path = os.path.join(self.systemconfig.macro_parameter_1, self.systemconfig.macro_parameter_2)
+		invoice_discovery = InvoiceDiscovery(max_workers=self.systemconfig.invoice_discovery_workers)
+		file_entries = invoice_discovery.list_invoice_files(invoices_folder_path)
+
+		invoice_manifest = InvoiceManifest(self.systemconfig.invoice_manifest_path, invoices_folder_path, self.extraction_fingerprint)
+		manifest_diff = invoice_manifest.diff(file_entries)
+		print(f"Invoices: {len(manifest_diff.new)} new, {len(manifest_diff.changed)} changed, {len(manifest_diff.unchanged)} unchanged, {len(manifest_diff.removed)} removed")
+
+		# Only the new and changed pdfs are extracted
+		changed_file_entries = manifest_diff.new + manifest_diff.changed
+		xlookup_table_worksheet = self.template_workbook_manager.get_worksheet(self.systemconfig.template_x_lookup_table_worksheet_name)
+		# Hashed once here, for the extraction cache and for the manifest entries recorded below
+		content_hashes = {file_entry.file_path: invoice_manifest.content_hash(file_entry.file_path) for file_entry in changed_file_entries} if self.extraction_cache is not None else None
+		self.pdf_proc_mng.populate_pdf_proc_mng_df_from_records(((file_entry.file_name, file_entry.file_path) for file_entry in changed_file_entries), xlookup_table_worksheet, content_hashes)
+
+		# The failed pdfs stay out of the manifest so they are tried again on the next run
+		extracted_by_file_path = {record['File Path']: record for record in self.pdf_proc_mng.get_pdf_proc_mng_df().to_dict('records')}
+		for file_entry in changed_file_entries:
+			if file_entry.file_path in extracted_by_file_path:
+				extracted = extracted_by_file_path[file_entry.file_path]
+				invoice_manifest.record(file_entry, {column: extracted[column] for column in ('Amount', 'Vendor', 'Date')})
+		# The vendor comes from the file name and the Xlookup table, which keeps growing, so the vendor of every invoice is resolved again in one call
+		# and the unchanged invoices whose vendor changed are rewritten too
+		changed_file_paths = {file_entry.file_path for file_entry in changed_file_entries}
+		resolved_vendors = self.pdf_proc_mng.text_processor.resolve_vendors(file_entry.file_name for file_entry in manifest_diff.unchanged)
+		for file_entry, vendor in zip(manifest_diff.unchanged, resolved_vendors):
+			if invoice_manifest.get_extracted(file_entry.file_path)['Vendor'] != vendor:
+				invoice_manifest.update_extracted(file_entry.file_path, 'Vendor', vendor)
+				changed_file_paths.add(file_entry.file_path)
+		# The rows of removed pdfs are left in the worksheet, they may already be matched to transactions,
+		# so the pdfs stay in the manifest marked as removed and every run reports their rows until the statement starts over
+		for file_path in manifest_diff.removed:
+			print(f"Invoice no longer in the folder, its Invoices worksheet row is left as it is: {file_path}")
+			invoice_manifest.mark_removed(file_path)
+
+		# Every invoice of the folder with its extracted data from the manifest, the unchanged ones are only written when their row is missing
+		invoices_df = pd.DataFrame(
+			[
+				{'File Name': file_entry.file_name, 'File Path': file_entry.file_path, **(invoice_manifest.get_extracted(file_entry.file_path) or {})}
+				for file_entry in file_entries
+			],
+			columns=['File Name', 'File Path', 'Amount', 'Vendor', 'Date']
+		)
+		invoice_worksheet = self.template_workbook_manager.get_worksheet(self.systemconfig.template_invoices_worksheet_name)
+		invoice_worksheet.set_strategy(TemplateInvoiceUpdateStrategy(in_place=True, changed_file_paths=changed_file_paths))
+		invoice_worksheet.update_sheet(invoices_df)
+
+		self.template_workbook_manager.workbook.save()
+		# Saved after the workbook so an interrupted run extracts the same invoices again
+		invoice_manifest.save()
+
+	@instrumentation.span('process_transaction_details_2_worksheet')
+	@_in_bulk_session
 	def process_transaction_details_2_worksheet(self) -> None:
 
 		# Convert the Invoice worksheet into DataFrame
@@ -149,8 +302,46 @@ class AmexAutomationOrchestrator:
 
 		print_dataframe(transaction_details_worksheet_df, "Transaction Details 2 DataFrame After Matching Sequencing File Names:")
 
+		if self.systemconfig.incremental_processing:
+			# Only the cells that changed since the last run are written, e.g. the File Names of the new invoices' matches
+			transaction_details_worksheet.set_strategy(TemplateTransactionDetails2UpdateStrategy(in_place=True))
 		transaction_details_worksheet.update_sheet(transaction_details_worksheet_df)
 
+	@instrumentation.span('run_invoice_pipeline')
+	@_in_bulk_session
+	def run_invoice_pipeline(self) -> None:
+		"""
+        Pipeline mode of process_invoices_worksheet followed by process_transaction_details_2_worksheet: the pdfs are extracted, matched and
+        written to the Invoices worksheet concurrently by the InvoicePipeline, then Transaction Details 2 is written once the last invoice is matched.
+
+        :return: None
+        """
+		if self.systemconfig.incremental_processing:
+			raise ValueError("run_invoice_pipeline processes every invoice, it can't be combined with incremental_processing")
+
+		invoice_worksheet = self.template_workbook_manager.get_worksheet(self.systemconfig.template_invoices_worksheet_name)
+		if self.systemconfig.invoice_discovery == "python":
+			# The whole folder is listed before the first invoice is handed on, the order needs the modification time of every pdf
+			invoice_discovery = InvoiceDiscovery(max_workers=self.systemconfig.invoice_discovery_workers)
+			invoice_records = invoice_discovery.discover(self.systemconfig.macro_parameter_1, self.systemconfig.macro_parameter_2)
+		else:
+			self.template_workbook_manager.workbook.call_macro_workbook(self.systemconfig.template_list_invoice_name_and_path_macro_name, self.systemconfig.macro_parameter_1, self.systemconfig.macro_parameter_2)
+			listed_invoices_df = invoice_worksheet.read_data_as_dataframe()
+			invoice_records = zip(listed_invoices_df['File Name'].tolist(), listed_invoices_df['File Path'].tolist())
+
+		invoice_pipeline = InvoicePipeline(self.pdf_proc_mng, self.invoice_matching_manager, self.systemconfig.pipeline_queue_size, self.systemconfig.pipeline_write_batch_size)
+		transaction_details_df = invoice_pipeline.run(
+			invoice_records,
+			invoice_worksheet,
+			self.template_workbook_manager.get_worksheet(self.systemconfig.template_x_lookup_table_worksheet_name),
+			self.template_workbook_manager.get_worksheet(self.systemconfig.template_transaction_details_2_worksheet_name)
+		)
+		print_dataframe(transaction_details_df, "Transaction Details 2 DataFrame After Matching Sequencing File Names:")
+
+		self.template_workbook_manager.workbook.save()
+
+	@instrumentation.span('process_amex_transaction_details_worksheet')
+	@_in_bulk_session
 	def process_amex_transaction_details_worksheet(self) -> None:
 		transaction_details_worksheet = self.template_workbook_manager.get_worksheet(self.systemconfig.template_transaction_details_2_worksheet_name)
 		transaction_details_worksheet_df = transaction_details_worksheet.read_data_as_dataframe()
@@ -158,6 +349,21 @@ class AmexAutomationOrchestrator:
 		amex_worksheet = self.amex_workbook_manager.get_worksheet(self.systemconfig.amex_transaction_details_worksheet_name)
 		amex_worksheet.update_sheet(transaction_details_worksheet)
 
+	def write_instrumentation_report(self) -> None:
+		"""
+        Print the timing and counters of the run and write them to instrumentation_path,
+        run_<time>.json with the summary and run_<time>.trace.json to open in chrome://tracing or https://ui.perfetto.dev.
+
+        :return: None
+        """
+		if not self.systemconfig.instrumentation_enabled:
+			return
+		instrumentation.print_summary()
+		os.makedirs(self.systemconfig.instrumentation_path, exist_ok=True)
+		run_name = f"run_{time.strftime('%Y%m%d_%H%M%S')}"
+		instrumentation.write_summary_json(os.path.join(self.systemconfig.instrumentation_path, f"{run_name}.json"))
+		instrumentation.write_chrome_trace(os.path.join(self.systemconfig.instrumentation_path, f"{run_name}.trace.json"))
+
 
 # "H:/Amex Automation" Automation Truth--> amex_path
 # "C:/Users/brand/IdeaProjects/Amex Automation DATA" -computer
@@ -177,8 +383,12 @@ options = SystemConfigurations(
 )
 
 # Make sure to have "r" and \ at the end to treat as raw string parameter 6/15/2024
-controller = AmexAutomationOrchestrator(options)
+# Guarded so the worker processes started for parallel pdf extraction don't open the workbooks again when they import this module
+if __name__ == "__main__":
+	controller = AmexAutomationOrchestrator(options)
 # controller.prepare_template_workbook() # Working on this 7/21/2024
 # controller.process_invoices_worksheet()
 # controller.process_transaction_details_2_worksheet()
+# controller.run_invoice_pipeline()  # Instead of process_invoices_worksheet and process_transaction_details_2_worksheet
 # controller.process_amex_transaction_details_worksheet()
+# controller.write_instrumentation_report()  # At the end of every run, main.process_amex does so
@@ -0,0 +1,94 @@
+"""
+Micro-benchmark of the date parsing done while extracting a month of invoices:
+the statement window parsed on every extract_date call, every date string the date patterns find, and the PDF.date setter.
+
+Run from the repository root:
+    python -m benchmarks.bench_date_parsing
+"""
+import random
+import time
+from datetime import date, timedelta
+
+import dateparser
+from tabulate import tabulate
+
+from utils.date_parsing import DateParsingService
+
+START_DATE = "01/21/2024"
+END_DATE = "2/21/2024"
+INVOICES_PER_MONTH = 250
+DATES_FOUND_PER_INVOICE = 8  # Invoice date, due date, service period, order date... found by the date patterns
+
+# One formatter per shape of GeneralPattern._DATE_PATTERNS plus the vendor-specific ones
+DATE_FORMATTERS = [
+    lambda d: f"{d.month}/{d.day}/{d.year}",
+    lambda d: f"{d.month:02d}-{d.day:02d}-{d.year % 100:02d}",
+    lambda d: d.strftime("%d-%b-%Y"),
+    lambda d: d.strftime("%b %d, %Y"),
+    lambda d: d.strftime("%b. %d, %Y"),
+    lambda d: d.strftime("%B %d, %Y"),
+]
+
+
+def build_month_of_date_strings(seed: int = 2024):
+    rng = random.Random(seed)
+    first_day = date(2023, 12, 1)
+    invoices = []
+    for _ in range(INVOICES_PER_MONTH):
+        invoices.append([rng.choice(DATE_FORMATTERS)(first_day + timedelta(days=rng.randint(0, 120))) for _ in range(DATES_FOUND_PER_INVOICE)])
+    return invoices
+
+
+def run_dateparser(invoices):
+    for date_strings in invoices:
+        # extract_date parsed the statement window on every call, once for pdfplumber and once more for the OCR fallback
+        for _ in range(2):
+            dateparser.parse(START_DATE)
+            dateparser.parse(END_DATE)
+        for date_text in date_strings:
+            dateparser.parse(date_text)
+        dateparser.parse(date_strings[0])  # PDF.date setter
+
+
+def run_service(invoices, service: DateParsingService):
+    service.parse_window(START_DATE, END_DATE)
+    for date_strings in invoices:
+        for date_text in date_strings:
+            service.parse(date_text)
+        service.parse(date_strings[0])  # PDF.date setter
+
+
+def time_call(function, *args) -> float:
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def check_same_dates(invoices) -> None:
+    service = DateParsingService()
+    date_texts = {START_DATE, END_DATE}.union(*invoices)
+    for date_text in sorted(date_texts):
+        assert service.parse(date_text) == dateparser.parse(date_text), f"{date_text!r} parsed differently than by dateparser"
+
+
+def main():
+    invoices = build_month_of_date_strings()
+    check_same_dates(invoices)  # Also loads dateparser's language data so it isn't counted against the first run
+
+    dateparser_seconds = time_call(run_dateparser, invoices)
+    service = DateParsingService()
+    cold_seconds = time_call(run_service, invoices, service)
+    warm_seconds = time_call(run_service, invoices, service)
+
+    rows = [
+        ["dateparser.parse (current)", f"{dateparser_seconds:.3f}", "1.0x"],
+        ["DateParsingService, cold cache", f"{cold_seconds:.3f}", f"{dateparser_seconds / cold_seconds:.1f}x"],
+        ["DateParsingService, warm cache", f"{warm_seconds:.3f}", f"{dateparser_seconds / warm_seconds:.1f}x"],
+    ]
+    print(f"{INVOICES_PER_MONTH} invoices x {DATES_FOUND_PER_INVOICE} date strings")
+    print(tabulate(rows, headers=["Parser", "Seconds", "Speedup"], tablefmt='psql'))
+    print(service.cache_info())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+End-to-end benchmark of the automation's stages on synthetic data, timed one stage at a time:
+pdf extraction (text layer), OCR fallback (image-only pdfs, with and without the vendor OCR profiles), the matching strategies, File Name sequencing
+and the worksheet updates against a mock sheet that counts the round-trips to Excel.
+
+The invoices are generated for every vendor of VendorSpecificPattern._VENDOR_PATTERNS by benchmarks.synthetic_invoices,
+the statements at 100, 1k and 10k transactions. The results are written as JSON so runs of different releases can be compared.
+The OCR stage needs Tesseract and poppler; when they aren't installed the stage is reported as skipped with the reason.
+
+Run from the repository root:
+    python -m benchmarks.bench_end_to_end --output bench_end_to_end.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+import openpyxl
+import pandas as pd
+from tabulate import tabulate
+
+from benchmarks.mock_xlwings import MockSheet
+from benchmarks.synthetic_invoices import STATEMENT_START_DATE, STATEMENT_END_DATE, SyntheticInvoice, build_statement, generate_invoice_pdfs, xlookup_vendors
+from business_logic.invoice_matching_manager import InvoiceMatchingManager
+from business_logic.matching_strategies import ExactAmountDateStrategy, ExactAmountAndExcludeDateStrategy, CombinationTotalStrategy, VendorOnlyStrategy
+from business_logic.pdf_processing_manager import PDFProcessingManager
+from business_logic.pdf_processor import PDFPlumberProcessor, PDFOCRProcessor, GeneralPattern, VendorSpecificPattern, VendorOCRProfile
+from business_logic.update_strategies import TemplateInvoiceUpdateStrategy, TemplateTransactionDetails2UpdateStrategy
+from models.workbook_backends import OpenpyxlWorksheetBackend, XlwingsWorksheetBackend
+from models.worksheet import Worksheet
+from utils.utilities import progress_reporting
+
+STATEMENT_SIZES = [100, 1000, 10000]
+PDFS_PER_VENDOR = 2
+
+
+class DataFrameWorksheet(Worksheet):
+    """A worksheet over a MockSheet whose table reads return the given DataFrame, MockSheet has no expand='table'."""
+
+    def __init__(self, name: str, dataframe: pd.DataFrame):
+        super().__init__(name, XlwingsWorksheetBackend(MockSheet(name)))
+        self._dataframe = dataframe
+
+    def read_data_as_dataframe(self):
+        self.sheet.round_trip()
+        return self._dataframe.copy()
+
+
+def build_xlookup_table_worksheet() -> Worksheet:
+    sheet = openpyxl.Workbook().active
+    for row, vendor in enumerate(xlookup_vendors(), start=8):
+        sheet.cell(row=row, column=1, value=vendor)
+    return Worksheet('Xlookup table', OpenpyxlWorksheetBackend(sheet, lambda: None))
+
+
+def build_pdf_proc_mng(use_ocr_profiles: bool = True) -> PDFProcessingManager:
+    return PDFProcessingManager(
+        PDFPlumberProcessor(STATEMENT_START_DATE, STATEMENT_END_DATE, VendorSpecificPattern(), GeneralPattern()),
+        PDFOCRProcessor(STATEMENT_START_DATE, STATEMENT_END_DATE, GeneralPattern(), VendorOCRProfile() if use_ocr_profiles else None)
+    )
+
+
+def time_extraction(stage: str, invoices: List[SyntheticInvoice], use_ocr_profiles: bool = True) -> Dict[str, Any]:
+    pdf_proc_mng = build_pdf_proc_mng(use_ocr_profiles)
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):  # The processing log of every pdf
+            pdf_proc_mng.populate_pdf_proc_mng_df_from_records(((invoice.file_name, invoice.file_path) for invoice in invoices), build_xlookup_table_worksheet())
+    except Exception as ex:
+        return {'stage': stage, 'pdfs': len(invoices), 'skipped': f"{type(ex).__name__}: {ex}"}
+    seconds = time.perf_counter() - start
+
+    extracted = pdf_proc_mng.get_pdf_proc_mng_df().set_index('File Path')
+    correct = {'total': 0, 'date': 0, 'vendor': 0}
+    for invoice in invoices:
+        if invoice.file_path not in extracted.index:
+            continue
+        row = extracted.loc[invoice.file_path]
+        correct['total'] += abs(float(row['Amount']) - invoice.total) < 0.005
+        correct['date'] += row['Date'] == invoice.date
+        correct['vendor'] += row['Vendor'] == invoice.vendor
+    return {
+        'stage': stage,
+        'pdfs': len(invoices),
+        'seconds': seconds,
+        'ms_per_pdf': 1000 * seconds / len(invoices),
+        'failed_pdfs': len(pdf_proc_mng.failed_pdfs),
+        'totals_correct': correct['total'],
+        'dates_correct': correct['date'],
+        'vendors_correct': correct['vendor'],
+    }
+
+
+def timed(function: Callable, seconds_by_name: Dict[str, float], name: str) -> Callable:
+    def timed_function(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            seconds_by_name[name] = seconds_by_name.get(name, 0.0) + time.perf_counter() - start
+    return timed_function
+
+
+def time_matching_and_sequencing(transaction_count: int) -> List[Dict[str, Any]]:
+    invoices_df, transaction_details_df = build_statement(transaction_count)
+    transaction_details_df['File Path'] = ''
+
+    strategies = [ExactAmountDateStrategy(), ExactAmountAndExcludeDateStrategy(), CombinationTotalStrategy(), VendorOnlyStrategy()]
+    strategy_seconds: Dict[str, float] = {}
+    for strategy in strategies:
+        strategy.execute = timed(strategy.execute, strategy_seconds, type(strategy).__name__)
+    manager = InvoiceMatchingManager(strategies[:-1], strategies[-1])
+
+    with contextlib.redirect_stdout(io.StringIO()):  # The unmatched invoices table
+        start = time.perf_counter()
+        manager.set_data(invoices_df, transaction_details_df)
+        index_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        manager.execute_invoice_matching()
+        matching_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    manager.sequence_file_names()
+    sequencing_seconds = time.perf_counter() - start
+
+    return [
+        {
+            'stage': 'matching',
+            'transactions': transaction_count,
+            'invoices': len(invoices_df.index),
+            'seconds': index_seconds + matching_seconds,
+            'index_seconds': index_seconds,
+            'strategy_seconds': strategy_seconds,
+            'matched_invoices': len(manager.matched_invoices),
+        },
+        {'stage': 'sequencing', 'transactions': transaction_count, 'seconds': sequencing_seconds},
+    ]
+
+
+def time_worksheet_updates(transaction_count: int) -> List[Dict[str, Any]]:
+    invoices_df, transaction_details_df = build_statement(transaction_count)
+    results = []
+
+    transaction_details_worksheet = DataFrameWorksheet('Transaction Details 2', transaction_details_df)
+    start = time.perf_counter()
+    TemplateTransactionDetails2UpdateStrategy().update_worksheet(transaction_details_worksheet, transaction_details_df)
+    results.append({'stage': 'transaction_details_2_update', 'transactions': transaction_count, 'seconds': time.perf_counter() - start,
+                    'round_trips': transaction_details_worksheet.sheet.round_trips})
+
+    # The Invoices worksheet as listed by the macro, before the extracted data is merged in
+    listed_invoices_df = invoices_df.assign(Amount=None, Vendor=None, Date=None)
+    invoices_worksheet = DataFrameWorksheet('Invoices', listed_invoices_df)
+    start = time.perf_counter()
+    TemplateInvoiceUpdateStrategy().update_worksheet(invoices_worksheet, invoices_df)
+    results.append({'stage': 'invoices_update', 'invoices': len(invoices_df.index), 'seconds': time.perf_counter() - start,
+                    'round_trips': invoices_worksheet.sheet.round_trips})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--output', default='bench_end_to_end.json', help="JSON file the results are written to")
+    parser.add_argument('--sizes', type=int, nargs='+', default=STATEMENT_SIZES, help="Statement sizes in transactions")
+    parser.add_argument('--pdfs-per-vendor', type=int, default=PDFS_PER_VENDOR, help="Synthetic invoices per vendor of each pdf kind")
+    parser.add_argument('--skip-ocr', action='store_true', help="Don't run the OCR fallback stage")
+    arguments = parser.parse_args()
+    progress_reporting.set_mode('off')
+
+    stages = []
+    with tempfile.TemporaryDirectory() as folder_path:
+        stages.append(time_extraction('extraction', generate_invoice_pdfs(folder_path, arguments.pdfs_per_vendor)))
+        if not arguments.skip_ocr:
+            image_only_invoices = generate_invoice_pdfs(folder_path, arguments.pdfs_per_vendor, image_only=True)
+            stages.append(time_extraction('ocr_fallback', image_only_invoices))
+            # Every whole page at 200 dpi, the OCR before VendorOCRProfile
+            stages.append(time_extraction('ocr_fallback_full_page', image_only_invoices, use_ocr_profiles=False))
+
+    for transaction_count in arguments.sizes:
+        stages.extend(time_matching_and_sequencing(transaction_count))
+        stages.extend(time_worksheet_updates(transaction_count))
+
+    results = {
+        'benchmark': 'end_to_end',
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': {'sizes': arguments.sizes, 'pdfs_per_vendor': arguments.pdfs_per_vendor, 'vendors': len(VendorSpecificPattern._VENDOR_PATTERNS)},
+        'stages': stages,
+    }
+    with open(arguments.output, 'w', encoding='utf-8') as output_file:
+        json.dump(results, output_file, indent=2)
+
+    rows = [
+        [stage['stage'], stage.get('transactions', stage.get('pdfs', stage.get('invoices'))),
+         f"{stage['seconds']:.3f}" if 'seconds' in stage else stage.get('skipped'), stage.get('round_trips', '')]
+        for stage in stages
+    ]
+    print(tabulate(rows, headers=["Stage", "Size", "Seconds", "Round-trips"], tablefmt='psql'))
+    print(f"Results written to {arguments.output}")
+
+
+if __name__ == "__main__":
+    main()
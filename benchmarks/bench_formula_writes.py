@@ -0,0 +1,69 @@
+"""
+Benchmark of writing the E:H formulas of the Transaction Details 2 worksheet against a mock xlwings sheet,
+one range assignment per cell (the previous TemplateTransactionDetails2UpdateStrategy) vs one assignment for the whole block.
+
+Every COM round-trip to Excel is simulated with a fixed latency, ROUND_TRIP_SECONDS.
+
+Run from the repository root:
+    python -m benchmarks.bench_formula_writes
+"""
+import time
+
+import pandas as pd
+from tabulate import tabulate
+
+from benchmarks.mock_xlwings import MockSheet
+from business_logic.update_strategies import TemplateTransactionDetails2UpdateStrategy
+from models.workbook_backends import XlwingsWorksheetBackend
+from models.worksheet import Worksheet
+from utils.utilities import progress_reporting
+
+ROW_COUNTS = [100, 500, 2000]
+ROUND_TRIP_SECONDS = 0.0005
+
+
+def build_transaction_details(row_count: int) -> pd.DataFrame:
+    return pd.DataFrame({
+        'Date': ['01/25/2024'] * row_count,
+        'Description': [f'VENDOR {row} SOMETHING' for row in range(row_count)],
+        'Amount': [float(row) for row in range(row_count)],
+        'File Name': [f'{8 + row} - invoice.pdf' for row in range(row_count)],
+    })
+
+
+def write_cell_by_cell(worksheet: Worksheet, data: pd.DataFrame) -> None:
+    start_row = TemplateTransactionDetails2UpdateStrategy.START_ROW
+    last_row = start_row + len(data) - 1
+    worksheet.sheet.range(f'A{start_row}').options(index=False, header=False).value = data
+    for index, formulas in zip(range(start_row, last_row + 1), TemplateTransactionDetails2UpdateStrategy.build_formulas(start_row, last_row)):
+        for column, formula in zip('EFGH', formulas):
+            worksheet.sheet.range(f'{column}{index}').formula = formula
+
+
+def write_batched(worksheet: Worksheet, data: pd.DataFrame) -> None:
+    TemplateTransactionDetails2UpdateStrategy().update_worksheet(worksheet, data)
+
+
+def time_write(write, data: pd.DataFrame):
+    sheet = MockSheet('Transaction Details 2', ROUND_TRIP_SECONDS)
+    start = time.perf_counter()
+    write(Worksheet(sheet.name, XlwingsWorksheetBackend(sheet)), data)
+    return time.perf_counter() - start, sheet
+
+
+def main():
+    progress_reporting.set_mode('off')
+    rows = []
+    for row_count in ROW_COUNTS:
+        data = build_transaction_details(row_count)
+        cell_seconds, cell_sheet = time_write(write_cell_by_cell, data)
+        batched_seconds, batched_sheet = time_write(write_batched, data)
+        assert cell_sheet.formulas == batched_sheet.formulas, "Batched formulas differ from the cell by cell ones"
+        rows.append([row_count, cell_sheet.round_trips, f"{cell_seconds:.3f}", batched_sheet.round_trips, f"{batched_seconds:.3f}", f"{cell_seconds / batched_seconds:.0f}x"])
+
+    print(f"Simulated COM round-trip: {ROUND_TRIP_SECONDS * 1000:.1f} ms")
+    print(tabulate(rows, headers=["Rows", "Cell by cell round-trips", "Seconds", "Batched round-trips", "Seconds", "Speedup"], tablefmt='psql'))
+
+
+if __name__ == "__main__":
+    main()
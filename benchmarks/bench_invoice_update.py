@@ -0,0 +1,101 @@
+"""
+Benchmark of TemplateInvoiceUpdateStrategy merging the extracted pdf data into the Invoices worksheet at 5k invoices,
+a mask over the whole worksheet per pdf (the previous implementation) vs a keyed lookup on 'File Path'.
+
+Run from the repository root:
+    python -m benchmarks.bench_invoice_update
+"""
+import random
+import time
+
+import pandas as pd
+from tabulate import tabulate
+
+from benchmarks.mock_xlwings import MockSheet
+from business_logic.update_strategies import TemplateInvoiceUpdateStrategy
+from models.workbook_backends import XlwingsWorksheetBackend
+from models.worksheet import Worksheet
+from utils.utilities import progress_reporting
+
+INVOICE_COUNTS = [500, 5000]
+MISSING_FROM_WORKSHEET = 0.02  # Share of pdfs without a worksheet row, e.g. added to the folder after the list macro ran
+
+
+def build_invoices(invoice_count: int, seed: int = 2024):
+    rng = random.Random(seed)
+    file_paths = [f"H:/Amex Automation/t3nas/APPS/[02] Feb 2024/invoice {row}.pdf" for row in range(invoice_count)]
+    existing_data_df = pd.DataFrame({
+        'File Name': [file_path.rsplit('/', 1)[1] for file_path in file_paths],
+        'File Path': file_paths,
+        'Amount': [None] * invoice_count,
+        'Vendor': [None] * invoice_count,
+        'Date': [None] * invoice_count,
+    })
+    pdf_rows = [row for row in range(invoice_count) if rng.random() > MISSING_FROM_WORKSHEET]
+    data = pd.DataFrame({
+        'File Name': [existing_data_df.at[row, 'File Name'] for row in pdf_rows],
+        'File Path': [file_paths[row] if rng.random() > MISSING_FROM_WORKSHEET else f"H:/elsewhere/{row}.pdf" for row in pdf_rows],
+        'Amount': [round(rng.uniform(1, 500), 2) for _ in pdf_rows],
+        'Vendor': [rng.choice(['Amazon', 'Adobe', 'Microsoft', 'Cloudflare']) for _ in pdf_rows],
+        'Date': [pd.Timestamp('2024-01-21') + pd.Timedelta(days=rng.randint(0, 31)) for _ in pdf_rows],
+    })
+    return existing_data_df, data.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+
+def update_row_by_row(existing_data_df: pd.DataFrame, data: pd.DataFrame) -> pd.DataFrame:
+    for _, data_row in data.iterrows():
+        mask = existing_data_df['File Path'] == data_row['File Path']
+        if mask.any():
+            existing_data_df.loc[mask, 'Amount'] = data_row['Amount']
+            existing_data_df.loc[mask, 'Vendor'] = data_row['Vendor']
+            existing_data_df.loc[mask, 'Date'] = data_row['Date']
+    return existing_data_df
+
+
+class DataFrameWorksheet(Worksheet):
+    def __init__(self, dataframe: pd.DataFrame):
+        super().__init__('Invoices', XlwingsWorksheetBackend(MockSheet('Invoices')))
+        self._dataframe = dataframe
+
+    def read_data_as_dataframe(self):
+        return self._dataframe.copy()
+
+
+def update_keyed(existing_data_df: pd.DataFrame, data: pd.DataFrame) -> pd.DataFrame:
+    worksheet = DataFrameWorksheet(existing_data_df)
+    strategy = TemplateInvoiceUpdateStrategy()
+    strategy.update_worksheet(worksheet, data)
+    written = worksheet.sheet.values
+    rows = max(row for row, _ in written)
+    columns = max(column for _, column in written)
+    values = [[written.get((row, column)) for column in range(1, columns + 1)] for row in range(7, rows + 1)]
+    return pd.DataFrame(values[1:], columns=values[0]), strategy.unmatched_pdfs_df
+
+
+def blank_missing(dataframe: pd.DataFrame) -> pd.DataFrame:
+    return dataframe.astype(object).where(dataframe.notna(), None)
+
+
+def main():
+    progress_reporting.set_mode('off')
+    rows = []
+    for invoice_count in INVOICE_COUNTS:
+        existing_data_df, data = build_invoices(invoice_count)
+
+        start = time.perf_counter()
+        expected_df = update_row_by_row(existing_data_df.copy(), data)
+        row_by_row_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        updated_df, unmatched_pdfs_df = update_keyed(existing_data_df, data)
+        keyed_seconds = time.perf_counter() - start
+
+        # Cells that weren't updated may come back as NaN or NaT instead of None, all of them are written as empty cells
+        pd.testing.assert_frame_equal(blank_missing(updated_df), blank_missing(expected_df.reset_index(drop=True)), check_dtype=False)
+        rows.append([invoice_count, f"{row_by_row_seconds:.3f}", f"{keyed_seconds:.3f}", f"{row_by_row_seconds / keyed_seconds:.0f}x", len(unmatched_pdfs_df)])
+
+    print(tabulate(rows, headers=["Invoices", "Mask per pdf", "Keyed lookup", "Speedup", "Unmatched pdfs"], tablefmt='psql'))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark of processing the Invoices and Transaction Details 2 worksheets stage by stage vs with the InvoicePipeline,
+on synthetic invoice pdfs and a statement holding a transaction for every invoice among unrelated ones.
+
+The worksheets are mock sheets whose every Excel round-trip waits --round-trip-ms, so the Excel I/O the pipeline overlaps
+with the extraction and the matching has a cost. Both runs must write the same File Names to Transaction Details 2.
+
+Run from the repository root:
+    python -m benchmarks.bench_pipeline --pdfs-per-vendor 8 --workers 4
+"""
+import argparse
+import contextlib
+import io
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+import pandas as pd
+from tabulate import tabulate
+
+from benchmarks.bench_end_to_end import DataFrameWorksheet, build_pdf_proc_mng, build_xlookup_table_worksheet
+from benchmarks.synthetic_invoices import SyntheticInvoice, build_statement, generate_invoice_pdfs
+from business_logic.invoice_matching_manager import InvoiceMatchingManager
+from business_logic.invoice_pipeline import InvoicePipeline
+from business_logic.matching_strategies import ExactAmountDateStrategy, ExactAmountAndExcludeDateStrategy, CombinationTotalStrategy, VendorOnlyStrategy
+from business_logic.update_strategies import TemplateInvoiceUpdateStrategy, TemplateTransactionDetails2UpdateStrategy
+from utils.utilities import progress_reporting
+
+PDFS_PER_VENDOR = 8
+WORKERS = 4
+UNRELATED_TRANSACTIONS = 2000
+ROUND_TRIP_MS = 20.0
+
+
+def build_transaction_details(invoices: List[SyntheticInvoice], unrelated_transaction_count: int) -> pd.DataFrame:
+    _, unrelated_df = build_statement(unrelated_transaction_count)
+    invoice_transactions_df = pd.DataFrame([
+        {'Date': pd.Timestamp(invoice.date).strftime('%m/%d/%Y'), 'Description': f"{invoice.vendor.upper()} CHARGE - IT", 'Amount': invoice.total,
+         'File Name': None, 'Account': None, 'Sub-Account': None, 'Vendor': invoice.vendor.upper(), 'Explanation': None, 'Column1': None}
+        for invoice in invoices
+    ])
+    return pd.concat([unrelated_df, invoice_transactions_df]).sample(frac=1, random_state=2024).reset_index(drop=True)
+
+
+def build_worksheets(transaction_details_df: pd.DataFrame, round_trip_seconds: float) -> Tuple[DataFrameWorksheet, DataFrameWorksheet]:
+    invoices_worksheet = DataFrameWorksheet('Invoices', pd.DataFrame(columns=['File Name', 'File Path', 'Amount', 'Vendor', 'Date']))
+    transaction_details_worksheet = DataFrameWorksheet('Transaction Details 2', transaction_details_df)
+    transaction_details_worksheet.set_strategy(TemplateTransactionDetails2UpdateStrategy())
+    for worksheet in (invoices_worksheet, transaction_details_worksheet):
+        worksheet.sheet.round_trip_seconds = round_trip_seconds
+    return invoices_worksheet, transaction_details_worksheet
+
+
+def build_invoice_matching_manager() -> InvoiceMatchingManager:
+    return InvoiceMatchingManager([ExactAmountDateStrategy(), ExactAmountAndExcludeDateStrategy(), CombinationTotalStrategy()], VendorOnlyStrategy())
+
+
+def run_stage_by_stage(invoices: List[SyntheticInvoice], transaction_details_df: pd.DataFrame, workers: int, round_trip_seconds: float) -> Tuple[Dict[str, float], pd.Series]:
+    invoices_worksheet, transaction_details_worksheet = build_worksheets(transaction_details_df, round_trip_seconds)
+    pdf_proc_mng = build_pdf_proc_mng()
+    pdf_proc_mng.max_workers = workers
+    invoice_matching_manager = build_invoice_matching_manager()
+    seconds = {}
+
+    start = time.perf_counter()
+    pdf_proc_mng.populate_pdf_proc_mng_df_from_records(((invoice.file_name, invoice.file_path) for invoice in invoices), build_xlookup_table_worksheet())
+    seconds['extraction'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    invoices_df = pdf_proc_mng.get_invoices_df()
+    TemplateInvoiceUpdateStrategy(replace_rows=True).update_worksheet(invoices_worksheet, invoices_df)
+    invoices_worksheet._dataframe = invoices_df  # What reading the worksheet back returns
+    invoices_worksheet_df = invoices_worksheet.read_data_as_dataframe()
+    transaction_details_worksheet_df = transaction_details_worksheet.read_data_as_dataframe()
+    transaction_details_worksheet_df['File Path'] = ''
+    seconds['invoices_write_and_read_back'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    invoice_matching_manager.set_data(invoices_worksheet_df, transaction_details_worksheet_df)
+    invoice_matching_manager.execute_invoice_matching()
+    invoice_matching_manager.sequence_file_names()
+    seconds['matching'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    transaction_details_worksheet.update_sheet(invoice_matching_manager.transaction_details_df.drop('File Path', axis=1))
+    seconds['transaction_details_2_write'] = time.perf_counter() - start
+    return seconds, invoice_matching_manager.transaction_details_df['File Name']
+
+
+def run_pipeline(invoices: List[SyntheticInvoice], transaction_details_df: pd.DataFrame, workers: int, round_trip_seconds: float) -> Tuple[float, pd.Series]:
+    invoices_worksheet, transaction_details_worksheet = build_worksheets(transaction_details_df, round_trip_seconds)
+    pdf_proc_mng = build_pdf_proc_mng()
+    pdf_proc_mng.max_workers = workers
+    invoice_pipeline = InvoicePipeline(pdf_proc_mng, build_invoice_matching_manager())
+
+    start = time.perf_counter()
+    sequenced_df = invoice_pipeline.run(((invoice.file_name, invoice.file_path) for invoice in invoices), invoices_worksheet, build_xlookup_table_worksheet(), transaction_details_worksheet)
+    return time.perf_counter() - start, sequenced_df['File Name']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pdfs-per-vendor', type=int, default=PDFS_PER_VENDOR, help="Synthetic invoices per vendor")
+    parser.add_argument('--workers', type=int, default=WORKERS, help="Extraction worker processes of both runs")
+    parser.add_argument('--unrelated-transactions', type=int, default=UNRELATED_TRANSACTIONS, help="Transactions no invoice belongs to")
+    parser.add_argument('--round-trip-ms', type=float, default=ROUND_TRIP_MS, help="Simulated cost of an Excel round-trip")
+    arguments = parser.parse_args()
+    progress_reporting.set_mode('off')
+
+    with tempfile.TemporaryDirectory() as folder_path:
+        invoices = generate_invoice_pdfs(folder_path, arguments.pdfs_per_vendor)
+        transaction_details_df = build_transaction_details(invoices, arguments.unrelated_transactions)
+        round_trip_seconds = arguments.round_trip_ms / 1000
+        with contextlib.redirect_stdout(io.StringIO()):  # The processing log of every pdf
+            stage_seconds, stage_by_stage_file_names = run_stage_by_stage(invoices, transaction_details_df, arguments.workers, round_trip_seconds)
+            pipeline_seconds, pipeline_file_names = run_pipeline(invoices, transaction_details_df, arguments.workers, round_trip_seconds)
+
+    assert stage_by_stage_file_names.tolist() == pipeline_file_names.tolist(), "The pipeline matched the invoices differently"
+    rows = [[f"stage: {stage}", f"{seconds:.3f}"] for stage, seconds in stage_seconds.items()]
+    rows.append(["stage by stage, total", f"{sum(stage_seconds.values()):.3f}"])
+    rows.append(["pipeline, total", f"{pipeline_seconds:.3f}"])
+    print(f"{len(invoices)} invoices, {len(transaction_details_df.index)} transactions, {int(stage_by_stage_file_names.notna().sum())} matched, "
+          f"{arguments.workers} workers, {arguments.round_trip_ms:g} ms per Excel round-trip")
+    print(tabulate(rows, headers=["Run", "Seconds"], tablefmt='psql'))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark of CombinationTotalStrategy's combination search on vendors with 30+ same-day candidate transactions,
+e.g. a day of Cloudflare or Microsoft charges an invoice is split across.
+
+Compares the previous brute force (itertools.combinations over itertuples with np.isclose, up to 3 transactions)
+with SubsetSumSolver, which searches in integer cents up to max_subset_size transactions.
+
+Run from the repository root:
+    python -m benchmarks.bench_subset_sum
+"""
+import random
+import time
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+from tabulate import tabulate
+
+from business_logic.subset_sum import SubsetSumSolver
+
+CANDIDATE_COUNTS = [30, 45, 60]
+SPLIT_SIZES = [2, 3, 4, 5, 6]
+INVOICES_PER_CASE = 20
+
+
+def build_case(candidate_count: int, split_size: int, seed: int):
+    rng = random.Random(seed)
+    amounts = [round(rng.choice([rng.uniform(1, 300), rng.choice([9.99, 20.0, 25.0, 49.5, 100.0])]), 2) for _ in range(candidate_count)]
+    split = rng.sample(range(candidate_count), split_size)
+    total = round(sum(amounts[position] for position in split), 2)
+    return pd.DataFrame({'Amount': amounts}), total
+
+
+def brute_force(potential_matches: pd.DataFrame, total: float):
+    for r in range(1, min(4, len(potential_matches) + 1)):
+        for combo in combinations(potential_matches.itertuples(index=True), r):
+            if np.isclose(sum(item.Amount for item in combo), total, atol=0.01):
+                return tuple(item.Index for item in combo)
+    return None
+
+
+def solver_search(potential_matches: pd.DataFrame, total: float, solver: SubsetSumSolver):
+    amounts_cents = [solver.to_cents(amount) for amount in potential_matches['Amount']]
+    return solver.solve(amounts_cents, solver.to_cents(total)).positions
+
+
+def main():
+    solver = SubsetSumSolver(max_subset_size=6, node_budget=None, time_budget_seconds=None)
+    budgeted_solver = SubsetSumSolver()
+    rows = []
+    for candidate_count in CANDIDATE_COUNTS:
+        for split_size in SPLIT_SIZES:
+            cases = [build_case(candidate_count, split_size, seed) for seed in range(INVOICES_PER_CASE)]
+            timings, found = {}, {}
+            searches = [
+                ('brute force', lambda df, total: brute_force(df, total)),
+                ('solver', lambda df, total: solver_search(df, total, solver)),
+                ('solver, default budget', lambda df, total: solver_search(df, total, budgeted_solver)),
+            ]
+            # The brute force takes minutes once the split is larger than it can find, it is only timed where it can match
+            if split_size > 3:
+                searches = searches[1:]
+            for name, search in searches:
+                start = time.perf_counter()
+                found[name] = sum(search(df, total) is not None for df, total in cases)
+                timings[name] = time.perf_counter() - start
+            rows.append([
+                candidate_count, split_size,
+                *(f"{timings[name]:.3f} ({found[name]}/{INVOICES_PER_CASE})" if name in timings else "-"
+                  for name in ('brute force', 'solver', 'solver, default budget'))
+            ])
+
+    print(f"{INVOICES_PER_CASE} invoices per row, seconds (invoices matched)")
+    print(tabulate(rows, headers=["Candidates", "Split size", "Brute force <= 3", "Solver <= 6", "Solver <= 6, default budget"], tablefmt='psql'))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Mock of the part of the xlwings Sheet and Range API the update strategies use, for benchmarks that can't open Excel.
+
+Every range() call and every read or write of a range is counted as one COM round-trip,
+and each round-trip waits `round_trip_seconds` to stand in for the cross-process call to Excel.
+Written values and formulas are kept per cell so the results of two implementations can be compared.
+"""
+import re
+import time
+from typing import Any, Dict, Tuple
+
+import pandas as pd
+
+_CELL_PATTERN = re.compile(r'([A-Z]+)(\d+)')
+
+
+def column_number(column_letters: str) -> int:
+    number = 0
+    for letter in column_letters:
+        number = number * 26 + ord(letter) - ord('A') + 1
+    return number
+
+
+def parse_address(address: str) -> Tuple[int, int, int, int]:
+    """
+    :param address: A1-style address of a cell or range, e.g. 'E8' or 'E8:H20'.
+    :return: Tuple(first_row, first_column, last_row, last_column).
+    """
+    cells = [_CELL_PATTERN.fullmatch(cell) for cell in address.split(':')]
+    first_row, first_column = int(cells[0].group(2)), column_number(cells[0].group(1))
+    last_row, last_column = int(cells[-1].group(2)), column_number(cells[-1].group(1))
+    return first_row, first_column, last_row, last_column
+
+
+class MockRange:
+    def __init__(self, sheet: 'MockSheet', address: str):
+        self._sheet = sheet
+        self.address = address
+        self._options: Dict[str, Any] = {}
+
+    def options(self, *args, **kwargs) -> 'MockRange':
+        self._options = kwargs
+        return self
+
+    def _cells(self):
+        first_row, first_column, last_row, last_column = parse_address(self.address)
+        return [[(row, column) for column in range(first_column, last_column + 1)] for row in range(first_row, last_row + 1)]
+
+    def _write(self, store: Dict[Tuple[int, int], Any], value: Any) -> None:
+        self._sheet.round_trip()
+        first_row, first_column, _, _ = parse_address(self.address)
+        if isinstance(value, pd.DataFrame):
+            rows = value.values.tolist()
+            if self._options.get('header', True):
+                rows = [list(value.columns)] + rows
+        elif isinstance(value, (list, tuple)):
+            rows = [list(row) if isinstance(row, (list, tuple)) else [row] for row in value]
+        else:
+            rows = [[value]]
+        for row_offset, row in enumerate(rows):
+            for column_offset, cell_value in enumerate(row):
+                store[(first_row + row_offset, first_column + column_offset)] = cell_value
+
+    def _read(self, store: Dict[Tuple[int, int], Any]):
+        self._sheet.round_trip()
+        values = [[store.get(cell) for cell in row] for row in self._cells()]
+        if len(values) == 1 and len(values[0]) == 1:
+            return values[0][0]
+        return values
+
+    @property
+    def value(self):
+        return self._read(self._sheet.values)
+
+    @value.setter
+    def value(self, value):
+        self._write(self._sheet.values, value)
+
+    @property
+    def formula(self):
+        return self._read(self._sheet.formulas)
+
+    @formula.setter
+    def formula(self, formula):
+        self._write(self._sheet.formulas, formula)
+
+
+class MockSheet:
+    def __init__(self, name: str = 'Sheet1', round_trip_seconds: float = 0.0):
+        self.name = name
+        self.round_trip_seconds = round_trip_seconds
+        self.round_trips = 0
+        self.values: Dict[Tuple[int, int], Any] = {}
+        self.formulas: Dict[Tuple[int, int], Any] = {}
+        self.tables = []  # A sheet without tables, so resizing them writes nothing
+
+    def round_trip(self) -> None:
+        self.round_trips += 1
+        if self.round_trip_seconds:
+            time.sleep(self.round_trip_seconds)
+
+    def range(self, address: str) -> MockRange:
+        self.round_trip()
+        return MockRange(self, address)
@@ -0,0 +1,230 @@
+"""
+Synthetic invoice pdfs and statements for the benchmarks, so they run without the invoices share or the Amex workbooks.
+
+Every vendor of `VendorSpecificPattern._VENDOR_PATTERNS` gets an invoice layout its own date and total patterns find,
+written either with a text layer (a minimal pdf written by hand, read by pdfplumber)
+or image-only (a page rendered with Pillow, only readable with OCR).
+Statements are Transaction Details 2 DataFrames with the Invoices worksheet rows that match them.
+"""
+import datetime
+import os
+import random
+from typing import Dict, List, NamedTuple, Tuple
+
+import pandas as pd
+from PIL import Image, ImageDraw, ImageFont
+
+from business_logic.pdf_processor import VendorSpecificPattern
+
+STATEMENT_START_DATE = "01/21/2024"
+STATEMENT_END_DATE = "2/21/2024"
+
+# Vendor identifier of _VENDOR_PATTERNS -> (Xlookup table vendor, date line strftime format, total line format)
+# The lines are written so the vendor's own patterns find them; GoDaddy.com and Monday.com have no patterns and fall back to the general ones
+VENDOR_INVOICE_LAYOUTS: Dict[str, Tuple[str, str, str]] = {
+    'Thanks for choosing Comcast Business!': ('Comcast', 'Statement 8155 %b %d, %Y', 'Regular monthly charges ${total}'),
+    'Comcast Business Cable': ('Comcast', 'Statement Date %m/%d/%Y', 'Total Amount Due: ${total}'),
+    'adobe': ('Adobe', 'Invoice Date %d-%b-%Y', 'Grand Total (USD): ${total}'),
+    'amazon': ('Amazon', 'Order Placed %B %d, %Y', 'Grand Total: ${total}'),
+    'Apple Store for Business': ('Apple', 'Invoice Date %m/%d/%Y', 'Total: ${total}'),
+    'calendy': ('Calendly', 'Paid on %b %d, %Y', 'Total: ${total}'),
+    'sales@cbtnuggets.com': ('CBT', 'Invoice Date %m/%d/%Y', 'Total (in USD): ${total}'),
+    'cloudflare': ('Cloudflare', 'Invoice Date: %m/%d/%Y', 'Total: ${total}'),
+    'comptia': ('CompTIA', 'Invoice Date: %m/%d/%Y', 'Total: ${total}'),
+    'deft.com': ('Deft', 'Date %m/%d/%Y', 'Total: ${total}'),
+    'dell!': ('Dell', 'Purchased On: %b %d, %Y', 'Total: ${total}'),
+    'www.granitenet.com': ('Granite', 'INVOICE DATE: %m/%d/%Y', 'TOTAL AMOUNT DUE: ${total}'),
+    'lastpass': ('LastPass', 'Invoice Date: %m/%d/%Y', 'Total: ${total}'),
+    'Microsoft Corporation': ('Microsoft', 'Due Date: %m/%d/%Y', 'Grand Total: ${total}'),
+    'relic': ('New', 'Due Date: %m/%d/%Y', 'Invoice Total ${total}'),
+    'www.serversupply.com': ('ServerSupply', 'Date: %m/%d/%Y', 'Total: ${total}'),
+    'chatgpt': ('OpenAI', 'Paid %m/%d/%Y', 'Total: ${total}'),
+    'cdw.com': ('CDW', 'Due Date Net 30 $0.00 %m/%d/%Y', 'Amount Due: ${total}'),
+    'EBAY': ('Ebay', 'Placed On: %b %d, %Y', 'Order total ${total}'),
+    'otter.ai': ('Otter', 'Date issued %b %d, %Y', 'Amount due ${total}'),
+    'symprex.com': ('Symprex', 'Invoice date: %d-%b-%Y', 'Total: {total} USD'),
+    'GoDaddy.com': ('GoDaddy', 'Invoice Date: %m/%d/%Y', 'Grand Total: ${total}'),
+    'Monday.com': ('Monday', 'Invoice Date: %m/%d/%Y', 'Grand Total: ${total}'),
+}
+
+# Vendors whose Xlookup table name isn't in the file name, see PDFProcessor._VENDOR_ALIASES
+_FILE_NAME_VENDORS = {'Microsoft': 'MSFT', 'New': 'newrelic'}
+_EXTRACTED_VENDORS = {'Microsoft': 'MSFT', 'New': 'NEW'}
+
+_STATEMENT_VENDORS = ['AMAZON', 'ADOBE', 'MSFT', 'CLOUDFLARE', 'DELL', 'APPLE', 'COMCAST', 'NEW', 'GODADDY', 'LASTPASS']
+
+
+class SyntheticInvoice(NamedTuple):
+    file_name: str
+    file_path: str
+    vendor_identifier: str  # Key of VendorSpecificPattern._VENDOR_PATTERNS
+    vendor: str  # The vendor extract_vendor is expected to find from the file name
+    total: float
+    date: str  # YYYY-MM-DD, the format PDF.date is stored in
+    image_only: bool
+
+
+def invoice_lines(vendor_identifier: str, total: float, invoice_date: datetime.date) -> List[str]:
+    """
+    :param vendor_identifier: Key of VendorSpecificPattern._VENDOR_PATTERNS.
+    :param total: The invoice total.
+    :param invoice_date: The invoice date, inside the statement window.
+    :return: The text lines of the invoice page.
+    """
+    _, date_line_format, total_line_format = VENDOR_INVOICE_LAYOUTS[vendor_identifier]
+    return [
+        f"Invoice from {vendor_identifier}",
+        invoice_date.strftime(date_line_format),
+        "Description Qty Price",
+        "Subscription 1 " + f"{total:,.2f}",
+        total_line_format.format(total=f"{total:,.2f}"),
+    ]
+
+
+def _escape_pdf_text(line: str) -> str:
+    return line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def write_text_pdf(pdf_path: str, pages: List[List[str]]) -> None:
+    """
+    Write a minimal pdf with a Helvetica text layer, one list of lines per page.
+
+    :param pdf_path: Where the pdf is written.
+    :param pages: The text lines of every page.
+    :return: None
+    """
+    page_count = len(pages)
+    font_object = 3 + 2 * page_count
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{' '.join(f'{3 + 2 * page} 0 R' for page in range(page_count))}] /Count {page_count} >>",
+    ]
+    for page, lines in enumerate(pages):
+        content = "BT /F1 12 Tf 14 TL 72 720 Td " + " ".join(f"({_escape_pdf_text(line)}) Tj T*" for line in lines) + " ET"
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 {font_object} 0 R >> >> /Contents {4 + 2 * page} 0 R >>")
+        objects.append(f"<< /Length {len(content)} >>\nstream\n{content}\nendstream")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    pdf_bytes = b"%PDF-1.4\n"
+    offsets = []
+    for number, pdf_object in enumerate(objects, start=1):
+        offsets.append(len(pdf_bytes))
+        pdf_bytes += f"{number} 0 obj\n{pdf_object}\nendobj\n".encode('latin-1')
+    xref_offset = len(pdf_bytes)
+    pdf_bytes += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode('latin-1')
+    pdf_bytes += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode('latin-1')
+    pdf_bytes += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode('latin-1')
+    with open(pdf_path, 'wb') as pdf_file:
+        pdf_file.write(pdf_bytes)
+
+
+def write_image_pdf(pdf_path: str, pages: List[List[str]], dpi: int = 150) -> None:
+    """
+    Write an image-only pdf, every page a rendered letter-size grayscale image without a text layer, like a scanned invoice.
+
+    :param pdf_path: Where the pdf is written.
+    :param pages: The text lines of every page.
+    :param dpi: Resolution the pages are rendered at.
+    :return: None
+    """
+    font = ImageFont.load_default(size=dpi // 5)
+    images = []
+    for lines in pages:
+        image = Image.new('L', (int(8.5 * dpi), 11 * dpi), 255)
+        draw = ImageDraw.Draw(image)
+        for line_number, line in enumerate(lines):
+            draw.text((dpi, dpi + line_number * dpi // 3), line, fill=0, font=font)
+        images.append(image)
+    images[0].save(pdf_path, 'PDF', resolution=dpi, save_all=True, append_images=images[1:])
+
+
+def generate_invoice_pdfs(folder_path: str, pdfs_per_vendor: int, image_only: bool = False, seed: int = 2024) -> List[SyntheticInvoice]:
+    """
+    Write `pdfs_per_vendor` invoices for every vendor of VendorSpecificPattern._VENDOR_PATTERNS.
+
+    :param folder_path: The folder the pdfs are written to.
+    :param pdfs_per_vendor: Number of invoices per vendor.
+    :param image_only: True writes image-only pdfs, False pdfs with a text layer.
+    :param seed: Seed of the totals and dates.
+    :return: List of SyntheticInvoice with the total and date every pdf holds.
+    """
+    rng = random.Random(seed)
+    window_start = datetime.date(2024, 1, 21)
+    invoices = []
+    for vendor_identifier in VendorSpecificPattern._VENDOR_PATTERNS:
+        vendor = VENDOR_INVOICE_LAYOUTS[vendor_identifier][0]
+        for number in range(pdfs_per_vendor):
+            total = round(rng.uniform(5, 2500), 2)
+            invoice_date = window_start + datetime.timedelta(days=rng.randint(0, 31))
+            file_name = f"{_FILE_NAME_VENDORS.get(vendor, vendor)} {'scan' if image_only else 'invoice'} {len(invoices)}-{number}.pdf"
+            file_path = os.path.join(folder_path, file_name)
+            pages = [invoice_lines(vendor_identifier, total, invoice_date)]
+            if image_only:
+                write_image_pdf(file_path, pages)
+            else:
+                write_text_pdf(file_path, pages)
+            invoices.append(SyntheticInvoice(file_name, file_path, vendor_identifier, _EXTRACTED_VENDORS.get(vendor, vendor), total, invoice_date.strftime('%Y-%m-%d'), image_only))
+    return invoices
+
+
+def xlookup_vendors() -> List[str]:
+    """
+    :return: The vendors of the Xlookup table for the synthetic invoices, without duplicates.
+    """
+    return list(dict.fromkeys(vendor for vendor, _, _ in VENDOR_INVOICE_LAYOUTS.values()))
+
+
+def build_statement(transaction_count: int, seed: int = 2024) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Build a Transaction Details 2 DataFrame and Invoices worksheet rows for it, with half as many invoices as transactions:
+    exact amount and date matches, exact amounts on another date, invoices split across two same-day transactions
+    of the vendor, and invoices that only share the vendor.
+
+    :param transaction_count: Number of transactions, e.g. 100, 1000 or 10000.
+    :param seed: Seed of the amounts, dates and vendors.
+    :return: Tuple(invoices_df, transaction_details_df) as read from the worksheets.
+    """
+    rng = random.Random(seed)
+    statement_dates = pd.date_range('2024-01-21', '2024-02-21')
+    transactions = []
+    for row in range(transaction_count):
+        vendor = rng.choice(_STATEMENT_VENDORS)
+        transactions.append({
+            'Date': rng.choice(statement_dates).strftime('%m/%d/%Y'),
+            'Description': f"{vendor} CHARGE {row} - IT",
+            'Amount': round(rng.choice([9.99, 25.0, 45.95, 100.0, rng.uniform(1, 500)]), 2),
+            'File Name': None,
+            'Account': None,
+            'Sub-Account': None,
+            'Vendor': vendor,
+            'Explanation': None,
+            'Column1': None,
+        })
+    transaction_details_df = pd.DataFrame(transactions)
+    transaction_rows_by_vendor_day: Dict[Tuple[str, str], List[int]] = {}
+    for row, transaction in enumerate(transactions):
+        transaction_rows_by_vendor_day.setdefault((transaction['Vendor'], transaction['Date']), []).append(row)
+
+    invoices = []
+    for row in range(transaction_count // 2):
+        transaction_row = rng.randrange(transaction_count)
+        transaction = transactions[transaction_row]
+        kind = rng.random()
+        if kind < 0.5:
+            amount, invoice_date = transaction['Amount'], pd.Timestamp(transaction['Date'])
+        elif kind < 0.7:
+            amount, invoice_date = transaction['Amount'], rng.choice(statement_dates)
+        elif kind < 0.85:
+            same_day_rows = [other_row for other_row in transaction_rows_by_vendor_day[(transaction['Vendor'], transaction['Date'])] if other_row != transaction_row]
+            amount = round(transaction['Amount'] + (transactions[same_day_rows[0]]['Amount'] if same_day_rows else 0), 2)
+            invoice_date = pd.Timestamp(transaction['Date'])
+        else:
+            amount, invoice_date = round(rng.uniform(1, 500), 2), rng.choice(statement_dates)
+        invoices.append({
+            'File Name': f"{transaction['Vendor']} invoice {row}.pdf",
+            'File Path': f"H:/Amex Automation/t3nas/APPS/[02] Feb 2024/{transaction['Vendor']} invoice {row}.pdf",
+            'Amount': amount,
+            'Vendor': transaction['Vendor'],
+            'Date': invoice_date,
+        })
+    return pd.DataFrame(invoices), transaction_details_df
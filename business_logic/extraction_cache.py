@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+from typing import Optional, Dict, Any, Iterable
+
+from business_logic.pdf_processor import GeneralPatternProvider, VendorSpecificPatternProvider
+
+
+class ExtractionCache:
+    """
+    The `ExtractionCache` class is an on-disk, content-addressed store of PDF extraction results shared across statement runs.
+
+    Every entry is keyed by the SHA-256 of the PDF file content plus a fingerprint of the extraction settings
+    (the general and vendor-specific pattern tables and the statement start and end dates),
+    so renaming or moving an invoice keeps its entry, while changing a pattern or the statement window misses it.
+
+    Attributes
+        - `cache_path`: The directory the entries are stored in, one JSON file per entry.
+        - `max_size_bytes`: The total size of the entries above which the least recently used ones are evicted.
+        - `fingerprint`: The fingerprint of the extraction settings that is part of every key.
+
+    Methods
+        - `build_fingerprint(general_pattern, vendor_specific_pattern, start_date, end_date)` -> str: Fingerprints the extraction settings.
+        - `get(pdf_path, content_hash)` -> Optional[dict]: Returns the cached entry of the PDF or None.
+        - `put(pdf_path, entry, content_hash)` -> None: Stores the entry of the PDF.
+        - `hash_pdf_content(pdf_path)` -> str: The content hash of the PDF, pass it to `get` and `put` so the PDF is only read once.
+        - `evict()` -> int: Removes the least recently used entries until the cache fits in `max_size_bytes`.
+        - `invalidate(pdf_path)` -> int: Removes every entry, or every entry of a single PDF.
+
+    Example usage
+    ```
+    cache = ExtractionCache(cache_path, ExtractionCache.build_fingerprint(general_pattern, vendor_specific_pattern, start_date, end_date))
+    content_hash = cache.hash_pdf_content(pdf_path)
+    entry = cache.get(pdf_path, content_hash)
+    if entry is None:
+        cache.put(pdf_path, {'text': text, 'ocr_text': ocr_text, 'total': total, 'date': date, 'patterns_used': patterns_used}, content_hash)
+    ```
+    """
+
+    # Bump when the layout of an entry changes so entries written by older versions are never read back
+    _CACHE_VERSION = 1
+    _ENTRY_SUFFIX = '.json'
+    _READ_CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, cache_path: str, fingerprint: str = '', max_size_bytes: int = 512 * 1024 * 1024):
+        self.cache_path = cache_path
+        self.fingerprint = fingerprint
+        self.max_size_bytes = max_size_bytes
+        # The directory is only created by the first put, so looking up or invalidating a cache never creates one
+        self._cache_path_created = False
+
+    @classmethod
+    def build_fingerprint(cls, general_pattern: GeneralPatternProvider, vendor_specific_pattern: VendorSpecificPatternProvider, start_date: str, end_date: str,
+                          extraction_settings: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Fingerprint everything besides the PDF content that decides what is extracted from it.
+
+        :param general_pattern: The general total and date patterns.
+        :param vendor_specific_pattern: The vendor-specific total and date patterns.
+        :param start_date: Start date of the statement transactions.
+        :param end_date: End date of the statement transactions.
+        :param extraction_settings: Optional other settings that change the extraction result, e.g. streaming extraction.
+                                    Its dict keys are sorted, a table whose order matters is passed as a list of pairs.
+        :return: Hex digest of the extraction settings.
+        """
+        settings = {
+            'version': cls._CACHE_VERSION,
+            'general_total_patterns': general_pattern.get_total_pattern(),
+            'general_date_patterns': general_pattern.get_date_pattern(),
+            # (identifier, patterns) pairs in table order, the identifier listed first wins so the order decides what is extracted
+            'vendor_patterns': list(getattr(vendor_specific_pattern, '_VENDOR_PATTERNS', {}).items()),
+            'start_date': start_date,
+            'end_date': end_date,
+            'extraction_settings': extraction_settings or {}
+        }
+        return hashlib.sha256(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+    @classmethod
+    def hash_pdf_content(cls, pdf_path: str) -> str:
+        content_hash = hashlib.sha256()
+        with open(pdf_path, 'rb') as pdf_file:
+            for chunk in iter(lambda: pdf_file.read(cls._READ_CHUNK_SIZE), b''):
+                content_hash.update(chunk)
+        return content_hash.hexdigest()
+
+    def _entry_path(self, content_hash: str) -> str:
+        return os.path.join(self.cache_path, f"{content_hash}-{self.fingerprint}{self._ENTRY_SUFFIX}")
+
+    def _iter_entry_paths(self) -> Iterable[str]:
+        if not os.path.isdir(self.cache_path):
+            return
+        with os.scandir(self.cache_path) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(self._ENTRY_SUFFIX):
+                    yield entry.path
+
+    def get(self, pdf_path: str, content_hash: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        # The content hash is computed here when the caller hasn't already
+        entry_path = self._entry_path(content_hash or self.hash_pdf_content(pdf_path))
+        try:
+            with open(entry_path, 'r', encoding='utf-8') as entry_file:
+                entry = json.load(entry_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        # Refresh the modification time so eviction treats the entry as recently used
+        os.utime(entry_path)
+        return entry
+
+    def put(self, pdf_path: str, entry: Dict[str, Any], content_hash: Optional[str] = None) -> None:
+        entry_path = self._entry_path(content_hash or self.hash_pdf_content(pdf_path))
+        if not self._cache_path_created:
+            os.makedirs(self.cache_path, exist_ok=True)
+            self._cache_path_created = True
+        # Write to a temporary file first so parallel extraction workers never read a half-written entry
+        temporary_path = f"{entry_path}.{os.getpid()}.tmp"
+        with open(temporary_path, 'w', encoding='utf-8') as entry_file:
+            json.dump(entry, entry_file)
+        os.replace(temporary_path, entry_path)
+
+    def evict(self) -> int:
+        """
+        Remove the least recently used entries until the total size of the cache is at most `max_size_bytes`.
+
+        :return: The number of removed entries.
+        """
+        entries = []
+        for entry_path in self._iter_entry_paths():
+            entry_stat = os.stat(entry_path)
+            entries.append((entry_stat.st_mtime, entry_stat.st_size, entry_path))
+
+        total_size = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, entry_path in sorted(entries):
+            if total_size <= self.max_size_bytes:
+                break
+            os.remove(entry_path)
+            total_size -= size
+            removed += 1
+        return removed
+
+    def invalidate(self, pdf_path: Optional[str] = None) -> int:
+        """
+        Remove every cached entry, or only the entries of a single PDF when `pdf_path` is given.
+
+        :param pdf_path: Optional path of the PDF whose entries are removed.
+        :return: The number of removed entries.
+        """
+        content_hash = self.hash_pdf_content(pdf_path) if pdf_path else None
+        removed = 0
+        for entry_path in list(self._iter_entry_paths()):
+            if content_hash is None or os.path.basename(entry_path).startswith(content_hash):
+                os.remove(entry_path)
+                removed += 1
+        return removed
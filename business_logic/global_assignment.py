@@ -0,0 +1,121 @@
+from typing import Dict, Hashable, List, NamedTuple, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import linear_sum_assignment
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+
+class AssignedMatch(NamedTuple):
+    invoice_row_index: Hashable
+    transaction_row_index: Hashable
+    tier: int  # Position of the strategy tier the pair was a candidate of, 0 is the most preferred
+
+
+class GlobalAssignmentSolver:
+    """
+    The `GlobalAssignmentSolver` class assigns invoices to transactions over all candidate pairs at once,
+    instead of greedily in invoice order where an early, weaker match can take the transaction a later invoice matches exactly.
+
+    Every candidate pair is scored by its strategy tier, then by the distance in days between the invoice and transaction dates.
+    The candidate graph is split into its connected components, which are usually a handful of invoices of one vendor and amount,
+    and each component is solved as a rectangular assignment problem with `scipy.optimize.linear_sum_assignment`.
+    Pairs that aren't candidates cost more than any candidate, so the assignment matches as many invoices as possible first,
+    then prefers the better tiers and the closer dates.
+
+    Attributes
+        - `tier_weight`: The cost between two tiers, the date distance in days is capped just below it.
+
+    Methods
+        - `solve(tiered_candidates, invoice_dates, transaction_dates)` -> List[AssignedMatch]: Assigns invoices to transactions.
+
+    Example usage
+    ```
+    solver = GlobalAssignmentSolver()
+    assigned_matches = solver.solve([exact_amount_date_candidates, exact_amount_candidates], invoice_dates, transaction_dates)
+    ```
+    """
+
+    def __init__(self, tier_weight: int = 1000):
+        self.tier_weight = tier_weight
+
+    @staticmethod
+    def _to_days(labels: pd.Index, dates: Dict[Hashable, pd.Timestamp]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Days since the epoch of the dates of the labels, and a mask of the labels whose date is missing.
+        """
+        normalized_dates = pd.to_datetime(pd.Series([dates.get(label) for label in labels], dtype=object), errors='coerce')
+        missing = normalized_dates.isna().to_numpy()
+        days = normalized_dates.to_numpy().astype('datetime64[D]').astype(np.int64)
+        return days, missing
+
+    def solve(self, tiered_candidates: List[Dict[Hashable, List[Hashable]]], invoice_dates: Dict[Hashable, pd.Timestamp],
+              transaction_dates: Dict[Hashable, pd.Timestamp]) -> List[AssignedMatch]:
+        """
+        Assign invoices to transactions minimizing the total cost of the assigned candidate pairs.
+
+        :param tiered_candidates: Per tier, in order of preference, the candidate transaction indexes of each invoice index.
+        :param invoice_dates: The normalized date of each invoice index.
+        :param transaction_dates: The normalized date of each transaction index.
+        :return: List of AssignedMatch, in invoice order of first appearance in the candidates.
+        """
+        pair_invoices: List[Hashable] = []
+        pair_transactions: List[Hashable] = []
+        pair_tiers: List[int] = []
+        for tier, candidates in enumerate(tiered_candidates):
+            for invoice_row_index, transaction_row_indexes in candidates.items():
+                pair_invoices.extend([invoice_row_index] * len(transaction_row_indexes))
+                pair_transactions.extend(transaction_row_indexes)
+                pair_tiers.extend([tier] * len(transaction_row_indexes))
+        if not pair_invoices:
+            return []
+
+        # Positions in order of first appearance, so invoices keep the order of the candidates
+        invoice_codes, invoice_labels = pd.factorize(pd.Series(pair_invoices, dtype=object), sort=False)
+        transaction_codes, transaction_labels = pd.factorize(pd.Series(pair_transactions, dtype=object), sort=False)
+        tiers = np.asarray(pair_tiers, dtype=np.int64)
+
+        invoice_days, invoice_missing = self._to_days(invoice_labels, invoice_dates)
+        transaction_days, transaction_missing = self._to_days(transaction_labels, transaction_dates)
+        date_distances = np.minimum(np.abs(invoice_days[invoice_codes] - transaction_days[transaction_codes]), self.tier_weight - 1)
+        date_distances[invoice_missing[invoice_codes] | transaction_missing[transaction_codes]] = self.tier_weight - 1
+        all_costs = tiers * self.tier_weight + date_distances
+
+        # A pair that is a candidate of several tiers keeps its cheapest one
+        order = np.lexsort((all_costs, transaction_codes, invoice_codes))
+        first_of_pair = np.ones(len(order), dtype=bool)
+        first_of_pair[1:] = (np.diff(invoice_codes[order]) != 0) | (np.diff(transaction_codes[order]) != 0)
+        kept = order[first_of_pair]
+        rows, columns, costs, tiers = invoice_codes[kept], transaction_codes[kept], all_costs[kept], tiers[kept]
+        invoice_labels, transaction_labels = list(invoice_labels), list(transaction_labels)
+
+        # Invoices and transactions share one node numbering, transactions after invoices, to find the connected components
+        invoice_count = len(invoice_labels)
+        node_count = invoice_count + len(transaction_labels)
+        graph = coo_matrix((np.ones(len(rows)), (rows, columns + invoice_count)), shape=(node_count, node_count))
+        _, node_components = connected_components(graph, directed=False)
+        pair_components = node_components[rows]
+
+        # More than the cost of every candidate pair in a component combined, so a non-candidate pair is only assigned when nothing else fits
+        non_candidate_cost = int(costs.sum()) + 1
+
+        assigned: List[Tuple[int, int, int]] = []
+        order = np.argsort(pair_components, kind='stable')
+        boundaries = np.flatnonzero(np.diff(pair_components[order])) + 1
+        for component_pairs in np.split(order, boundaries):
+            component_rows, row_positions = np.unique(rows[component_pairs], return_inverse=True)
+            component_columns, column_positions = np.unique(columns[component_pairs], return_inverse=True)
+            cost_matrix = np.full((len(component_rows), len(component_columns)), non_candidate_cost, dtype=np.int64)
+            cost_matrix[row_positions, column_positions] = costs[component_pairs]
+            tier_matrix = np.zeros_like(cost_matrix)
+            tier_matrix[row_positions, column_positions] = tiers[component_pairs]
+
+            assigned_rows, assigned_columns = linear_sum_assignment(cost_matrix)
+            for row, column in zip(assigned_rows, assigned_columns):
+                if cost_matrix[row, column] == non_candidate_cost:
+                    continue
+                assigned.append((component_rows[row], component_columns[column], tier_matrix[row, column]))
+
+        assigned.sort()
+        return [AssignedMatch(invoice_labels[row], transaction_labels[column], int(tier)) for row, column, tier in assigned]
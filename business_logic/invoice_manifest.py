@@ -0,0 +1,132 @@
+import json
+import os
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+from business_logic.extraction_cache import ExtractionCache
+from utils.invoice_discovery import InvoiceFileEntry
+
+
+class ManifestDiff(NamedTuple):
+    new: List[InvoiceFileEntry]  # Not in the manifest yet
+    changed: List[InvoiceFileEntry]  # In the manifest with a different content hash
+    unchanged: List[InvoiceFileEntry]  # Same size and modification time, or same content hash
+    removed: List[str]  # File paths in the manifest that aren't in the folder anymore, including the ones removed on an earlier run
+
+
+class InvoiceManifest:
+    """
+    The `InvoiceManifest` class remembers, for every invoice pdf of a statement folder, its size, modification time and
+    content hash together with the data extracted from it, so a run only processes the invoices added or changed since the last one.
+
+    The size and modification time are compared first; the content is only hashed when they differ,
+    so a pdf that was copied again without changing stays unchanged.
+    The manifest starts over when the folder or the extraction settings fingerprint changes, e.g. a new statement window.
+
+    Attributes
+        - `manifest_path`: The JSON file the manifest is stored in.
+        - `folder_path`: The statement folder the manifest belongs to.
+        - `fingerprint`: The fingerprint of the extraction settings, see `ExtractionCache.build_fingerprint`.
+
+    Methods
+        - `diff(file_entries)` -> ManifestDiff: Splits the folder's invoices into new, changed, unchanged and removed.
+        - `record(file_entry, extracted)` -> None: Stores the invoice with the data extracted from it.
+        - `mark_removed(file_path)` -> None: Keeps the invoice, with the data extracted from it, as no longer in the folder.
+        - `content_hash(file_path)` -> str: The content hash of the invoice, computed once per run, the same as ExtractionCache.hash_pdf_content.
+        - `get_extracted(file_path)` -> Optional[dict]: The data extracted from the invoice on a previous run.
+        - `update_extracted(file_path, column, value)` -> None: Changes one value of the stored data, e.g. a vendor resolved again.
+        - `save()` -> None: Writes the manifest to `manifest_path`.
+
+    Example usage
+    ```
+    manifest = InvoiceManifest(manifest_path, folder_path, fingerprint)
+    manifest_diff = manifest.diff(invoice_discovery.list_invoice_files(folder_path))
+    ```
+    """
+
+    _MANIFEST_VERSION = 1
+
+    def __init__(self, manifest_path: str, folder_path: str, fingerprint: str = ''):
+        self.manifest_path = manifest_path
+        self.folder_path = folder_path
+        self.fingerprint = fingerprint
+        self._invoices: Dict[str, Dict[str, Any]] = self._load()
+        # Content hashes computed by diff(), reused by record() and the extraction cache so no pdf is hashed twice in a run
+        self._hashes: Dict[str, str] = {}
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as manifest_file:
+                manifest = json.load(manifest_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        if manifest.get('version') != self._MANIFEST_VERSION or manifest.get('folder_path') != self.folder_path or manifest.get('fingerprint') != self.fingerprint:
+            return {}
+        return manifest.get('invoices', {})
+
+    def content_hash(self, file_path: str) -> str:
+        if file_path not in self._hashes:
+            self._hashes[file_path] = ExtractionCache.hash_pdf_content(file_path)
+        return self._hashes[file_path]
+
+    def diff(self, file_entries: Iterable[InvoiceFileEntry]) -> ManifestDiff:
+        """
+        Compare the invoices currently in the folder against the manifest.
+
+        :param file_entries: The invoices of the folder, e.g. from InvoiceDiscovery.list_invoice_files.
+        :return: ManifestDiff, each list in the order of file_entries.
+        """
+        new, changed, unchanged = [], [], []
+        seen_file_paths = set()
+        for file_entry in file_entries:
+            seen_file_paths.add(file_entry.file_path)
+            manifest_entry = self._invoices.get(file_entry.file_path)
+            if manifest_entry is None:
+                new.append(file_entry)
+                continue
+
+            # Back in the folder after being removed, its worksheet row was kept so it is compared like any other invoice
+            manifest_entry.pop('removed', None)
+            if manifest_entry['size'] == file_entry.size and manifest_entry['modified_time'] == file_entry.modified_time:
+                unchanged.append(file_entry)
+            elif manifest_entry['content_hash'] == self.content_hash(file_entry.file_path):
+                # Touched or copied again without changing; remember the new modification time so it isn't hashed again
+                manifest_entry['size'], manifest_entry['modified_time'] = file_entry.size, file_entry.modified_time
+                unchanged.append(file_entry)
+            else:
+                changed.append(file_entry)
+        removed = [file_path for file_path in self._invoices if file_path not in seen_file_paths]
+        return ManifestDiff(new, changed, unchanged, removed)
+
+    def record(self, file_entry: InvoiceFileEntry, extracted: Dict[str, Any]) -> None:
+        """
+        :param file_entry: The invoice.
+        :param extracted: The data extracted from it, e.g. {'Amount': ..., 'Vendor': ..., 'Date': ...}, JSON serializable.
+        :return: None
+        """
+        self._invoices[file_entry.file_path] = {
+            'file_name': file_entry.file_name,
+            'size': file_entry.size,
+            'modified_time': file_entry.modified_time,
+            'content_hash': self.content_hash(file_entry.file_path),
+            'extracted': extracted
+        }
+
+    def mark_removed(self, file_path: str) -> None:
+        # Its Invoices worksheet row is kept, so the invoice stays in the manifest and every later run still reports the row
+        self._invoices[file_path]['removed'] = True
+
+    def get_extracted(self, file_path: str) -> Optional[Dict[str, Any]]:
+        manifest_entry = self._invoices.get(file_path)
+        return manifest_entry['extracted'] if manifest_entry is not None else None
+
+    def update_extracted(self, file_path: str, column: str, value: Any) -> None:
+        # The content is unchanged, so the invoice keeps its size, modification time and content hash
+        self._invoices[file_path]['extracted'][column] = value
+
+    def save(self) -> None:
+        manifest = {'version': self._MANIFEST_VERSION, 'folder_path': self.folder_path, 'fingerprint': self.fingerprint, 'invoices': self._invoices}
+        # Write to a temporary file first so an interrupted run never leaves a half-written manifest
+        temporary_path = f"{self.manifest_path}.tmp"
+        with open(temporary_path, 'w', encoding='utf-8') as manifest_file:
+            json.dump(manifest, manifest_file)
+        os.replace(temporary_path, self.manifest_path)
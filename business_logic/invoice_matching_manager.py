@@ -3,8 +3,11 @@ from typing import Optional, List, Set, Hashable
 
 from business_logic.matching_strategies import MatchingStrategy, ExactAmountDateStrategy, \
 	ExactAmountAndExcludeDateStrategy, CombinationTotalStrategy, VendorOnlyStrategy
+from business_logic.transaction_index import TransactionIndex
+from business_logic.global_assignment import GlobalAssignmentSolver
 
 from utils.utilities import print_dataframe, ProgressTrackingMixin
+from utils.instrumentation import instrumentation
 
 
 class InvoiceMatchingManager(ProgressTrackingMixin):
@@ -20,12 +23,17 @@ class InvoiceMatchingManager(ProgressTrackingMixin):
         - `matched_invoices`: A set that tracks the matched invoice indexes.
         - `primary_strategies`: A list containing the primary strategies used to match invoices and transactions.
         - `fallback_strategy`: A strategy used to match unmatched invoices and empty transaction details File Names.
+        - `assignment_mode`: 'greedy' matches invoices one by one in invoice order, 'global' first assigns the one-to-one
+          strategies' candidates of all invoices at once with `GlobalAssignmentSolver`, then runs the strategies greedily on what's left.
 
     Methods
-        - `__init__(primary_strategies, fallback_strategy, **kwargs)`: Initializes the `InvoiceMatchingManager` instance with the provided primary and fallback strategies.
+        - `__init__(primary_strategies, fallback_strategy, assignment_mode, **kwargs)`: Initializes the `InvoiceMatchingManager` instance with the provided primary and fallback strategies.
+        - `Set_assignment_mode(assignment_mode) -> None`: Switches between the 'greedy' and 'global' assignment modes.
         - `Set_data(invoice_df, transaction_details_df) -> None`: Sets the invoice and transaction details data.
         - `Execute_invoice_matching()`: Executes the invoice matching process using the primary and fallback strategies.
         - `Sequence_file_names()`: Sequences the File Names starting from index 8 across the transaction details data.
+        - `Start_incremental_matching(transaction_details_df)`, `match_arrived_invoices(invoice_batch_df)`, `finish_incremental_matching()`:
+          Match invoices as they arrive instead of all at once, in the 'greedy' assignment mode.
 
     Example usage
     ```
@@ -40,7 +48,9 @@ class InvoiceMatchingManager(ProgressTrackingMixin):
     and other classes used within this class, refer to their respective documentation.
     """
 
-	def __init__(self, primary_strategies: List[MatchingStrategy], fallback_strategy: MatchingStrategy, **kwargs):
+	ASSIGNMENT_MODES = ('greedy', 'global')
+
+	def __init__(self, primary_strategies: List[MatchingStrategy], fallback_strategy: MatchingStrategy, assignment_mode: str = 'greedy', **kwargs):
 		super().__init__(**kwargs)  # Making sure that parameters aren't consumed by other classes through inheritance--> MRO 7/8/2024
 		self.invoice_df: Optional[pd.DataFrame] = None
 		self.transaction_details_df: Optional[pd.DataFrame] = None
@@ -52,6 +62,23 @@ class InvoiceMatchingManager(ProgressTrackingMixin):
 		# After the pass through of primary strategies to match invoices and transactions; match with a broader approach
 		self._fallback_strategy: MatchingStrategy = fallback_strategy
 
+		self.assignment_mode: str = 'greedy'
+		self.set_assignment_mode(assignment_mode)
+		self._global_assignment_solver = GlobalAssignmentSolver()
+		self._transaction_index: Optional[TransactionIndex] = None
+		self._arrived_invoice_dfs: List[pd.DataFrame] = []  # The invoices matched so far by match_arrived_invoices
+
+	def set_assignment_mode(self, assignment_mode: str) -> None:
+		"""
+        Set how the primary strategies assign invoices to transactions.
+
+        :param assignment_mode: 'greedy' or 'global'.
+        :return: None
+        """
+		if assignment_mode not in self.ASSIGNMENT_MODES:
+			raise ValueError(f"Unknown assignment mode '{assignment_mode}', expected one of {self.ASSIGNMENT_MODES}")
+		self.assignment_mode = assignment_mode
+
 	def set_data(self, invoice_df: pd.DataFrame, transaction_details_df: pd.DataFrame) -> None:
 		"""
         Set the invoice and transaction details data.
@@ -64,23 +91,74 @@ class InvoiceMatchingManager(ProgressTrackingMixin):
 		self.start_progress_tracking(total_steps=len(invoice_df.index), description="Matching Invoices")
 		self.transaction_details_df: pd.DataFrame = transaction_details_df
 
+		# Normalize amounts, dates and vendors once and resolve the exact-match candidates of every invoice in one join,
+		# instead of each strategy rescanning transaction_details_df for every invoice
+		with instrumentation.span('build_transaction_index', 'matching'):
+			self._transaction_index = TransactionIndex(invoice_df, transaction_details_df)
+		for strategy in self._primary_strategy + [self._fallback_strategy]:
+			strategy.prepare(self._transaction_index)
+
+	def _assign_globally(self) -> None:
+		"""
+        Match every invoice the one-to-one primary strategies have candidates for in a single assignment,
+        scored by the position of the strategy in the primary strategies and then by the distance between the dates,
+        so an early invoice can't take the transaction a later invoice matches on a better strategy.
+
+        :return: None
+        """
+		tiered_strategies = []
+		tiered_candidates = []
+		for strategy in self._primary_strategy:
+			candidates = strategy.assignment_candidates()
+			if candidates is not None:
+				tiered_strategies.append(strategy)
+				tiered_candidates.append(candidates)
+		if not tiered_candidates:
+			return
+
+		with instrumentation.span('global_assignment', 'matching'):
+			assigned_matches = self._global_assignment_solver.solve(tiered_candidates, self._transaction_index.invoice_dates, self._transaction_index.transaction_dates)
+		for assigned_match in assigned_matches:
+			strategy = tiered_strategies[assigned_match.tier]
+			invoice_row = self.invoice_df.loc[assigned_match.invoice_row_index]
+			strategy.add_assigned_match(invoice_row, assigned_match.transaction_row_index, self.transaction_details_df, self.matched_transactions, self.matched_invoices)
+			self.update_progress()
+
+	@instrumentation.span('execute_invoice_matching', 'matching')
 	def execute_invoice_matching(self) -> None:
 		"""
         Executes the invoice matching process using primary and fallback strategies.
 
         :return: None
         """
+		# Global mode: assign the one-to-one strategies' candidates of all invoices at once, the passes below only see what's left
+		if self.assignment_mode == 'global' and self._transaction_index is not None:
+			self._assign_globally()
+
+		self._match_with_primary_strategies(self.invoice_df)
+		self._match_with_fallback_strategy()
+		self.complete_progress()
+
+	def _match_with_primary_strategies(self, invoice_df: pd.DataFrame) -> None:
 		# First pass: Iterate over each invoice row and attempt to match using primary strategies
-		for _, invoice_row in self.invoice_df.iterrows():
+		for _, invoice_row in invoice_df.iterrows():
+			if invoice_row.name in self.matched_invoices:
+				continue  # Already matched by the global assignment
 			# Try to find a match using each strategy in sequence
 			for strategy in self._primary_strategy:
-				if strategy.execute(invoice_row, self.transaction_details_df, self.matched_transactions, self.matched_invoices):
+				# Aggregated only, a traced span per invoice and strategy would flood the trace
+				with instrumentation.span(type(strategy).__name__, 'matching', trace=False):
+					matched = strategy.execute(invoice_row, self.transaction_details_df, self.matched_transactions, self.matched_invoices)
+				if matched:
 					self.update_progress()
 					break  # If a match is found, break out of the loop and proceed to the next invoice
 
+	def _match_with_fallback_strategy(self) -> None:
 		# Second pass: Apply the fallback strategy only to unmatched invoices and where transaction_details_df "File name" is empty
 		for _, invoice_row in self.invoice_df.iterrows():
-			if self._fallback_strategy.execute(invoice_row, self.transaction_details_df, self.matched_transactions, self.matched_invoices):
+			with instrumentation.span(type(self._fallback_strategy).__name__, 'matching', trace=False):
+				matched = self._fallback_strategy.execute(invoice_row, self.transaction_details_df, self.matched_transactions, self.matched_invoices)
+			if matched:
 				self.update_progress()
 				continue  # If a match is found, proceed to the next unmatched invoice after finding a match
 
@@ -89,20 +167,88 @@ class InvoiceMatchingManager(ProgressTrackingMixin):
 		if not unmatched_invoices_df.empty:
 			print_dataframe(unmatched_invoices_df, "Unmatched Invoices:")
 
-		self.complete_progress()
+	def start_incremental_matching(self, transaction_details_df: pd.DataFrame) -> None:
+		"""
+        Start matching invoices as they arrive, e.g. from the InvoicePipeline, instead of all at once with set_data and execute_invoice_matching.
+        Only the 'greedy' assignment mode can match invoices before all of them are known.
 
+        :param transaction_details_df: The dataframe containing the transaction details data.
+        :return: None
+        """
+		if self.assignment_mode != 'greedy':
+			raise ValueError(f"Invoices can only be matched as they arrive in the 'greedy' assignment mode, not '{self.assignment_mode}'")
+		self.transaction_details_df = transaction_details_df
+		self.invoice_df = None
+		self.matched_transactions = set()
+		self.matched_invoices = set()
+		self._arrived_invoice_dfs = []
+		self._transaction_index = None
+
+	def match_arrived_invoices(self, invoice_batch_df: pd.DataFrame) -> None:
+		"""
+        Match the invoices that arrived since the last call with the primary strategies, in invoice order,
+        which gives the same matches as the first pass of execute_invoice_matching over all invoices.
+        The TransactionIndex of every batch after the first reuses the normalized transactions of the one before.
+
+        :param invoice_batch_df: The arrived invoices, indexed by their position among all invoices.
+        :return: None
+        """
+		with instrumentation.span('build_transaction_index', 'matching', trace=False):
+			if self._transaction_index is None:
+				self._transaction_index = TransactionIndex(invoice_batch_df, self.transaction_details_df)
+			else:
+				self._transaction_index = self._transaction_index.with_invoices(invoice_batch_df)
+		for strategy in self._primary_strategy:
+			strategy.prepare(self._transaction_index)
+		self._match_with_primary_strategies(invoice_batch_df)
+		self._arrived_invoice_dfs.append(invoice_batch_df)
+
+	@instrumentation.span('finish_incremental_matching', 'matching')
+	def finish_incremental_matching(self) -> None:
+		"""
+        Once every invoice has arrived, apply the fallback strategy to the unmatched invoices, the second pass of execute_invoice_matching.
+
+        :return: None
+        """
+		self.invoice_df = pd.concat(self._arrived_invoice_dfs) if self._arrived_invoice_dfs else pd.DataFrame(columns=['File Name', 'File Path', 'Amount', 'Vendor', 'Date'])
+		with instrumentation.span('build_transaction_index', 'matching'):
+			if self._transaction_index is None:
+				self._transaction_index = TransactionIndex(self.invoice_df, self.transaction_details_df)
+			else:
+				self._transaction_index = self._transaction_index.with_invoices(self.invoice_df)
+		for strategy in self._primary_strategy + [self._fallback_strategy]:
+			strategy.prepare(self._transaction_index)
+		self._match_with_fallback_strategy()
+
+	# Worksheet row of the first transaction, the headers are in row 7
+	SEQUENCE_START_ROW = 8
+
+	@staticmethod
+	def build_sequenced_file_names(file_names: pd.Series, start_row: int = 8) -> pd.Series:
+		"""
+        Prefix every matched File Name with the worksheet row of its transaction, e.g. "8 - invoice.pdf", by position so any index works.
+        Unmatched transactions stay blank, and a File Name that already carries its own row, from processing the worksheet before, isn't prefixed twice.
+
+        :param file_names: The 'File Name' column of the transaction details, in worksheet order.
+        :param start_row: Worksheet row of the first transaction.
+        :return: The sequenced File Names with the index of file_names.
+        """
+		row_numbers = pd.Series(range(start_row, start_row + len(file_names)), index=file_names.index).astype(str)
+		file_name_texts = file_names.astype('string')
+		is_matched = file_name_texts.notna() & (file_name_texts != '')
+		is_sequenced = file_name_texts.str.extract(r'^(\d+) - ', expand=False) == row_numbers
+		return file_names.mask(is_matched & ~is_sequenced.fillna(False), row_numbers + ' - ' + file_name_texts)
+
+	@instrumentation.span('sequence_file_names', 'matching')
 	def sequence_file_names(self) -> None:
 		"""
         Sequence File Names starting from index 8 across the transaction_details_df.
 
         :return: None
         """
-		self.start_progress_tracking(len(self.transaction_details_df), description="Sequencing File Names in Transaction Details 2 Dataframe:")
-		for i in range(len(self.transaction_details_df)):
-			self.transaction_details_df.at[
-				i, 'File Name'] = f"{8 + i} - {self.transaction_details_df.loc[i, 'File Name']}"
-			self.update_progress()
-
+		self.start_progress_tracking(1, description="Sequencing File Names in Transaction Details 2 Dataframe:")
+		self.transaction_details_df['File Name'] = self.build_sequenced_file_names(self.transaction_details_df['File Name'], self.SEQUENCE_START_ROW)
+		self.update_progress()
 		self.complete_progress()
 
 
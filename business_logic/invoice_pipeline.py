@@ -0,0 +1,186 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from business_logic.invoice_matching_manager import InvoiceMatchingManager
+from business_logic.pdf_processing_manager import PDFProcessingManager
+from models.pdf import PDF
+from models.worksheet import Worksheet
+from utils.instrumentation import instrumentation
+
+# Put on a queue after the last invoice
+_END_OF_INVOICES = None
+
+
+class InvoicePipeline:
+    """
+    The `InvoicePipeline` class overlaps the extraction of the invoice pdfs, the matching and the Excel I/O of processing the Invoices
+    and Transaction Details 2 worksheets, instead of running them one after the other with the CPU idle during every Excel round-trip.
+
+    Three stages run concurrently on an asyncio event loop, connected by bounded queues so a stage that falls behind slows down the ones before it:
+        - Extraction: the pdfs are extracted in worker processes by `PDFProcessingManager.stream_pdfs` and handed on in invoice order.
+        - Matching: every batch of arrived invoices is matched with the primary strategies right away, on a thread of its own,
+          by `InvoiceMatchingManager.match_arrived_invoices`; the fallback strategy runs once every invoice has arrived.
+        - Excel writer: the only stage that touches the workbook. It appends the arrived invoices to the Invoices worksheet,
+          whatever has arrived since its last write in one write, and writes Transaction Details 2 at the end.
+          It runs on the event loop's thread, the thread the workbook was opened on, which Excel's COM objects require.
+
+    The wall time comes close to the slowest stage's instead of the sum of the stages; the fallback strategy, the sequencing
+    and the Transaction Details 2 write still run after the last invoice. The Invoices worksheet is never read back,
+    the matching gets the invoices straight from the extraction. In the 'global' assignment mode the invoices are matched once all of them arrived.
+
+    Attributes
+        - `pdf_proc_mng`: The PDFProcessingManager extracting the pdfs, its max_workers is the number of worker processes.
+        - `invoice_matching_manager`: The InvoiceMatchingManager matching the invoices to the transactions.
+        - `queue_size`: Most invoices waiting in a queue between two stages, and most pdfs being extracted at once.
+        - `write_batch_size`: Most invoice rows the Excel writer writes at once.
+
+    Methods
+        - `run(invoice_records, invoices_worksheet, xlookup_table_worksheet, transaction_details_worksheet)` -> pd.DataFrame:
+          Processes the invoices and returns the matched and sequenced transaction details written to Transaction Details 2.
+
+    Example usage
+    ```
+    invoice_pipeline = InvoicePipeline(pdf_proc_mng, invoice_matching_manager)
+    invoice_pipeline.run(invoice_discovery.discover(folder_path, sub_folder_name), invoices_worksheet, xlookup_table_worksheet, transaction_details_worksheet)
+    ```
+    """
+
+    # Headers are in row 7, data starts at row 8
+    START_ROW = 8
+    _INVOICE_COLUMNS = ['File Name', 'File Path', 'Amount', 'Vendor', 'Date']
+
+    def __init__(self, pdf_proc_mng: PDFProcessingManager, invoice_matching_manager: InvoiceMatchingManager, queue_size: int = 32, write_batch_size: int = 200):
+        self.pdf_proc_mng: PDFProcessingManager = pdf_proc_mng
+        self.invoice_matching_manager: InvoiceMatchingManager = invoice_matching_manager
+        self.queue_size: int = queue_size
+        self.write_batch_size: int = write_batch_size
+
+    def run(self, invoice_records: Iterable[Tuple[str, str]], invoices_worksheet: Worksheet, xlookup_table_worksheet: Worksheet, transaction_details_worksheet: Worksheet) -> pd.DataFrame:
+        """
+        :param invoice_records: (File Name, File Path) of every invoice pdf in order, e.g. straight from InvoiceDiscovery.discover.
+        :param invoices_worksheet: The Invoices worksheet, its rows are replaced by the invoices.
+        :param xlookup_table_worksheet: The Xlookup table worksheet the vendors are read from.
+        :param transaction_details_worksheet: The Transaction Details 2 worksheet, updated with its strategy once the invoices are matched.
+        :return: The transaction details with the sequenced File Names of the matched invoices, without the 'File Path' column.
+        """
+        return asyncio.run(self._run(invoice_records, invoices_worksheet, xlookup_table_worksheet, transaction_details_worksheet))
+
+    async def _run(self, invoice_records: Iterable[Tuple[str, str]], invoices_worksheet: Worksheet, xlookup_table_worksheet: Worksheet, transaction_details_worksheet: Worksheet) -> pd.DataFrame:
+        loop = asyncio.get_running_loop()
+        transaction_details_df = transaction_details_worksheet.read_data_as_dataframe()
+        if 'File Path' not in transaction_details_df.columns:
+            transaction_details_df['File Path'] = ''
+        existing_invoice_row_count = self._count_invoice_rows(invoices_worksheet)
+
+        matching_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        writing_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        # One thread, so the invoices are matched in order and transaction_details_df is only ever changed by one thread
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='invoice_matching') as matching_executor:
+            stages = [
+                loop.create_task(self._extract_invoices(invoice_records, xlookup_table_worksheet, [matching_queue, writing_queue])),
+                loop.create_task(self._match_invoices(matching_queue, transaction_details_df, matching_executor)),
+                loop.create_task(self._write_invoices(writing_queue, invoices_worksheet, existing_invoice_row_count))
+            ]
+            try:
+                await asyncio.gather(*stages)
+            except BaseException:
+                # A failed stage would leave the others waiting on its queue forever
+                for stage in stages:
+                    stage.cancel()
+                raise
+
+        # Sequence the 'File Name' column of invoices that matches were found for transaction_details_df, starting at index 8 6/29/2024
+        self.invoice_matching_manager.sequence_file_names()
+        transaction_details_df = self.invoice_matching_manager.transaction_details_df.drop('File Path', axis=1)
+        transaction_details_worksheet.update_sheet(transaction_details_df)
+        return transaction_details_df
+
+    @staticmethod
+    def _count_invoice_rows(invoices_worksheet: Worksheet) -> int:
+        existing_data_df = invoices_worksheet.read_data_as_dataframe()
+        return len(existing_data_df.index) if existing_data_df is not None else 0
+
+    async def _extract_invoices(self, invoice_records: Iterable[Tuple[str, str]], xlookup_table_worksheet: Worksheet, queues: List[asyncio.Queue]) -> None:
+        with instrumentation.span('pipeline_extraction', 'pipeline'):
+            async for pdf_name, pdf_path, pdf in self.pdf_proc_mng.stream_pdfs(invoice_records, xlookup_table_worksheet, self.queue_size):
+                invoice = self._to_invoice_values(pdf_name, pdf_path, pdf)
+                for queue in queues:
+                    await queue.put(invoice)
+        for queue in queues:
+            await queue.put(_END_OF_INVOICES)
+
+    @staticmethod
+    def _to_invoice_values(pdf_name: str, pdf_path: str, pdf: Optional[PDF]) -> List[Any]:
+        # The row of the Invoices worksheet, a failed pdf only has its File Name and File Path like a listing by the macro
+        if pdf is None:
+            return [pdf_name, pdf_path, None, None, None]
+        return [pdf.pdf_name, pdf.pdf_path, pdf.total, pdf.vendor, pdf.date]
+
+    @staticmethod
+    async def _take_batch(queue: asyncio.Queue, max_batch_size: int, min_batch_size: int = 1) -> Tuple[List[List[Any]], bool]:
+        """
+        Wait for min_batch_size invoices, then take the ones that already arrived after them too, up to max_batch_size.
+
+        :return: Tuple(the invoices, whether the end of the invoices was reached).
+        """
+        batch = []
+        while len(batch) < min_batch_size:
+            invoice = await queue.get()
+            if invoice is _END_OF_INVOICES:
+                return batch, True
+            batch.append(invoice)
+        while len(batch) < max_batch_size and not queue.empty():
+            invoice = queue.get_nowait()
+            if invoice is _END_OF_INVOICES:
+                return batch, True
+            batch.append(invoice)
+        return batch, False
+
+    async def _match_invoices(self, matching_queue: asyncio.Queue, transaction_details_df: pd.DataFrame, matching_executor: ThreadPoolExecutor) -> None:
+        loop = asyncio.get_running_loop()
+        invoice_matching_manager = self.invoice_matching_manager
+        match_as_invoices_arrive = invoice_matching_manager.assignment_mode == 'greedy'
+        if match_as_invoices_arrive:
+            invoice_matching_manager.start_incremental_matching(transaction_details_df)
+
+        arrived_invoices: List[List[Any]] = []
+        end_of_invoices = False
+        while not end_of_invoices:
+            batch, end_of_invoices = await self._take_batch(matching_queue, self.queue_size)
+            if not batch:
+                continue
+            # Indexed by position among all invoices, the index the Invoices worksheet would be read back with
+            batch_df = pd.DataFrame(batch, columns=self._INVOICE_COLUMNS, index=range(len(arrived_invoices), len(arrived_invoices) + len(batch)))
+            arrived_invoices.extend(batch)
+            if match_as_invoices_arrive:
+                with instrumentation.span('pipeline_matching', 'pipeline', trace=False):
+                    await loop.run_in_executor(matching_executor, invoice_matching_manager.match_arrived_invoices, batch_df)
+
+        if match_as_invoices_arrive:
+            await loop.run_in_executor(matching_executor, invoice_matching_manager.finish_incremental_matching)
+        else:
+            invoice_matching_manager.set_data(pd.DataFrame(arrived_invoices, columns=self._INVOICE_COLUMNS), transaction_details_df)
+            await loop.run_in_executor(matching_executor, invoice_matching_manager.execute_invoice_matching)
+
+    async def _write_invoices(self, writing_queue: asyncio.Queue, invoices_worksheet: Worksheet, existing_invoice_row_count: int) -> None:
+        next_row = self.START_ROW
+        end_of_invoices = False
+        while not end_of_invoices:
+            # Full batches only, every write blocks the event loop for the round-trip and what arrives meanwhile waits in the queues
+            batch, end_of_invoices = await self._take_batch(writing_queue, self.write_batch_size, self.write_batch_size)
+            if not batch:
+                continue
+            # Runs on the event loop's thread; the pdfs already submitted to the workers and the matching thread carry on during the round-trip
+            with instrumentation.span('pipeline_invoices_write', 'pipeline', rows=len(batch)):
+                invoices_worksheet.write_values(f'A{next_row}', batch)
+            next_row += len(batch)
+
+        # Clear the rows of the previous listing that are below the new ones
+        written_row_count = next_row - self.START_ROW
+        if existing_invoice_row_count > written_row_count:
+            invoices_worksheet.write_values(f'A{next_row}', [[None] * len(self._INVOICE_COLUMNS)] * (existing_invoice_row_count - written_row_count))
+        # The table is fitted to the new rows, the same as TemplateInvoiceUpdateStrategy(replace_rows=True) does
+        invoices_worksheet.resize_tables()
@@ -1,12 +1,52 @@
 from abc import abstractmethod, ABC
-from itertools import combinations
-from typing import Tuple, Hashable, Set
+from typing import Tuple, Hashable, Set, Optional, Dict, List
 
-import numpy as np
 import pandas as pd
 
+from business_logic.subset_sum import SubsetSumSolver
+from business_logic.transaction_index import TransactionIndex
+from utils.instrumentation import instrumentation
+
 
 class MatchingStrategy(ABC):
+    # Written to the 'Column1' of every transaction the strategy matches
+    MATCH_TYPE: str = ''
+
+    def __init__(self):
+        self._transaction_index: Optional[TransactionIndex] = None
+
+    def prepare(self, transaction_index: Optional[TransactionIndex]) -> None:
+        """
+        Hand the strategy the index built once for the current invoice and transaction details data.
+        Without an index the strategy filters transaction_details_df directly on every call.
+
+        :param transaction_index: The TransactionIndex of the current data, or None.
+        :return: None
+        """
+        self._transaction_index = transaction_index
+
+    def assignment_candidates(self) -> Optional[Dict[Hashable, List[Hashable]]]:
+        """
+        The candidate transaction indexes of every invoice index, for strategies that match one invoice to one transaction
+        and can be solved by the global assignment of InvoiceMatchingManager. None for every other strategy.
+
+        :return: Dict of invoice index to candidate transaction indexes in transaction order, or None.
+        """
+        return None
+
+    def add_assigned_match(self, invoice_row: pd.Series, found_match_index: Hashable, transaction_details_df: pd.DataFrame, matched_transactions: Set[Hashable], matched_invoices: Set[Hashable]) -> None:
+        """
+        Record a match of the strategy that was decided outside of `execute`, e.g. by the global assignment.
+
+        :param invoice_row: A pd.Series representing the invoice row data.
+        :param found_match_index: Index of the matched transaction.
+        :param transaction_details_df: A pd.DataFrame representing the transaction details data.
+        :param matched_transactions: A set containing the indexes of already matched transactions.
+        :param matched_invoices: A set containing the indexes of already matched invoices.
+        :return: None
+        """
+        vendor, total, date, file_name, file_path = self._load_invoice_data(invoice_row)
+        self._add_match(transaction_details_df, found_match_index, file_name, file_path, self.MATCH_TYPE, matched_transactions, matched_invoices, invoice_row.name)
 
     @abstractmethod
     def execute(self, invoice_row: pd.Series, transaction_details_df: pd.DataFrame, matched_transactions: set, matched_invoices: set):
@@ -49,6 +89,7 @@ class MatchingStrategy(ABC):
         transaction_details_df.at[found_match_index, 'File Path'] = file_path
         matched_transactions.add(found_match_index)
         matched_invoices.add(invoice_row_index)
+        instrumentation.count(f"matched_transactions: {match_type}")
 
 
 class ExactAmountDateStrategy(MatchingStrategy):
@@ -57,8 +98,16 @@ class ExactAmountDateStrategy(MatchingStrategy):
     The `execute` method defined in this class uses the exact amount and date for matching.
 
     Methods
+        - `assignment_candidates()` -> Optional[Dict]: The exact amount and date candidates of every invoice.
         - `execute()` -> bool: Executes the matching strategy based on the exact amount and date match.
     """
+    MATCH_TYPE = 'Exact Amount and Date Match'
+
+    def assignment_candidates(self) -> Optional[Dict[Hashable, List[Hashable]]]:
+        if self._transaction_index is None:
+            return None
+        return self._transaction_index.all_exact_amount_date_candidates()
+
     def execute(self, invoice_row: pd.Series, transaction_details_df: pd.DataFrame, matched_transactions: Set[int], matched_invoices: Set[Hashable]) -> bool:
         """
         Executes the matching strategy based on the exact amount and date match.
@@ -71,17 +120,22 @@ class ExactAmountDateStrategy(MatchingStrategy):
         """
         vendor, total, date, file_name, file_path = self._load_invoice_data(invoice_row)
 
-        found_match: pd.DataFrame = transaction_details_df[
-            (~transaction_details_df.index.isin(matched_transactions)) &  # Excludes transactions already matched
-            (transaction_details_df['Vendor'].str.contains(vendor, case=False, na=False)) &  # Flexible, case-insensitive matching
-            (transaction_details_df['Amount'] == total) &
-            (pd.to_datetime(transaction_details_df['Date'], errors='coerce') == date)
-        ]
-
-        if not found_match.empty:
-            found_match_index = found_match.iloc[0].name
+        if self._transaction_index is not None:
+            # Candidates of every invoice were resolved with one join when the data was set
+            candidates = self._transaction_index.exact_amount_date_candidates(invoice_row.name)
+            found_match_index = self._transaction_index.first_available(candidates, matched_transactions)
+        else:
+            found_match: pd.DataFrame = transaction_details_df[
+                (~transaction_details_df.index.isin(matched_transactions)) &  # Excludes transactions already matched
+                (transaction_details_df['Vendor'].str.contains(vendor, case=False, na=False)) &  # Flexible, case-insensitive matching
+                (transaction_details_df['Amount'] == total) &
+                (pd.to_datetime(transaction_details_df['Date'], errors='coerce') == date)
+            ]
+            found_match_index = found_match.iloc[0].name if not found_match.empty else None
+
+        if found_match_index is not None:
             invoice_row_index = invoice_row.name
-            self._add_match(transaction_details_df, found_match_index, file_name, file_path, 'Exact Amount and Date Match', matched_transactions, matched_invoices, invoice_row_index)
+            self._add_match(transaction_details_df, found_match_index, file_name, file_path, self.MATCH_TYPE, matched_transactions, matched_invoices, invoice_row_index)
 
             # print(f"Match Found For ExactAmountDateStrategy In Transaction With ID {found_match_index}!")
             return True
@@ -95,8 +149,16 @@ class ExactAmountAndExcludeDateStrategy(MatchingStrategy):
     The `execute` method defined in this class uses the exact amount and excludes the date for matching.
 
     Methods
+        - `assignment_candidates()` -> Optional[Dict]: The exact amount candidates of every invoice.
         - `execute()` -> bool:  Executes the matching strategy based on the exact amount and excluding date.
     """
+    MATCH_TYPE = 'Amount and Exclude Date Match'
+
+    def assignment_candidates(self) -> Optional[Dict[Hashable, List[Hashable]]]:
+        if self._transaction_index is None:
+            return None
+        return self._transaction_index.all_exact_amount_candidates()
+
     def execute(self, invoice_row: pd.Series, transaction_details_df: pd.DataFrame, matched_transactions: Set[int], matched_invoices: Set[Hashable]) -> bool:
         """
         Executes the matching strategy based on the exact amount and excluding date.
@@ -109,17 +171,22 @@ class ExactAmountAndExcludeDateStrategy(MatchingStrategy):
         """
         vendor, total, date, file_name, file_path = self._load_invoice_data(invoice_row)
 
-        # Filter potential matches by vendor that match to invoice, ensuring they aren't previously matched in the matched_transactions set
-        found_match: pd.DataFrame = transaction_details_df[
-            (~transaction_details_df.index.isin(matched_transactions)) &  # Excludes transactions already matched
-            (transaction_details_df['Vendor'].str.contains(vendor, case=False, na=False)) &  # Matches vendor name, case insensitive
-            (transaction_details_df['Amount'] == total)
-        ]
-
-        if not found_match.empty:
-            found_match_index = found_match.iloc[0].name
+        if self._transaction_index is not None:
+            # Candidates of every invoice were resolved with one join when the data was set
+            candidates = self._transaction_index.exact_amount_candidates(invoice_row.name)
+            found_match_index = self._transaction_index.first_available(candidates, matched_transactions)
+        else:
+            # Filter potential matches by vendor that match to invoice, ensuring they aren't previously matched in the matched_transactions set
+            found_match: pd.DataFrame = transaction_details_df[
+                (~transaction_details_df.index.isin(matched_transactions)) &  # Excludes transactions already matched
+                (transaction_details_df['Vendor'].str.contains(vendor, case=False, na=False)) &  # Matches vendor name, case insensitive
+                (transaction_details_df['Amount'] == total)
+            ]
+            found_match_index = found_match.iloc[0].name if not found_match.empty else None
+
+        if found_match_index is not None:
             invoice_row_index = invoice_row.name
-            self._add_match(transaction_details_df, found_match_index, file_name, file_path, 'Amount and Exclude Date Match', matched_transactions, matched_invoices, invoice_row_index)
+            self._add_match(transaction_details_df, found_match_index, file_name, file_path, self.MATCH_TYPE, matched_transactions, matched_invoices, invoice_row_index)
 
             # print(f"Match Found For ExactAmountAndExcludeDateStrategy In Transaction With ID {found_match_index}!")
             return True
@@ -132,11 +199,21 @@ class CombinationTotalStrategy(MatchingStrategy):
     This concrete class extends `MatchingStrategy` and implements the `execute` method.
     The `execute` method defined in this class uses a combination of transactions that,
     when summed up, matches the amount.
+    The combination is searched in integer cents by `SubsetSumSolver`, so invoices split across more than 3 charges are matched too.
+
+    Attributes
+        - `subset_sum_solver`: The solver searching the combinations, bounded by its max subset size and node and time budgets.
 
     Methods
         - `execute()` -> bool:
         Executes the matching strategy based on the date and combination of summed amount to match invoice.
     """
+    MATCH_TYPE = 'Combination Total Match'
+
+    def __init__(self, max_combination_size: int = 6, node_budget: Optional[int] = 250_000, time_budget_seconds: Optional[float] = 0.5):
+        super().__init__()
+        self.subset_sum_solver = SubsetSumSolver(max_combination_size, node_budget, time_budget_seconds)
+
     def execute(self, invoice_row: pd.Series, transaction_details_df: pd.DataFrame, matched_transactions: Set[int], matched_invoices: Set[Hashable]) -> bool:
         """
         Executes the matching strategy based on the date and combination of summed amount to match invoice.
@@ -148,27 +225,40 @@ class CombinationTotalStrategy(MatchingStrategy):
         :return: A boolean indicating whether a match was found.
         """
         vendor, total, date, file_name, file_path = self._load_invoice_data(invoice_row)
-
-        # Filter potential invoice matches by vendor and exact date, excluding those already matched in the matched_transactions set
-        potential_matches: pd.DataFrame = transaction_details_df[
-            (~transaction_details_df.index.isin(matched_transactions)) &  # Excludes transactions that are already in matched_transactions
-            (transaction_details_df['Vendor'].str.contains(vendor, case=False, na=False)) &  # Matches vendor name, case insensitive
-            (pd.to_datetime(transaction_details_df['Date'], errors='coerce') == date)  # Matches exact date
-        ]
-
-        # Find combinations of transactions where the sum equals the invoice amount
-        for r in range(1, min(4, len(potential_matches) + 1)):  # Limiting to combinations of up to 3 for complexity management
-            for combo in combinations(potential_matches.itertuples(index=True), r):
-                if np.isclose(sum(item.Amount for item in combo), total, atol=0.01):
-                    # If a valid combination is found, mark all involved transactions
-                    for item in combo:
-                        found_match_index = item.Index
-                        invoice_row_index = invoice_row.name
-                        self._add_match(transaction_details_df, found_match_index, file_name, file_path, 'Combination Total Match', matched_transactions, matched_invoices, invoice_row_index)
-
-                        # print(f"Match Found For CombinationTotalStrategy In Transactions With IDs {[item.Index for item in combo]}!")
-                        return True  # Stop after finding the first valid combination
-        return False
+        if pd.isna(total):
+            return False
+
+        if self._transaction_index is not None:
+            # The vendor's unmatched rows come from the index, only their date and amount are checked here
+            potential_match_indexes = [
+                row for row in self._transaction_index.available_vendor_rows(vendor, matched_transactions)
+                if self._transaction_index.transaction_date(row) == date and self._transaction_index.transaction_cents(row) is not None
+            ]
+            amounts_cents = [self._transaction_index.transaction_cents(row) for row in potential_match_indexes]
+        else:
+            # Filter potential invoice matches by vendor and exact date, excluding those already matched in the matched_transactions set
+            potential_matches: pd.DataFrame = transaction_details_df[
+                (~transaction_details_df.index.isin(matched_transactions)) &  # Excludes transactions that are already in matched_transactions
+                (transaction_details_df['Vendor'].str.contains(vendor, case=False, na=False)) &  # Matches vendor name, case insensitive
+                (pd.to_datetime(transaction_details_df['Date'], errors='coerce') == date) &  # Matches exact date
+                (transaction_details_df['Amount'].notna())
+            ]
+            potential_match_indexes = potential_matches.index.tolist()
+            amounts_cents = [self.subset_sum_solver.to_cents(amount) for amount in potential_matches['Amount']]
+
+        # Find the smallest combination of transactions where the sum equals the invoice amount, first in transaction order on ties
+        result = self.subset_sum_solver.solve(amounts_cents, self.subset_sum_solver.to_cents(total))
+        if result.positions is None:
+            return False
+
+        # If a valid combination is found, mark all involved transactions
+        invoice_row_index = invoice_row.name
+        for position in result.positions:
+            found_match_index = potential_match_indexes[position]
+            self._add_match(transaction_details_df, found_match_index, file_name, file_path, self.MATCH_TYPE, matched_transactions, matched_invoices, invoice_row_index)
+
+        # print(f"Match Found For CombinationTotalStrategy In Transactions With IDs {[potential_match_indexes[position] for position in result.positions]}!")
+        return True
 
 
 class VendorOnlyStrategy(MatchingStrategy):
@@ -179,6 +269,8 @@ class VendorOnlyStrategy(MatchingStrategy):
     Methods
         - `execute()` -> bool: Executes the matching strategy based only on the vendor.
     """
+    MATCH_TYPE = 'Vendor Only Match'
+
     def execute(self, invoice_row: pd.Series, transaction_details_df: pd.DataFrame, matched_transactions: Set[int], matched_invoices: Set[Hashable]) -> bool:
         """
         Executes the matching strategy based only on the vendor.
@@ -198,16 +290,23 @@ class VendorOnlyStrategy(MatchingStrategy):
 
         vendor, total, date, file_name, file_path = self._load_invoice_data(invoice_row)
 
-        found_match = transaction_details_df[
-            (~transaction_details_df.index.isin(matched_transactions)) &
-            (transaction_details_df['File Name'].isnull()) &  # Filter for potential matches where the 'File name' field is empty, indicating they haven't been matched yet
-            (transaction_details_df['Vendor'].str.contains(vendor, case=False, na=False))  # Matches vendor name, case insensitive
-        ]
-
-        if not found_match.empty:
-            found_match_index = found_match.iloc[0].name
+        if self._transaction_index is not None:
+            # The vendor's unmatched rows come from the index, only the 'File Name' is checked here
+            found_match_index = next((
+                row for row in self._transaction_index.available_vendor_rows(vendor, matched_transactions)
+                if pd.isnull(transaction_details_df.at[row, 'File Name'])
+            ), None)
+        else:
+            found_match = transaction_details_df[
+                (~transaction_details_df.index.isin(matched_transactions)) &
+                (transaction_details_df['File Name'].isnull()) &  # Filter for potential matches where the 'File name' field is empty, indicating they haven't been matched yet
+                (transaction_details_df['Vendor'].str.contains(vendor, case=False, na=False))  # Matches vendor name, case insensitive
+            ]
+            found_match_index = found_match.iloc[0].name if not found_match.empty else None
+
+        if found_match_index is not None:
             invoice_row_index = invoice_row.name
-            self._add_match(transaction_details_df, found_match_index, file_name, file_path, 'Vendor Only Match', matched_transactions, matched_invoices, invoice_row_index)
+            self._add_match(transaction_details_df, found_match_index, file_name, file_path, self.MATCH_TYPE, matched_transactions, matched_invoices, invoice_row_index)
 
             # print(f"Match Found For VendorOnlyStrategy In Transaction With ID {found_match_index}!")
             return True
@@ -1,35 +1,77 @@
 import abc
+import asyncio
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple, Any, Sequence, Iterable, AsyncIterator
+
 import pandas as pd
 
 from models.pdf import PDF
 from business_logic.pdf_processor import PDFProcessor
+from business_logic.extraction_cache import ExtractionCache
+from utils.custom_exceptions import PDFError
+from utils.instrumentation import instrumentation
 
 
 class PDFProcessingManager:
     pdf_counter = 0
+    # This mirrors the headers present in the Invoices worksheet of Template – Master.xlsm 7/2/2024
+    _PDF_PROC_MNG_COLUMNS = ['File Name', 'File Path', 'Amount', 'Vendor', 'Date']
 
-    def __init__(self, text_processor: PDFProcessor, ocr_processor: PDFProcessor):
-        # This mirrors the headers present in the Invoices worksheet of Template – Master.xlsm 7/2/2024
-        self.pdf_proc_mng_df: pd.DataFrame = pd.DataFrame(columns=['File Name', 'File Path', 'Amount', 'Vendor', 'Date'])
+    def __init__(self, text_processor: PDFProcessor, ocr_processor: PDFProcessor, max_workers: int = 1, extraction_cache: Optional[ExtractionCache] = None,
+                 streaming_extraction: bool = False, page_priority: Sequence[str] = ('first', 'last', 'rest')):
+        # Processed pdfs are appended to per-column lists and pdf_proc_mng_df is only built from them when it is asked for,
+        # instead of copying the whole DataFrame with pd.concat for every pdf
+        self._pdf_records: Dict[str, List[Any]] = {column: [] for column in self._PDF_PROC_MNG_COLUMNS}
+        self._pdf_record_rows_by_name: Dict[str, List[int]] = {}
+        self._removed_pdf_record_rows: Set[int] = set()
+        self._pdf_proc_mng_df: Optional[pd.DataFrame] = None
         self.text_processor: PDFProcessor = text_processor
         self.ocr_processor: PDFProcessor = ocr_processor
+        # Number of worker processes used to extract PDF data; 1 processes every PDF in this process one at a time
+        self.max_workers: int = max_workers
+        # Extraction results of previous runs keyed by pdf content, None extracts every pdf again
+        self.extraction_cache: Optional[ExtractionCache] = extraction_cache
+        # Streaming extraction reads pages in page_priority order and stops once a total and an in-window date are found
+        self.streaming_extraction: bool = streaming_extraction
+        self.page_priority: Sequence[str] = page_priority
+        # File Path -> error message of the PDFs that raised PDFError during the last populate_pdf_proc_mng_df call
+        self.failed_pdfs: Dict[str, str] = {}
+        # (File Name, File Path) of every pdf given to the last populate call in order, including the failed ones
+        self.invoice_records: List[Tuple[str, str]] = []
+
+    @property
+    def pdf_proc_mng_df(self) -> pd.DataFrame:
+        return self.get_pdf_proc_mng_df()
 
     def remove_pdf_proc_mng_df_row(self, pdf_name: str) -> None:
-        # Find the index of rows where 'File Path' matches pdf_path
-        rows_to_drop = self.pdf_proc_mng_df[self.pdf_proc_mng_df['File Name'] == pdf_name].index
+        # Find the rows where 'File Name' matches pdf_name
+        rows_to_drop = self._pdf_record_rows_by_name.pop(pdf_name, None)
 
-        # Drop these rows from the DataFrame
-        if not rows_to_drop.empty:
-            self.pdf_proc_mng_df = self.pdf_proc_mng_df.drop(index=rows_to_drop)
+        # Mark these rows as removed; they are left out the next time pdf_proc_mng_df is built
+        if rows_to_drop:
+            self._removed_pdf_record_rows.update(rows_to_drop)
+            self._pdf_proc_mng_df = None
         else:
             print(f"No PDF found with path: {pdf_name}")
 
     def clear_pdf_proc_mng_df(self) -> None:
-        self.pdf_proc_mng_df = pd.DataFrame(columns=['File Name', 'File Path', 'Amount', 'Vendor', 'Date'])
+        self._pdf_records = {column: [] for column in self._PDF_PROC_MNG_COLUMNS}
+        self._pdf_record_rows_by_name = {}
+        self._removed_pdf_record_rows = set()
+        self._pdf_proc_mng_df = None
 
     def get_pdf_proc_mng_df(self) -> pd.DataFrame:
-        return self.pdf_proc_mng_df
+        if self._pdf_proc_mng_df is None:
+            if not self._removed_pdf_record_rows:
+                self._pdf_proc_mng_df = pd.DataFrame(self._pdf_records, columns=self._PDF_PROC_MNG_COLUMNS)
+            else:
+                # Removed rows keep their index label out of the DataFrame, the same as dropping them would
+                kept_rows = [row for row in range(len(self._pdf_records['File Name'])) if row not in self._removed_pdf_record_rows]
+                kept_records = {column: [values[row] for row in kept_rows] for column, values in self._pdf_records.items()}
+                self._pdf_proc_mng_df = pd.DataFrame(kept_records, columns=self._PDF_PROC_MNG_COLUMNS, index=kept_rows)
+        return self._pdf_proc_mng_df
 
     def _reset_counter(self) -> None:
         self.pdf_counter = 0
@@ -42,7 +84,10 @@ class PDFProcessingManager:
             'Vendor': pdf.vendor,
             'Date': pdf.date
         }
-        self.pdf_proc_mng_df = pd.concat([self.pdf_proc_mng_df, pd.DataFrame([new_row])], ignore_index=True)
+        self._pdf_record_rows_by_name.setdefault(pdf.pdf_name, []).append(len(self._pdf_records['File Name']))
+        for column, value in new_row.items():
+            self._pdf_records[column].append(value)
+        self._pdf_proc_mng_df = None
 
     def _log_pdf_processing_details(self, pdf, pattern_used_pdf_amount, pattern_used_ocr_amount, pattern_used_pdf_date, pattern_used_ocr_date) -> None:
 
@@ -66,44 +111,225 @@ class PDFProcessingManager:
 
     def _select_processor_and_extract_total(self, pdf: PDF):
         # try:/except: block, use pdfplumber first then except to use ocr 6/28/2024
-        pattern_used_pdf = self.text_processor.extract_total(pdf)
+        with instrumentation.span('pdfplumber', 'pdf', pdf=pdf.pdf_name):
+            pattern_used_pdf = self.text_processor.extract_total(pdf)
         pattern_used_ocr = None
         if pdf.total == 666.66:
-            pattern_used_ocr = self.ocr_processor.extract_total(pdf)
+            with instrumentation.span('ocr', 'pdf', pdf=pdf.pdf_name):
+                pattern_used_ocr = self.ocr_processor.extract_total(pdf)
         return pattern_used_pdf, pattern_used_ocr
 
     def _select_processor_and_extract_date(self, pdf: PDF):
         # try:\except: block, use pdfplumber first then except to use ocr 6/28/2024
-        pattern_used_pdf = self.text_processor.extract_date(pdf)
+        with instrumentation.span('pdfplumber', 'pdf', pdf=pdf.pdf_name):
+            pattern_used_pdf = self.text_processor.extract_date(pdf)
         pattern_used_ocr = None
         if pdf.date == datetime(1999, 1, 1).strftime('%Y-%m-%d'):
-            pattern_used_ocr = self.ocr_processor.extract_date(pdf)
+            with instrumentation.span('ocr', 'pdf', pdf=pdf.pdf_name):
+                pattern_used_ocr = self.ocr_processor.extract_date(pdf)
         return pattern_used_pdf, pattern_used_ocr
 
-    def _process_pdf(self, pdf_path: str, pdf_name: str) -> None:
+    def _select_processor_and_extract_total_and_date_streaming(self, pdf: PDF):
+        with instrumentation.span('pdfplumber', 'pdf', pdf=pdf.pdf_name):
+            pattern_used_pdf_total, pattern_used_pdf_date = self.text_processor.extract_total_and_date_streaming(pdf, self.page_priority)
+        pattern_used_ocr_total, pattern_used_ocr_date = None, None
+
+        # Only what pdfplumber couldn't find is looked for again with OCR
+        missing_total = pdf.total == 666.66
+        missing_date = pdf.date == datetime(1999, 1, 1).strftime('%Y-%m-%d')
+        if missing_total or missing_date:
+            with instrumentation.span('ocr', 'pdf', pdf=pdf.pdf_name):
+                pattern_used_ocr_total, pattern_used_ocr_date = self.ocr_processor.extract_total_and_date_streaming(pdf, self.page_priority, extract_total=missing_total, extract_date=missing_date)
+        return pattern_used_pdf_total, pattern_used_ocr_total, pattern_used_pdf_date, pattern_used_ocr_date
+
+    def _extract_pdf(self, pdf_path: str, pdf_name: str, content_hash: Optional[str] = None) -> Tuple[PDF, Tuple[Optional[str], Optional[str], Optional[str], Optional[str]]]:
+        with instrumentation.span('extract_pdf', 'pdf', pdf=pdf_name):
+            return self._extract_pdf_data(pdf_path, pdf_name, content_hash)
+
+    def _extract_pdf_data(self, pdf_path: str, pdf_name: str, content_hash: Optional[str] = None) -> Tuple[PDF, Tuple[Optional[str], Optional[str], Optional[str], Optional[str]]]:
 
         # Creates a PDF instance and sets the pdf invoice path and name first that is used later for further data extraction 6/15/2024
         pdf: PDF = PDF(pdf_path, pdf_name)
-        # Increment the counter
-        self.pdf_counter += 1
+
+        # The pdf is read and hashed once for both the lookup and the store, or not at all when the caller already hashed it
+        if self.extraction_cache is not None and content_hash is None:
+            content_hash = self.extraction_cache.hash_pdf_content(pdf_path)
+        cached_entry = self.extraction_cache.get(pdf_path, content_hash) if self.extraction_cache is not None else None
+        if cached_entry is not None:
+            instrumentation.count('extraction_cache_hits')
+            # Same pdf content, patterns and statement dates as a previous run, so pdfplumber and Tesseract are skipped entirely
+            pdf.total = cached_entry['total']
+            pdf.date = cached_entry['date']
+            # The vendor comes from the file name and the Xlookup table, neither of which is part of the cache key
+            self.text_processor.extract_vendor(pdf)
+            return pdf, tuple(cached_entry['patterns_used'])
 
         # Directly invoke processing methods to extract date, total, vendor, for each PDF object
-        # try:\except: block to log pdf that wasn't successful in extracting data possibly? 6/28/2024
-        pattern_used_pdf_total, pattern_used_ocr_total = self._select_processor_and_extract_total(pdf)
-        pattern_used_pdf_date, pattern_used_ocr_date = self._select_processor_and_extract_date(pdf)
-        self.text_processor.extract_vendor(pdf)
+        try:
+            if self.streaming_extraction:
+                patterns_used = self._select_processor_and_extract_total_and_date_streaming(pdf)
+            else:
+                pattern_used_pdf_total, pattern_used_ocr_total = self._select_processor_and_extract_total(pdf)
+                pattern_used_pdf_date, pattern_used_ocr_date = self._select_processor_and_extract_date(pdf)
+                patterns_used = (pattern_used_pdf_total, pattern_used_ocr_total, pattern_used_pdf_date, pattern_used_ocr_date)
+            self.text_processor.extract_vendor(pdf)
+
+            if self.extraction_cache is not None:
+                self.extraction_cache.put(pdf_path, {
+                    'text': pdf.document.extracted_text,
+                    'ocr_text': pdf.document.ocr_text,
+                    'total': pdf.total,
+                    'date': pdf.date,
+                    'patterns_used': patterns_used
+                }, content_hash)
+        finally:
+            # The parsed text and rasterized pages are only shared between the extraction steps of this PDF, free them before the next one
+            pdf.release_document()
 
+        return pdf, patterns_used
+
+    def _record_pdf(self, pdf: PDF, patterns_used: Tuple[Optional[str], Optional[str], Optional[str], Optional[str]]) -> None:
         self._add_pdf(pdf)
-        self._log_pdf_processing_details(pdf, pattern_used_pdf_total, pattern_used_ocr_total, pattern_used_pdf_date, pattern_used_ocr_date)
+        self._log_pdf_processing_details(pdf, *patterns_used)
+
+    def _record_failed_pdf(self, pdf_path: str, pdf_name: str, error_message: str) -> None:
+        # The failed PDF is kept out of pdf_proc_mng_df, so its row in the Invoices worksheet is left as it is
+        self.failed_pdfs[pdf_path] = error_message
+        print(f"Processing PDF {self.pdf_counter} failed:\nFile Name: {pdf_name}\nFile Path: {pdf_path}\nError: {error_message}\n")
+
+    def _process_pdf(self, pdf_path: str, pdf_name: str, content_hash: Optional[str] = None) -> None:
+        # Increment the counter
+        self.pdf_counter += 1
+
+        try:
+            pdf, patterns_used = self._extract_pdf(pdf_path, pdf_name, content_hash)
+        except PDFError as ex:
+            self._record_failed_pdf(pdf_path, pdf_name, str(ex))
+            return
+
+        self._record_pdf(pdf, patterns_used)
+
+    def _process_pdfs_in_parallel(self, invoice_records: Iterable[Tuple[str, str]], content_hashes: Dict[str, str]) -> None:
+        # Extraction runs in worker processes while recording and logging stay here, in the original order, so the output matches the serial run
+        # Every pdf is submitted as soon as its record arrives, the records are only read once, so a generator of records works too
+        with ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_extraction_worker, initargs=(self.text_processor, self.ocr_processor, self.extraction_cache, self.streaming_extraction, self.page_priority)) as executor:
+            futures = []
+            for pdf_name, pdf_path in invoice_records:
+                self.invoice_records.append((pdf_name, pdf_path))
+                futures.append((pdf_path, pdf_name, executor.submit(_extract_pdf_in_worker, pdf_path, pdf_name, content_hashes.get(pdf_path))))
+            for pdf_path, pdf_name, future in futures:
+                self._record_worker_result(pdf_path, pdf_name, future.result())
+
+    def _record_worker_result(self, pdf_path: str, pdf_name: str, worker_result: Tuple[Optional[PDF], Optional[tuple], Optional[str], Dict[str, Any]]) -> Optional[PDF]:
+        pdf, patterns_used, error_message, worker_instrumentation = worker_result
+        instrumentation.merge(worker_instrumentation)
+        self.pdf_counter += 1
+        if error_message is not None:
+            self._record_failed_pdf(pdf_path, pdf_name, error_message)
+            return None
+        self._record_pdf(pdf, patterns_used)
+        return pdf
 
     def populate_pdf_proc_mng_df(self, invoice_worksheet, xlookup_table_worksheet) -> None:
         invoice_df: pd.DataFrame = invoice_worksheet.read_data_as_dataframe()
+        self.populate_pdf_proc_mng_df_from_records(zip(invoice_df['File Name'].tolist(), invoice_df['File Path'].tolist()), xlookup_table_worksheet)
+
+    @instrumentation.span('populate_pdf_proc_mng_df', 'stage')
+    def populate_pdf_proc_mng_df_from_records(self, invoice_records: Iterable[Tuple[str, str]], xlookup_table_worksheet, content_hashes: Optional[Dict[str, str]] = None) -> None:
+        """
+        Extract the data of every pdf of the invoice records, as they arrive, e.g. straight from InvoiceDiscovery.discover
+        without listing the invoices in the Invoices worksheet first.
 
+        :param invoice_records: (File Name, File Path) of every invoice pdf in order.
+        :param xlookup_table_worksheet: The Xlookup table worksheet the vendors are read from.
+        :param content_hashes: Optional File Path -> content hash of pdfs already hashed, e.g. by the InvoiceManifest, the extraction cache reuses them.
+        :return: None
+        """
+        content_hashes = content_hashes or {}
         # Populate PDFProcessor vendors_list to be able to match for pdf.vendor during data extraction
         self.text_processor.get_vendors_from_xlookup_worksheet(xlookup_table_worksheet)
+        self.failed_pdfs.clear()
+        self.invoice_records = []
 
         # Creating pdf instances; setting the path, name, total, date, vendor for each one. Then add it into the pdf_collection_dataframe 6/16/2024
-        for _, row in invoice_df.iterrows():
-            self._process_pdf(row['File Path'], row['File Name'])
+        if self.max_workers > 1:
+            self._process_pdfs_in_parallel(invoice_records, content_hashes)
+        else:
+            for pdf_name, pdf_path in invoice_records:
+                self.invoice_records.append((pdf_name, pdf_path))
+                self._process_pdf(pdf_path, pdf_name, content_hashes.get(pdf_path))
+
+        if self.extraction_cache is not None:
+            self.extraction_cache.evict()
+
+        self._reset_counter()
+
+    async def stream_pdfs(self, invoice_records: Iterable[Tuple[str, str]], xlookup_table_worksheet, max_in_flight: int = 32) -> AsyncIterator[Tuple[str, str, Optional[PDF]]]:
+        """
+        Asynchronous alternative to populate_pdf_proc_mng_df_from_records for the InvoicePipeline: every pdf is extracted in a worker process
+        and handed on as soon as it and the pdfs before it are done, so the consumers start on the first invoices while the rest are extracted.
+        The pdfs are also recorded in pdf_proc_mng_df, the same as populate_pdf_proc_mng_df_from_records does.
+
+        :param invoice_records: (File Name, File Path) of every invoice pdf in order, e.g. straight from InvoiceDiscovery.discover.
+        :param xlookup_table_worksheet: The Xlookup table worksheet the vendors are read from.
+        :param max_in_flight: Most pdfs submitted to the workers and not handed on yet, bounds the memory when the consumers fall behind.
+        :return: Async iterator of (File Name, File Path, PDF), the PDF None when its extraction failed, in invoice_records order.
+        """
+        self.text_processor.get_vendors_from_xlookup_worksheet(xlookup_table_worksheet)
+        self.failed_pdfs.clear()
+        self.invoice_records = []
 
+        loop = asyncio.get_running_loop()
+        invoice_record_iterator = iter(invoice_records)
+        in_flight = deque()
+        with ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_extraction_worker, initargs=(self.text_processor, self.ocr_processor, self.extraction_cache, self.streaming_extraction, self.page_priority)) as executor:
+            while True:
+                # Listing the invoices folder blocks on the share, the next record is taken on a thread so the event loop keeps running
+                invoice_record = await loop.run_in_executor(None, next, invoice_record_iterator, None)
+                if invoice_record is None:
+                    break
+                pdf_name, pdf_path = invoice_record
+                self.invoice_records.append((pdf_name, pdf_path))
+                in_flight.append((pdf_name, pdf_path, loop.run_in_executor(executor, _extract_pdf_in_worker, pdf_path, pdf_name)))
+                # The oldest pdfs are handed on as soon as they are done, and waited for once max_in_flight are submitted
+                while in_flight and (in_flight[0][2].done() or len(in_flight) >= max_in_flight):
+                    pdf_name, pdf_path, future = in_flight.popleft()
+                    yield pdf_name, pdf_path, self._record_worker_result(pdf_path, pdf_name, await future)
+            while in_flight:
+                pdf_name, pdf_path, future = in_flight.popleft()
+                yield pdf_name, pdf_path, self._record_worker_result(pdf_path, pdf_name, await future)
+
+        if self.extraction_cache is not None:
+            self.extraction_cache.evict()
         self._reset_counter()
+
+    def get_invoices_df(self) -> pd.DataFrame:
+        """
+        Every invoice of the last populate call in order, with the extracted data of the processed pdfs
+        and only the File Name and File Path of the failed ones, the rows of a freshly listed Invoices worksheet.
+
+        :return: DataFrame with the columns of pdf_proc_mng_df.
+        """
+        invoices_df = pd.DataFrame(self.invoice_records, columns=['File Name', 'File Path'])
+        extracted_df = self.get_pdf_proc_mng_df().drop(columns='File Name').drop_duplicates(subset='File Path', keep='last')
+        return invoices_df.merge(extracted_df, on='File Path', how='left')[self._PDF_PROC_MNG_COLUMNS]
+
+
+# Each worker process builds its own manager once from the pickled processors instead of receiving them with every PDF
+_worker_pdf_proc_mng: Optional[PDFProcessingManager] = None
+
+
+def _init_extraction_worker(text_processor: PDFProcessor, ocr_processor: PDFProcessor, extraction_cache: Optional[ExtractionCache], streaming_extraction: bool, page_priority: Sequence[str]) -> None:
+    global _worker_pdf_proc_mng
+    _worker_pdf_proc_mng = PDFProcessingManager(text_processor, ocr_processor, extraction_cache=extraction_cache, streaming_extraction=streaming_extraction, page_priority=page_priority)
+
+
+def _extract_pdf_in_worker(pdf_path: str, pdf_name: str, content_hash: Optional[str] = None) -> Tuple[Optional[PDF], Optional[tuple], Optional[str], Dict[str, Any]]:
+    # What the worker records for this pdf is handed back with the result and merged into the parent's instrumentation
+    instrumentation.reset()
+    try:
+        pdf, patterns_used = _worker_pdf_proc_mng._extract_pdf(pdf_path, pdf_name, content_hash)
+    except PDFError as ex:
+        # Only the message crosses back to the parent process; PDFError can't be rebuilt from its pickled arguments
+        return None, None, str(ex), instrumentation.export()
+    return pdf, patterns_used, None, instrumentation.export()
@@ -1,12 +1,12 @@
 import datetime
 from abc import abstractmethod, ABC
-from typing import Union, List, Protocol
+from typing import Any, Union, List, Protocol, Dict, NamedTuple, Optional, Pattern, Sequence, Tuple, Iterable
 
-import pdfplumber
-import pdf2image
 import re
 import pytesseract
-import dateparser
+
+from utils.date_parsing import date_parsing_service
+from utils.instrumentation import instrumentation
 
 # from invoice2data import extract_data
 # from invoice2data.extract.loader import read_templates
@@ -35,6 +35,22 @@ poppler_path = "C:/Users/brand/OneDrive/Desktop/poppler-24.02.0/Library/bin"  #
 # pdftotext_path = "C:/Users/brand/OneDrive/Desktop/poppler-24.02.0/Library/bin/"
 # os.environ['PATH'] += os.pathsep + pdftotext_path
 
+class VendorPatterns(NamedTuple):
+    """Compiled patterns of the vendor identified in a PDF text, total patterns are compiled case-insensitive."""
+    vendor_identifier: Optional[str]
+    date_patterns: List[Pattern]
+    total_patterns: List[Pattern]
+
+
+class OCRProfile(NamedTuple):
+    """How the pages of an image-only invoice are rasterized and preprocessed for Tesseract, bands are (top, bottom) fractions of the page height."""
+    dpis: Tuple[int, ...]  # Resolutions tried in order, the next one only when the patterns found nothing at the one before
+    grayscale: bool
+    threshold: Optional[int]  # Gray level at or below which a pixel turns black, None keeps the grays
+    date_band: Optional[Tuple[float, float]]  # Band the date is looked for in, None for the whole page
+    total_band: Optional[Tuple[float, float]]  # Band the total is looked for in, None for the whole page
+
+
 class GeneralPatternProvider(Protocol):
 
     def get_total_pattern(self) -> List[str]:
@@ -43,6 +59,12 @@ class GeneralPatternProvider(Protocol):
     def get_date_pattern(self) -> List[str]:
         """Returns a list of generic date patterns"""
 
+    def get_compiled_total_pattern(self) -> List[Pattern]:
+        """Returns the generic total patterns compiled case-insensitive"""
+
+    def get_compiled_date_pattern(self) -> List[Pattern]:
+        """Returns the generic date patterns compiled"""
+
 
 class VendorSpecificPatternProvider(Protocol):
 
@@ -52,6 +74,145 @@ class VendorSpecificPatternProvider(Protocol):
     def get_date_pattern(self, pdf_text: str) -> List[str]:
         """Returns the vendor-specific date pattern"""
 
+    def get_patterns(self, pdf_text: str) -> VendorPatterns:
+        """Returns the vendor identified in the text with its compiled date and total patterns"""
+
+
+class OCRProfileProvider(Protocol):
+
+    def get_profile(self, pdf_name: str) -> OCRProfile:
+        """Returns the OCR profile of the vendor in the invoice file name, the generic profile when it has none"""
+
+    def get_profiles(self) -> Dict[str, OCRProfile]:
+        """Returns every OCR profile by vendor, the generic profile under ''"""
+
+
+class VendorPatternRegistry:
+    """
+    The `VendorPatternRegistry` class precompiles a vendor pattern table once and identifies the vendor of a PDF text
+    with a single pass over the text.
+
+    All vendor identifiers are combined into one alternation regex inside a lookahead,
+    so the scan is zero-width and sees identifiers that overlap or start at the same position.
+    The alternatives are listed in table order, which keeps the result identical to checking each identifier with `in`
+    in table order: the identifier listed first in the table wins, wherever in the text it appears.
+
+    Methods
+        - `lookup(pdf_text)` -> VendorPatterns: Returns the identified vendor with its compiled date and total patterns.
+    """
+
+    _NO_VENDOR = VendorPatterns(None, [], [])
+
+    def __init__(self, vendor_patterns: Dict[str, Dict[str, List[str]]]):
+        self._priorities: Dict[str, int] = {vendor_identifier: priority for priority, vendor_identifier in enumerate(vendor_patterns)}
+        self._compiled_patterns: Dict[str, VendorPatterns] = {
+            vendor_identifier: VendorPatterns(
+                vendor_identifier,
+                [re.compile(pattern) for pattern in patterns['date']],
+                [re.compile(pattern, re.IGNORECASE) for pattern in patterns['total']]  # Ignore case sensitivity 6/24/2024
+            )
+            for vendor_identifier, patterns in vendor_patterns.items()
+        }
+        self._identifier_regex = re.compile('(?=(' + '|'.join(re.escape(vendor_identifier) for vendor_identifier in vendor_patterns) + '))')
+        # Total and date extraction look up the same text one after the other, so the last result is kept
+        self._last_pdf_text: Optional[str] = None
+        self._last_vendor_patterns: VendorPatterns = self._NO_VENDOR
+
+    def lookup(self, pdf_text: str) -> VendorPatterns:
+        if pdf_text is self._last_pdf_text:
+            return self._last_vendor_patterns
+
+        best_identifier = None
+        best_priority = len(self._priorities)
+        for match in self._identifier_regex.finditer(pdf_text):
+            priority = self._priorities[match.group(1)]
+            if priority < best_priority:
+                best_identifier, best_priority = match.group(1), priority
+                if priority == 0:
+                    break
+
+        self._last_pdf_text = pdf_text
+        self._last_vendor_patterns = self._compiled_patterns[best_identifier] if best_identifier is not None else self._NO_VENDOR
+        return self._last_vendor_patterns
+
+
+class VendorResolver:
+    """
+    The `VendorResolver` class preprocesses the vendors of the Xlookup table once into a lowercase trie
+    and resolves the vendor of invoice file names with it, case-insensitive.
+
+    Aliases are file name texts standing for a vendor whose Xlookup table name doesn't identify it in the file name,
+    e.g. {'newrelic': ('new', 'NEW')} resolves file names containing 'newrelic' to 'NEW' when 'New' is in the table.
+    Such a vendor is only resolved through its aliases, its own name is too common to be looked for.
+
+    Precedence: the longest vendor name or alias found anywhere in the file name wins,
+    between names of the same length the one listed first in the Xlookup table wins (an alias ranks at its vendor's row).
+
+    Methods
+        - `resolve(file_name)` -> Optional[str]: Returns the vendor of the file name, None when none is found.
+        - `resolve_all(file_names)` -> List[Optional[str]]: Returns the vendor of every file name, in order.
+
+    Example usage
+    ```
+    vendor_resolver = VendorResolver(['Amazon', 'Dell', 'New'], {'newrelic': ('new', 'NEW')})
+    vendor_resolver.resolve_all(['amazon 0624.pdf', 'NewRelic invoice.pdf', 'receipt.pdf'])  # ['Amazon', 'NEW', None]
+    ```
+    """
+
+    _TERMINAL = ''  # Key of the trie node entry holding (vendor, priority) of the name ending at that node, never a character
+
+    def __init__(self, vendors: Sequence[Optional[str]], aliases: Dict[str, Tuple[str, str]]):
+        """
+        :param vendors: The vendors of the Xlookup table in table order, None and empty values are skipped.
+        :param aliases: Lowercase file name text -> (lowercase Xlookup table vendor it stands for, vendor it resolves to).
+        """
+        # Lowercase name -> (vendor, priority), a vendor listed twice keeps its first row
+        table_names: Dict[str, Tuple[str, int]] = {}
+        for priority, vendor in enumerate(vendors):
+            if vendor is not None and str(vendor) != '':
+                table_names.setdefault(str(vendor).lower(), (vendor, priority))
+
+        # Vendors with an alias are taken out and their aliases added, only when the vendor is in the table
+        aliased_vendors = {lower_vendor for lower_vendor, _ in aliases.values()}
+        names = {lower_name: name for lower_name, name in table_names.items() if lower_name not in aliased_vendors}
+        for alias, (lower_vendor, resolved_vendor) in aliases.items():
+            if lower_vendor in table_names:
+                names[alias.lower()] = (resolved_vendor, table_names[lower_vendor][1])
+
+        self._trie: Dict[str, Any] = {}
+        for lower_name, name in names.items():
+            node = self._trie
+            for character in lower_name:
+                node = node.setdefault(character, {})
+            node[self._TERMINAL] = name
+
+    def resolve(self, file_name: str) -> Optional[str]:
+        lower_file_name = file_name.lower()
+        best_vendor = None
+        best_rank = (0, 0)  # (length, -priority), the higher the better
+        for start in range(len(lower_file_name)):
+            node = self._trie
+            for end in range(start, len(lower_file_name)):
+                node = node.get(lower_file_name[end])
+                if node is None:
+                    break
+                name = node.get(self._TERMINAL)
+                if name is not None:
+                    rank = (end - start + 1, -name[1])
+                    if rank > best_rank:
+                        best_vendor, best_rank = name[0], rank
+        return best_vendor
+
+    def resolve_all(self, file_names: Iterable[str]) -> List[Optional[str]]:
+        # Invoices of the same vendor often share a file name, e.g. copies in several folders, each name is resolved once
+        resolved: Dict[str, Optional[str]] = {}
+        vendors = []
+        for file_name in file_names:
+            if file_name not in resolved:
+                resolved[file_name] = self.resolve(file_name)
+            vendors.append(resolved[file_name])
+        return vendors
+
 
 class GeneralPattern:
     # Static fallback patterns for pdfplumber and OCR; DON'T CHANGE ORDER!
@@ -75,12 +236,26 @@ class GeneralPattern:
         r'[A-Za-z]+ \d{1,2}, \d{4}'
     ]
 
+    # Compiled once on first use and shared by every instance
+    _COMPILED_TOTAL_PATTERNS: Optional[List[Pattern]] = None
+    _COMPILED_DATE_PATTERNS: Optional[List[Pattern]] = None
+
     def get_total_pattern(self) -> List[str]:
         return self._TOTAL_PATTERNS
 
     def get_date_pattern(self) -> List[str]:
         return self._DATE_PATTERNS
 
+    def get_compiled_total_pattern(self) -> List[Pattern]:
+        if GeneralPattern._COMPILED_TOTAL_PATTERNS is None:
+            GeneralPattern._COMPILED_TOTAL_PATTERNS = [re.compile(pattern, re.IGNORECASE) for pattern in self._TOTAL_PATTERNS]
+        return GeneralPattern._COMPILED_TOTAL_PATTERNS
+
+    def get_compiled_date_pattern(self) -> List[Pattern]:
+        if GeneralPattern._COMPILED_DATE_PATTERNS is None:
+            GeneralPattern._COMPILED_DATE_PATTERNS = [re.compile(pattern) for pattern in self._DATE_PATTERNS]
+        return GeneralPattern._COMPILED_DATE_PATTERNS
+
 
 class VendorSpecificPattern:
     # Template for vendor-specific patterns to extract total amounts and dates from identified invoice PDFs 6/16/2024.
@@ -289,29 +464,88 @@ class VendorSpecificPattern:
         }
     }
 
+    # Built once on first use from _VENDOR_PATTERNS and shared by every instance
+    _REGISTRY: Optional[VendorPatternRegistry] = None
+
+    def _get_registry(self) -> VendorPatternRegistry:
+        if VendorSpecificPattern._REGISTRY is None:
+            VendorSpecificPattern._REGISTRY = VendorPatternRegistry(self._VENDOR_PATTERNS)
+        return VendorSpecificPattern._REGISTRY
+
+    def get_patterns(self, pdf_text: str) -> VendorPatterns:
+        return self._get_registry().lookup(pdf_text)
+
     def get_total_pattern(self, pdf_text: str) -> List[str]:
-        for vendor_identifier, patterns in self._VENDOR_PATTERNS.items():
-            if vendor_identifier in pdf_text:
-                return patterns['total']
-        return []
+        return [pattern.pattern for pattern in self.get_patterns(pdf_text).total_patterns]
 
     def get_date_pattern(self, pdf_text: str) -> List[str]:
-        for vendor_identifier, patterns in self._VENDOR_PATTERNS.items():
-            if vendor_identifier in pdf_text:
-                return patterns['date']
-        return []
-    
+        return [pattern.pattern for pattern in self.get_patterns(pdf_text).date_patterns]
+
+
+class VendorOCRProfile:
+    # Generic profile: a low resolution pass first, pdf2image's default resolution only for the pages it found nothing on
+    _GENERIC_PROFILE = OCRProfile(dpis=(150, 200), grayscale=True, threshold=None, date_band=None, total_band=None)
+
+    # Vendor as it appears in the invoice file names -> OCR profile of its image-only invoices.
+    # A band that misses, e.g. after a layout change, is followed by a whole page pass at the profile's highest resolution.
+    _VENDOR_PROFILES = {
+        # Amazon order summaries, the order date is in the header and the Grand Total in the order summary below it
+        'amazon': OCRProfile(dpis=(150, 200), grayscale=True, threshold=160, date_band=(0.0, 0.3), total_band=(0.15, 0.7)),
+        # GoDaddy receipts, the invoice date is in the header and the total at the bottom of the charges table
+        'godaddy': OCRProfile(dpis=(150, 200), grayscale=True, threshold=170, date_band=(0.0, 0.3), total_band=(0.4, 1.0)),
+    }
+
+    # Built once on first use from _VENDOR_PROFILES and shared by every instance
+    _RESOLVER: Optional[VendorResolver] = None
+
+    def get_profile(self, pdf_name: str) -> OCRProfile:
+        if VendorOCRProfile._RESOLVER is None:
+            VendorOCRProfile._RESOLVER = VendorResolver(list(self._VENDOR_PROFILES), {})
+        vendor = VendorOCRProfile._RESOLVER.resolve(pdf_name)
+        return self._VENDOR_PROFILES[vendor] if vendor is not None else self._GENERIC_PROFILE
+
+    def get_profiles(self) -> Dict[str, OCRProfile]:
+        return {'': self._GENERIC_PROFILE, **self._VENDOR_PROFILES}
+
+
+# Counter name of every pattern, made once per pattern instead of on every attempt
+_REGEX_ATTEMPT_LABELS: Dict[Pattern, str] = {}
+
+
+def _count_regex_attempts(patterns: List[Pattern], attempts: int) -> None:
+    # The attempts of one search are added with a single counter update, the first `attempts` patterns were tried
+    amounts = {}
+    for pattern in patterns[:attempts]:
+        label = _REGEX_ATTEMPT_LABELS.get(pattern)
+        if label is None:
+            label = _REGEX_ATTEMPT_LABELS[pattern] = f"regex_attempts: {pattern.pattern}"
+        amounts[label] = amounts.get(label, 0) + 1
+    instrumentation.count_many(amounts)
+
 
 class PDFProcessor(ABC):
 
     _FALL_BACK_TOTAL = float(666.66)  # DON'T CHANGE 6/16/2024
     _FALL_BACK_DATE = datetime.date(1999, 1, 1)  # DON'T CHANGE 6/16/2024
     _FALL_BACK_VENDOR = 'Unknown'  # DON'T CHANGE 6/16/2024
+    # File name text -> (Xlookup table vendor, vendor it resolves to) for vendors whose table name doesn't identify them in file names
+    _VENDOR_ALIASES = {
+        'newrelic': ('new', 'NEW'),
+        'msft': ('microsoft', 'MSFT'),
+    }
 
     def __init__(self, start_date, end_date):
         self._start_date = start_date
         self._end_date = end_date
         self._vendors_list = []
+        self._vendor_resolver = VendorResolver(self._vendors_list, self._VENDOR_ALIASES)
+        self._statement_window = None
+
+    def _get_statement_window(self):
+        # The statement start and end date are parsed once per run instead of on every extraction call
+        if self._statement_window is None:
+            self._statement_window = date_parsing_service.parse_window(self._start_date, self._end_date)
+        return self._statement_window
 
     @abstractmethod
     def extract_total(self, pdf):
@@ -321,11 +555,75 @@ class PDFProcessor(ABC):
     def extract_date(self, pdf):
         ...
 
+    @staticmethod
+    def order_pages(page_count: int, page_priority: Sequence[str]) -> List[int]:
+        """
+        Order the 0-based page numbers of a PDF by the given priority.
+
+        :param page_count: Number of pages in the PDF.
+        :param page_priority: Sequence of 'first', 'last' and 'rest', e.g. ('first', 'last', 'rest').
+        :return: The page numbers in the order they should be read, each page once.
+        """
+        ordered_pages = []
+        seen_pages = set()
+        for priority in page_priority:
+            if priority == 'first':
+                candidate_pages = [0]
+            elif priority == 'last':
+                candidate_pages = [page_count - 1]
+            elif priority == 'rest':
+                candidate_pages = range(page_count)
+            else:
+                raise ValueError(f"Unknown page priority '{priority}', expected 'first', 'last' or 'rest'")
+
+            for page_number in candidate_pages:
+                if 0 <= page_number < page_count and page_number not in seen_pages:
+                    seen_pages.add(page_number)
+                    ordered_pages.append(page_number)
+        return ordered_pages
+
+    def _search_total(self, pdf, text: str, total_patterns: List[Pattern]) -> Optional[str]:
+        # Search for the total using the determined patterns, total patterns are compiled case-insensitive
+        pattern_used = None
+        attempts = 0
+        for pattern in total_patterns:
+            attempts += 1
+            match = pattern.search(text)
+            if match:
+                extracted_value = match.group(1).replace(',', '')
+                pdf.total = extracted_value
+                pattern_used = pattern.pattern  # Return the pattern used for matching
+                break
+        if instrumentation.enabled:
+            _count_regex_attempts(total_patterns, attempts)
+        return pattern_used
+
+    def _search_date(self, pdf, text: str, date_patterns: List[Pattern], start_date, end_date) -> Optional[str]:
+        # The first date found inside the statement window is used
+        pattern_used = None
+        attempts = 0
+        for pattern in date_patterns:
+            attempts += 1
+            for date_text in pattern.findall(text):
+                parsed_date = date_parsing_service.parse(date_text)
+                if parsed_date and start_date <= parsed_date <= end_date:
+                    pdf.date = parsed_date
+                    pattern_used = pattern.pattern
+                    break
+            if pattern_used:
+                break
+        if instrumentation.enabled:
+            _count_regex_attempts(date_patterns, attempts)
+        return pattern_used
+
+    @abstractmethod
+    def extract_total_and_date_streaming(self, pdf, page_priority: Sequence[str], extract_total: bool = True, extract_date: bool = True) -> Tuple[Optional[str], Optional[str]]:
+        """Extract the total and date reading the pages in `page_priority` order and stopping once both are found"""
+
     def get_vendors_from_xlookup_worksheet(self, xlookup_table_worksheet) -> None:
 
         self._vendors_list.clear()  # Clear existing vendors to avoid duplication
-        sheet = xlookup_table_worksheet.sheet
-        vendors_range = sheet.range('A8:A' + str(sheet.cells.last_cell.row)).value
+        vendors_range = xlookup_table_worksheet.read_data_range('A8', 'A')
 
         if isinstance(vendors_range, list):
             # Iterate over the list and stop if a None value is encountered
@@ -343,24 +641,20 @@ class PDFProcessor(ABC):
             # If vendors_range is a single value (string or tuple), turn it into a list
             self._vendors_list = [vendors_range[0]] if isinstance(vendors_range, tuple) else [vendors_range]
 
-    def extract_vendor(self, pdf):
-
-        lower_file_name = pdf.pdf_name.lower()
-        matched_vendor = None
+        # The vendors are preprocessed once per Xlookup table read instead of lowercased again for every pdf
+        self._vendor_resolver = VendorResolver(self._vendors_list, self._VENDOR_ALIASES)
 
-        for vendor in self._vendors_list:
-            if vendor is None:
-                continue
+    def extract_vendor(self, pdf):
+        pdf.vendor = self._vendor_resolver.resolve(pdf.pdf_name) or self._FALL_BACK_VENDOR
 
-            lower_vendor = vendor.lower()
-            if 'newrelic' in lower_file_name and lower_vendor == 'new':
-                matched_vendor = 'NEW'
-            elif 'msft' in lower_file_name and lower_vendor == 'microsoft':
-                matched_vendor = 'MSFT'
-            elif lower_vendor in lower_file_name and lower_vendor not in ('new', 'microsoft'):
-                matched_vendor = vendor
+    def resolve_vendors(self, file_names: Iterable[str]) -> List[str]:
+        """
+        Resolve the vendor of many invoice file names in one call, the same vendor extract_vendor gives each pdf.
 
-        pdf.vendor = matched_vendor if matched_vendor else self._FALL_BACK_VENDOR
+        :param file_names: Invoice file names.
+        :return: The vendor of every file name in order, the fallback vendor when none is found.
+        """
+        return [vendor or self._FALL_BACK_VENDOR for vendor in self._vendor_resolver.resolve_all(file_names)]
 
 
 class PDFPlumberProcessor(PDFProcessor):
@@ -370,98 +664,180 @@ class PDFPlumberProcessor(PDFProcessor):
         self._vendor_specific_pattern = vendor_specific_pattern
         self._general_pattern = general_pattern
 
+    def _get_streaming_patterns(self, text: str) -> VendorPatterns:
+        # The general patterns fill in what the vendor has none of, the same as extract_total and extract_date do
+        vendor_patterns = self._vendor_specific_pattern.get_patterns(text)
+        return VendorPatterns(
+            vendor_patterns.vendor_identifier,
+            vendor_patterns.date_patterns or self._general_pattern.get_compiled_date_pattern(),
+            vendor_patterns.total_patterns or self._general_pattern.get_compiled_total_pattern()
+        )
+
+    def extract_total_and_date_streaming(self, pdf, page_priority: Sequence[str], extract_total: bool = True, extract_date: bool = True) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Streaming alternative to `extract_total` and `extract_date` for long invoices.
+        Pages are read one at a time in `page_priority` order and each page is searched as soon as it is read,
+        stopping as soon as the requested total and an in-window date have both been found.
+        A total or date that is not found is set to the fallback value, like the non-streaming methods do.
+
+        The vendor is identified from the first and last page before any page is searched. When neither identifies it,
+        every page read is looked up until one does, and the pages already searched with the general patterns are searched again with the vendor's.
+        A vendor only named on a middle page that is never read, because the general patterns already found both, is not used, unlike in `extract_total`.
+
+        :param pdf: The PDF to extract the total and date of.
+        :param page_priority: Sequence of 'first', 'last' and 'rest' giving the order pages are read in.
+        :param extract_total: Whether the total is extracted.
+        :param extract_date: Whether the date is extracted.
+        :return: Tuple(pattern used for the total, pattern used for the date), None for what was not found or not requested.
+        """
+        try:
+            start_date, end_date = self._get_statement_window()
+
+            pattern_used_total = None
+            pattern_used_date = None
+            page_count = pdf.document.page_count
+            page_numbers = self.order_pages(page_count, page_priority)
+            patterns = self._get_streaming_patterns(' '.join(pdf.document.get_page_text(page_number) for page_number in sorted({0, page_count - 1}) if page_number >= 0))
+            searched_page_texts = []
+
+            for page_number in page_numbers:
+                page_text = pdf.document.get_page_text(page_number)
+                page_texts_to_search = [page_text]
+                if patterns.vendor_identifier is None:
+                    page_patterns = self._get_streaming_patterns(page_text)
+                    if page_patterns.vendor_identifier is not None:
+                        # What the general patterns found is dropped, the vendor's patterns decide like they do for the whole text
+                        patterns = page_patterns
+                        pattern_used_total = pattern_used_date = None
+                        page_texts_to_search = searched_page_texts + page_texts_to_search
+                searched_page_texts.append(page_text)
+
+                for text in page_texts_to_search:
+                    if extract_total and pattern_used_total is None:
+                        pattern_used_total = self._search_total(pdf, text, patterns.total_patterns)
+                    if extract_date and pattern_used_date is None:
+                        pattern_used_date = self._search_date(pdf, text, patterns.date_patterns, start_date, end_date)
+
+                if (not extract_total or pattern_used_total) and (not extract_date or pattern_used_date):
+                    break
+
+            if extract_total and pattern_used_total is None:
+                pdf.total = self._FALL_BACK_TOTAL
+            if extract_date and pattern_used_date is None:
+                pdf.date = self._FALL_BACK_DATE
+            return pattern_used_total, pattern_used_date
+        except FileNotFoundError as ex:
+            raise FileNotFoundError(f"File not found while extracting PDF data: {pdf.pdf_path}") from ex
+
     def extract_total(self, pdf):
 
         try:
-            with pdfplumber.open(pdf.pdf_path) as pdf_text:
-                text = ' '.join(page.extract_text() or '' for page in pdf_text.pages)
+            text = pdf.document.text
 
-            total_patterns = self._vendor_specific_pattern.get_total_pattern(text)
+            total_patterns = self._vendor_specific_pattern.get_patterns(text).total_patterns
             if len(total_patterns) == 0:
-                total_patterns = self._general_pattern.get_total_pattern()
-
-            # Search for the total using the determined patterns
-            for pattern in total_patterns:
-                match = re.search(pattern, text, re.IGNORECASE)  # Ignore case sensitivity 6/24/2024
-                if match:
-                    extracted_value = match.group(1).replace(',', '')
-                    pdf.total = extracted_value
-                    return pattern  # Return the pattern used for matching
-            # No match was found for the total
-            pdf.total = self._FALL_BACK_TOTAL
-            return None
+                total_patterns = self._general_pattern.get_compiled_total_pattern()
+
+            pattern_used = self._search_total(pdf, text, total_patterns)
+            if pattern_used is None:
+                # No match was found for the total
+                pdf.total = self._FALL_BACK_TOTAL
+            return pattern_used
         except FileNotFoundError as ex:
             raise FileNotFoundError(f"File not found while extracting PDF data: {pdf.pdf_path}") from ex
 
     def extract_date(self, pdf):
 
         try:
-            start_date = dateparser.parse(self._start_date)
-            end_date = dateparser.parse(self._end_date)
+            start_date, end_date = self._get_statement_window()
 
-            with pdfplumber.open(pdf.pdf_path) as pdf_text:
-                text = ' '.join(page.extract_text() or '' for page in pdf_text.pages)
+            text = pdf.document.text
 
-            date_patterns = self._vendor_specific_pattern.get_date_pattern(text)
+            date_patterns = self._vendor_specific_pattern.get_patterns(text).date_patterns
             if len(date_patterns) == 0:
-                date_patterns = self._general_pattern.get_date_pattern()
-
-            for pattern in date_patterns:
-                dates = re.findall(pattern, text)
-                for date_text in dates:
-                    parsed_date = dateparser.parse(date_text)
-                    if parsed_date and start_date <= parsed_date <= end_date:
-                        pdf.date = parsed_date
-                        return pattern
-            pdf.date = self._FALL_BACK_DATE
-            return None
+                date_patterns = self._general_pattern.get_compiled_date_pattern()
+
+            pattern_used = self._search_date(pdf, text, date_patterns, start_date, end_date)
+            if pattern_used is None:
+                pdf.date = self._FALL_BACK_DATE
+            return pattern_used
         except FileNotFoundError as ex:
             raise FileNotFoundError(f"File not found while extracting PDF data: {pdf.pdf_path}") from ex
 
 
 class PDFOCRProcessor(PDFProcessor):
 
-    def __init__(self, start_date, end_date, general_pattern: GeneralPatternProvider):
+    # Every page OCR'd whole at pdf2image's default resolution, used without an OCR profile provider
+    _FULL_PAGE_PROFILE = OCRProfile(dpis=(200,), grayscale=False, threshold=None, date_band=None, total_band=None)
+
+    def __init__(self, start_date, end_date, general_pattern: GeneralPatternProvider, ocr_profile: Optional[OCRProfileProvider] = None):
         super().__init__(start_date, end_date)
         self._general_pattern = general_pattern
+        self._ocr_profile = ocr_profile
+
+    def _get_profile(self, pdf) -> OCRProfile:
+        return self._ocr_profile.get_profile(pdf.pdf_name) if self._ocr_profile is not None else self._FULL_PAGE_PROFILE
+
+    def _search_ocr_pages(self, pdf, page_numbers: Sequence[int], band: Optional[Tuple[float, float]], search) -> Optional[str]:
+        """
+        OCR the pages with the pdf's profile, one resolution at a time from the lowest, until `search` finds a pattern.
+
+        :param pdf: The PDF being OCR'd.
+        :param page_numbers: 0-based page numbers in the order they are OCR'd.
+        :param band: The band of the page the value is looked for in, the whole page when None.
+        :param search: Searches an OCR text, returns the pattern used or None.
+        :return: The pattern used, None when nothing was found.
+        """
+        profile = self._get_profile(pdf)
+        passes = [(dpi, band) for dpi in profile.dpis]
+        if band is not None:
+            # The value may be outside the band, the whole page is read once more at the highest resolution
+            passes.append((profile.dpis[-1], None))
+
+        for dpi, pass_band in passes:
+            for page_number in page_numbers:
+                ocr_text = pdf.document.get_ocr_page_text(page_number, poppler_path, dpi, pass_band, profile.grayscale, profile.threshold)
+                pattern_used = search(ocr_text)
+                if pattern_used:
+                    return pattern_used
+        return None
+
+    def _extract_total_from_pages(self, pdf, page_numbers: Sequence[int]) -> Optional[str]:
+        total_patterns = self._general_pattern.get_compiled_total_pattern()
+        pattern_used = self._search_ocr_pages(pdf, page_numbers, self._get_profile(pdf).total_band, lambda ocr_text: self._search_total(pdf, ocr_text, total_patterns))
+        if pattern_used is None:
+            pdf.total = self._FALL_BACK_TOTAL
+        return pattern_used
+
+    def _extract_date_from_pages(self, pdf, page_numbers: Sequence[int]) -> Optional[str]:
+        date_patterns = self._general_pattern.get_compiled_date_pattern()
+        start_date, end_date = self._get_statement_window()
+        pattern_used = self._search_ocr_pages(pdf, page_numbers, self._get_profile(pdf).date_band, lambda ocr_text: self._search_date(pdf, ocr_text, date_patterns, start_date, end_date))
+        if pattern_used is None:
+            pdf.date = self._FALL_BACK_DATE
+        return pattern_used
+
+    def extract_total_and_date_streaming(self, pdf, page_priority: Sequence[str], extract_total: bool = True, extract_date: bool = True) -> Tuple[Optional[str], Optional[str]]:
+        # The total and the date can have bands of their own, so each is looked for in its own pass over the pages in page_priority order,
+        # pages OCR'd at the same resolution and band by the first pass are reused by the second
+        try:
+            page_numbers = self.order_pages(pdf.document.page_count, page_priority)
+            pattern_used_total = self._extract_total_from_pages(pdf, page_numbers) if extract_total else None
+            pattern_used_date = self._extract_date_from_pages(pdf, page_numbers) if extract_date else None
+            return pattern_used_total, pattern_used_date
+        except FileNotFoundError as ex:
+            raise FileNotFoundError(f"File not found while extracting PDF data: {pdf.pdf_path}") from ex
 
     def extract_total(self, pdf):
 
         try:
-            total_patterns = self._general_pattern.get_total_pattern()
-            images = pdf2image.convert_from_path(pdf.pdf_path, poppler_path=poppler_path)
-
-            for image in images:
-                ocr_text = pytesseract.image_to_string(image)
-                for pattern in total_patterns:
-                    match = re.search(pattern, ocr_text, re.IGNORECASE)
-                    if match:
-                        extracted_value = match.group(1).replace(',', '')
-                        pdf.total = extracted_value
-                        return pattern
-            pdf.total = self._FALL_BACK_TOTAL
-            return None
+            return self._extract_total_from_pages(pdf, range(pdf.document.page_count))
         except FileNotFoundError as ex:
             raise FileNotFoundError(f"File not found while extracting PDF data: {pdf.pdf_path}") from ex
 
     def extract_date(self, pdf):
 
         try:
-            date_patterns = self._general_pattern.get_date_pattern()
-            start_date = dateparser.parse(self._start_date)
-            end_date = dateparser.parse(self._end_date)
-            images = pdf2image.convert_from_path(pdf.pdf_path, poppler_path=poppler_path)
-
-            for image in images:
-                ocr_text = pytesseract.image_to_string(image)
-                for pattern in date_patterns:
-                    dates = re.findall(pattern, ocr_text)
-                    for date_text in dates:
-                        parsed_date = dateparser.parse(date_text)
-                        if parsed_date and start_date <= parsed_date <= end_date:
-                            pdf.date = parsed_date
-                            return pattern
-            pdf.date = self._FALL_BACK_DATE
-            return None
+            return self._extract_date_from_pages(pdf, range(pdf.document.page_count))
         except FileNotFoundError as ex:
             raise FileNotFoundError(f"File not found while extracting PDF data: {pdf.pdf_path}") from ex
@@ -0,0 +1,128 @@
+import time
+from bisect import insort
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+
+class SubsetSumResult(NamedTuple):
+    positions: Optional[Tuple[int, ...]]  # Positions of the combination in the amounts given to solve(), None when no combination was found
+    nodes: int  # Number of search nodes visited
+    budget_exhausted: bool  # True when the search stopped on the node or time budget before it was complete
+
+
+class SubsetSumSolver:
+    """
+    The `SubsetSumSolver` class finds a combination of amounts, in integer cents, that sums to a target within a tolerance.
+
+    The search is a depth-first search over the amounts in the order they were given, run once per combination size
+    from 1 up to `max_subset_size`. Before each step, the sum of the smallest and of the largest amounts still reachable
+    (precomputed from the sorted suffixes of the amounts) bounds what the remaining slots can add up to,
+    so whole branches that can't reach the target are cut without being visited.
+
+    The winning combination is deterministic: the smallest combination size wins,
+    then the combination whose positions come first lexicographically, i.e. the same one `itertools.combinations` yields first.
+
+    Attributes
+        - `max_subset_size`: The largest number of amounts in a combination.
+        - `node_budget`: The number of search nodes after which the search gives up, None for no limit.
+        - `time_budget_seconds`: The number of seconds after which the search gives up, None for no limit.
+        - `tolerance_cents`: The largest difference in cents between the sum of a combination and the target.
+
+    Methods
+        - `solve(amounts_cents, target_cents)` -> SubsetSumResult: Finds the combination of amounts summing to the target.
+
+    Example usage
+    ```
+    solver = SubsetSumSolver(max_subset_size=6, node_budget=250_000)
+    result = solver.solve([1999, 2500, 4595, 10000], 7094)
+    result.positions  # (0, 1, 2)
+    ```
+    """
+
+    # The clock is only read every this many nodes, reading it on every node would cost more than the nodes themselves
+    _TIME_CHECK_INTERVAL = 1024
+
+    def __init__(self, max_subset_size: int = 6, node_budget: Optional[int] = 250_000, time_budget_seconds: Optional[float] = 0.5, tolerance_cents: int = 1):
+        self.max_subset_size = max_subset_size
+        self.node_budget = node_budget
+        self.time_budget_seconds = time_budget_seconds
+        self.tolerance_cents = tolerance_cents
+
+    @staticmethod
+    def to_cents(amount: float) -> int:
+        return int(round(amount * 100))
+
+    def _build_suffix_bounds(self, amounts_cents: Sequence[int], max_size: int) -> Tuple[List[List[int]], List[List[int]]]:
+        """
+        For every suffix of the amounts, the sums of its k smallest and k largest amounts for k in 0..max_size.
+
+        :param amounts_cents: The amounts in cents.
+        :param max_size: The largest combination size searched.
+        :return: Tuple(smallest_sums, largest_sums) indexed by [suffix start][k].
+        """
+        count = len(amounts_cents)
+        smallest_sums: List[List[int]] = [[0] * (max_size + 1) for _ in range(count + 1)]
+        largest_sums: List[List[int]] = [[0] * (max_size + 1) for _ in range(count + 1)]
+        sorted_suffix: List[int] = []
+        for start in range(count - 1, -1, -1):
+            insort(sorted_suffix, amounts_cents[start])
+            for k in range(1, min(max_size, len(sorted_suffix)) + 1):
+                smallest_sums[start][k] = smallest_sums[start][k - 1] + sorted_suffix[k - 1]
+                largest_sums[start][k] = largest_sums[start][k - 1] + sorted_suffix[-k]
+        return smallest_sums, largest_sums
+
+    def solve(self, amounts_cents: Sequence[int], target_cents: int) -> SubsetSumResult:
+        """
+        Find the combination of amounts summing to the target within `tolerance_cents`.
+
+        :param amounts_cents: The amounts in cents, in the order that decides which combination wins a tie.
+        :param target_cents: The target sum in cents.
+        :return: SubsetSumResult with the positions of the winning combination, or None positions when there is none.
+        """
+        count = len(amounts_cents)
+        max_size = min(self.max_subset_size, count)
+        smallest_sums, largest_sums = self._build_suffix_bounds(amounts_cents, max_size)
+        tolerance = self.tolerance_cents
+        deadline = time.perf_counter() + self.time_budget_seconds if self.time_budget_seconds is not None else None
+        node_budget = self.node_budget
+
+        nodes = 0
+        budget_exhausted = False
+        chosen: List[int] = []
+
+        def search(start: int, slots: int, remaining: int) -> bool:
+            nonlocal nodes, budget_exhausted
+            # The last slot needs no further search, the amount has to be within the tolerance of what remains
+            if slots == 1:
+                for position in range(start, count):
+                    if abs(remaining - amounts_cents[position]) <= tolerance:
+                        chosen.append(position)
+                        return True
+                return False
+
+            for position in range(start, count - slots + 1):
+                # Suffixes only lose amounts as position grows, so once the bounds miss the target every later position misses too
+                if smallest_sums[position][slots] > remaining + tolerance or largest_sums[position][slots] < remaining - tolerance:
+                    return False
+
+                nodes += 1
+                if node_budget is not None and nodes > node_budget:
+                    budget_exhausted = True
+                    return False
+                if deadline is not None and nodes % self._TIME_CHECK_INTERVAL == 0 and time.perf_counter() > deadline:
+                    budget_exhausted = True
+                    return False
+
+                chosen.append(position)
+                if search(position + 1, slots - 1, remaining - amounts_cents[position]):
+                    return True
+                chosen.pop()
+                if budget_exhausted:
+                    return False
+            return False
+
+        for size in range(1, max_size + 1):
+            if search(0, size, target_cents):
+                return SubsetSumResult(tuple(chosen), nodes, False)
+            if budget_exhausted:
+                break
+        return SubsetSumResult(None, nodes, budget_exhausted)
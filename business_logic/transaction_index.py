@@ -0,0 +1,169 @@
+import copy
+from typing import Dict, Hashable, List, Optional, Set, Iterable
+
+import numpy as np
+import pandas as pd
+
+
+class TransactionIndex:
+    """
+    The `TransactionIndex` class normalizes the invoice and transaction details data once and resolves the exact-match
+    candidates of every invoice with a single join, instead of rescanning `transaction_details_df` for each invoice.
+
+    Amounts are compared in integer cents and dates as normalized timestamps.
+    Vendors keep the strategies' case-insensitive `str.contains` semantics:
+    each distinct invoice vendor is matched against the 'Vendor' column once, and the join runs on
+    (vendor, amount in cents, date) for exact matches and on (vendor, amount in cents) for amount-only matches.
+
+    Candidates are kept in `transaction_details_df` order, so taking the first candidate that isn't matched yet gives the
+    same first-come greedy assignment as filtering the DataFrame and taking its first row.
+    The vendor rows are pruned of matched transactions as `matched_transactions` grows, each row being dropped at most once,
+    so the strategies that work on every row of a vendor never rescan the 'Vendor' column or the matched rows again.
+
+    Methods
+        - `with_invoices(invoice_df)` -> TransactionIndex: An index of other invoices over the same transactions, built from this one.
+        - `vendor_rows(vendor)` -> List[Hashable]: Transaction indexes whose 'Vendor' contains the vendor.
+        - `available_vendor_rows(vendor, matched_transactions)` -> List[Hashable]: Vendor rows that aren't matched yet.
+        - `transaction_cents(transaction_row_index)` -> Optional[int]: Amount of the transaction in cents, None if missing.
+        - `transaction_date(transaction_row_index)` -> pd.Timestamp: Normalized date of the transaction, NaT if missing.
+        - `invoice_dates` / `transaction_dates` -> Dict[Hashable, pd.Timestamp]: Normalized dates of every invoice / transaction.
+        - `all_exact_amount_date_candidates()` / `all_exact_amount_candidates()` -> Dict: Candidates of every invoice.
+        - `exact_amount_date_candidates(invoice_row_index)` -> List[Hashable]: Transactions matching vendor, amount and date.
+        - `exact_amount_candidates(invoice_row_index)` -> List[Hashable]: Transactions matching vendor and amount.
+        - `first_available(candidates, matched_transactions)` -> Optional[Hashable]: First candidate not matched yet.
+
+    Example usage
+    ```
+    transaction_index = TransactionIndex(invoice_df, transaction_details_df)
+    found_match_index = transaction_index.first_available(transaction_index.exact_amount_date_candidates(invoice_row.name), matched_transactions)
+    ```
+    """
+
+    def __init__(self, invoice_df: pd.DataFrame, transaction_details_df: pd.DataFrame):
+        self._transaction_cents = self._to_cents(transaction_details_df['Amount'])
+        self._transaction_dates = pd.to_datetime(transaction_details_df['Date'], errors='coerce')
+        self._transaction_vendors = transaction_details_df['Vendor']
+        self._transaction_labels = transaction_details_df.index
+        # Positions of the transactions whose 'Vendor' contains the invoice vendor, shared with the indexes made by with_invoices
+        self._vendor_positions: Dict[str, np.ndarray] = {}
+
+        self._cents_by_row: Dict[Hashable, Optional[int]] = dict(zip(self._transaction_labels, (None if pd.isna(cents) else int(cents) for cents in self._transaction_cents)))
+        self._date_by_row: Dict[Hashable, pd.Timestamp] = dict(zip(self._transaction_labels, self._transaction_dates))
+        self._index_invoices(invoice_df)
+
+    def with_invoices(self, invoice_df: pd.DataFrame) -> 'TransactionIndex':
+        """
+        An index of other invoices over the same transactions, e.g. the next invoices arriving in the InvoicePipeline,
+        reusing the normalized transactions and the vendor rows already found instead of building them again.
+
+        :param invoice_df: The invoices of the new index.
+        :return: TransactionIndex
+        """
+        transaction_index = copy.copy(self)
+        transaction_index._index_invoices(invoice_df)
+        return transaction_index
+
+    def _index_invoices(self, invoice_df: pd.DataFrame) -> None:
+        # Each distinct invoice vendor is matched against the whole 'Vendor' column once, not once per invoice per strategy
+        self._vendor_rows: Dict[str, List[Hashable]] = {}
+        self._available_vendor_rows: Dict[str, List[Hashable]] = {}
+        self._available_pruned_at: Dict[str, int] = {}  # Size of matched_transactions the available rows were last pruned against
+        pair_vendors, pair_positions = [], []
+        for vendor in invoice_df['Vendor'].dropna().unique():
+            if not isinstance(vendor, str):
+                continue
+            positions = self._vendor_positions.get(vendor)
+            if positions is None:
+                positions = self._vendor_positions[vendor] = np.flatnonzero(self._transaction_vendors.str.contains(vendor, case=False, na=False).to_numpy())
+            self._vendor_rows[vendor] = self._transaction_labels[positions].tolist()
+            pair_vendors.extend([vendor] * len(positions))
+            pair_positions.extend(positions.tolist())
+
+        pair_positions = np.asarray(pair_positions, dtype=np.int64)
+        vendor_transactions = pd.DataFrame({
+            'Vendor': pair_vendors,
+            'transaction_position': pair_positions,
+            'cents': self._transaction_cents.iloc[pair_positions].reset_index(drop=True),
+            'date': self._transaction_dates.to_numpy()[pair_positions]
+        })
+
+        invoice_dates = pd.to_datetime(invoice_df['Date'], errors='coerce')
+        self._invoice_date_by_row: Dict[Hashable, pd.Timestamp] = dict(zip(invoice_df.index, invoice_dates))
+        invoices = pd.DataFrame({
+            'invoice_row_index': invoice_df.index,
+            'invoice_position': np.arange(len(invoice_df.index)),
+            'Vendor': invoice_df['Vendor'].to_numpy(),
+            'cents': self._to_cents(invoice_df['Amount']).reset_index(drop=True),
+            'date': invoice_dates.to_numpy()
+        })
+
+        self._exact_amount_date_candidates = self._join(invoices, vendor_transactions, ['Vendor', 'cents', 'date'], self._transaction_labels)
+        self._exact_amount_candidates = self._join(invoices, vendor_transactions, ['Vendor', 'cents'], self._transaction_labels)
+
+    @staticmethod
+    def _to_cents(amounts: pd.Series) -> pd.Series:
+        return (pd.to_numeric(amounts, errors='coerce') * 100).round().astype('Int64')
+
+    @staticmethod
+    def _join(invoices: pd.DataFrame, vendor_transactions: pd.DataFrame, keys: List[str], transaction_labels: pd.Index) -> Dict[Hashable, List[Hashable]]:
+        # Missing amounts or dates never match, the same as NaN/NaT never compares equal in the strategies' filters
+        invoices = invoices.dropna(subset=keys)
+        vendor_transactions = vendor_transactions.dropna(subset=keys)
+
+        candidates = invoices[['invoice_row_index', 'invoice_position'] + keys].merge(vendor_transactions[['transaction_position'] + keys], on=keys, how='inner')
+        candidates = candidates.sort_values(['invoice_position', 'transaction_position'], kind='stable')
+        candidates['transaction_index'] = transaction_labels[candidates['transaction_position'].to_numpy()]
+        return candidates.groupby('invoice_row_index', sort=False)['transaction_index'].agg(list).to_dict()
+
+    def vendor_rows(self, vendor: str) -> List[Hashable]:
+        return self._vendor_rows.get(vendor, [])
+
+    def available_vendor_rows(self, vendor: str, matched_transactions: Set[Hashable]) -> List[Hashable]:
+        """
+        Transaction indexes whose 'Vendor' contains the vendor and that aren't in matched_transactions, in transaction order.
+        matched_transactions only grows during a matching run, so rows pruned once are never needed again and
+        the rows are only pruned again when transactions were matched since the last call.
+
+        :param vendor: The invoice vendor.
+        :param matched_transactions: The indexes of already matched transactions.
+        :return: List of transaction indexes.
+        """
+        if vendor not in self._vendor_rows:
+            return []
+        if vendor not in self._available_vendor_rows:
+            self._available_vendor_rows[vendor] = self._vendor_rows[vendor]
+            self._available_pruned_at[vendor] = -1
+        if self._available_pruned_at[vendor] != len(matched_transactions):
+            self._available_vendor_rows[vendor] = [row for row in self._available_vendor_rows[vendor] if row not in matched_transactions]
+            self._available_pruned_at[vendor] = len(matched_transactions)
+        return self._available_vendor_rows[vendor]
+
+    def transaction_cents(self, transaction_row_index: Hashable) -> Optional[int]:
+        return self._cents_by_row[transaction_row_index]
+
+    def transaction_date(self, transaction_row_index: Hashable) -> pd.Timestamp:
+        return self._date_by_row[transaction_row_index]
+
+    def exact_amount_date_candidates(self, invoice_row_index: Hashable) -> List[Hashable]:
+        return self._exact_amount_date_candidates.get(invoice_row_index, [])
+
+    def exact_amount_candidates(self, invoice_row_index: Hashable) -> List[Hashable]:
+        return self._exact_amount_candidates.get(invoice_row_index, [])
+
+    def all_exact_amount_date_candidates(self) -> Dict[Hashable, List[Hashable]]:
+        return self._exact_amount_date_candidates
+
+    def all_exact_amount_candidates(self) -> Dict[Hashable, List[Hashable]]:
+        return self._exact_amount_candidates
+
+    @property
+    def transaction_dates(self) -> Dict[Hashable, pd.Timestamp]:
+        return self._date_by_row
+
+    @property
+    def invoice_dates(self) -> Dict[Hashable, pd.Timestamp]:
+        return self._invoice_date_by_row
+
+    @staticmethod
+    def first_available(candidates: Iterable[Hashable], matched_transactions: Set[Hashable]) -> Optional[Hashable]:
+        return next((candidate for candidate in candidates if candidate not in matched_transactions), None)
@@ -1,10 +1,11 @@
 from abc import ABC, abstractmethod
-from typing import Union
+from typing import Union, List, Optional, Set
 
 import pandas as pd
+from openpyxl.utils.cell import get_column_letter
 
 from models.worksheet import Worksheet
-from utils.utilities import ProgressTrackingMixin
+from utils.utilities import ProgressTrackingMixin, print_dataframe
 
 
 class UpdateStrategy(ABC, ProgressTrackingMixin):
@@ -17,56 +18,195 @@ class UpdateStrategy(ABC, ProgressTrackingMixin):
         pass
 
 
+def _group_consecutive_positions(positions: List[int]) -> List[List[int]]:
+    """
+    Group sorted row or column positions into runs of consecutive positions, so every run is written with a single range assignment.
+
+    :param positions: Sorted 0-based positions, e.g. [0, 1, 2, 7, 9, 10].
+    :return: List of runs, e.g. [[0, 1, 2], [7], [9, 10]].
+    """
+    runs: List[List[int]] = []
+    for position in positions:
+        if runs and position == runs[-1][-1] + 1:
+            runs[-1].append(position)
+        else:
+            runs.append([position])
+    return runs
+
+
 class TemplateInvoiceUpdateStrategy(UpdateStrategy):
 
+    # Headers are in row 7, data starts at row 8
+    START_ROW = 8
+    _UPDATED_COLUMNS = ['Amount', 'Vendor', 'Date']
+    _UPDATED_COLUMNS_START = 'C'  # Column of 'Amount', the first of _UPDATED_COLUMNS
+
+    def __init__(self, replace_rows: bool = False, in_place: bool = False, changed_file_paths: Optional[Set[str]] = None, **kwargs):
+        super().__init__(**kwargs)
+        # False updates the rows listed by the ListFilesInSpecificOrder macro, True writes data as the new rows when the invoices were discovered in Python
+        self.replace_rows: bool = replace_rows
+        # True only writes the cells of the changed invoices and appends the new ones below the last row, for incremental processing
+        self.in_place: bool = in_place
+        # With in_place, the File Paths whose existing rows are rewritten; None rewrites the existing row of every pdf in data
+        self.changed_file_paths: Optional[Set[str]] = changed_file_paths
+        self.unmatched_pdfs_df: pd.DataFrame = pd.DataFrame()  # PDFs of the last update that had no row with their 'File Path' in the worksheet
+
+    def _replace_worksheet_rows(self, worksheet: Worksheet, data: pd.DataFrame) -> None:
+        existing_data_df = worksheet.read_data_as_dataframe()
+        existing_row_count = len(existing_data_df.index) if existing_data_df is not None else 0
+
+        worksheet.write_dataframe('A7', data.reset_index(drop=True))
+        # Clear the rows of the previous listing that are below the new ones
+        if existing_row_count > len(data.index):
+            worksheet.write_values(f'A{8 + len(data.index)}', [[None] * len(data.columns)] * (existing_row_count - len(data.index)))
+        # The table is fitted to the new rows, the same as the ListFilesInSpecificOrder macro does after listing
+        worksheet.resize_tables()
+        self.unmatched_pdfs_df = data.iloc[0:0]
+
+    def _update_worksheet_rows_in_place(self, worksheet: Worksheet, data: pd.DataFrame) -> None:
+        existing_data_df = worksheet.read_data_as_dataframe()
+        existing_file_paths = existing_data_df['File Path'].tolist() if existing_data_df is not None and not existing_data_df.empty else []
+        row_position_by_file_path = {file_path: row_position for row_position, file_path in enumerate(existing_file_paths) if file_path is not None}
+
+        updates_df = data.dropna(subset=['File Path']).drop_duplicates(subset='File Path', keep='last')
+        has_row = updates_df['File Path'].isin(row_position_by_file_path.keys())
+        rewritten_df = updates_df.loc[has_row]
+        if self.changed_file_paths is not None:
+            rewritten_df = rewritten_df.loc[rewritten_df['File Path'].isin(self.changed_file_paths)]
+
+        # Only the Amount, Vendor and Date cells of the changed rows are written, one range assignment per run of consecutive rows
+        updated_values_by_row_position = dict(zip(rewritten_df['File Path'].map(row_position_by_file_path), rewritten_df[self._UPDATED_COLUMNS].values.tolist()))
+        for run in _group_consecutive_positions(sorted(updated_values_by_row_position)):
+            worksheet.write_values(f'{self._UPDATED_COLUMNS_START}{self.START_ROW + run[0]}', [updated_values_by_row_position[row_position] for row_position in run])
+
+        # PDFs without a row are appended below the last row in a single block
+        appended_df = updates_df.loc[~has_row]
+        if not appended_df.empty:
+            worksheet.write_dataframe(f'A{self.START_ROW + len(existing_file_paths)}', appended_df.reset_index(drop=True), header=False)
+            worksheet.resize_tables()
+        self.unmatched_pdfs_df = data.iloc[0:0]
+
     def update_worksheet(self, worksheet: Worksheet, data: pd.DataFrame):
-        self.start_progress_tracking(len(data), "Updating Invoices Worksheet:")
+        self.start_progress_tracking(1, "Updating Invoices Worksheet:")
+
+        if self.in_place:
+            self._update_worksheet_rows_in_place(worksheet, data)
+            self.update_progress()
+            self.complete_progress()
+            return
+
+        if self.replace_rows:
+            self._replace_worksheet_rows(worksheet, data)
+            self.update_progress()
+            self.complete_progress()
+            return
 
         # Assuming 'data_df' is a DataFrame with columns ['File Name', 'File Path', 'Amount', 'Vendor', 'Date']
         # Read the existing data from the worksheet into a DataFrame
         existing_data_df = worksheet.read_data_as_dataframe()
 
-        # Update the rows in existing_data_df with the data in pdf_data based on matching 'File Path'
-        for _, data_row in data.iterrows():
-            # Match by 'File Path'
-            mask = existing_data_df['File Path'] == data_row['File Path']
+        # Update the rows in existing_data_df with the data in pdf_data based on matching 'File Path', keyed lookup instead of a mask per pdf
+        # The last pdf wins when a 'File Path' repeats, the same as updating row by row, and a missing 'File Path' never matches
+        updates_by_file_path = data.dropna(subset=['File Path']).drop_duplicates(subset='File Path', keep='last').set_index('File Path')
+        existing_file_paths = existing_data_df['File Path']
+        mask = existing_file_paths.isin(updates_by_file_path.index)
 
-            # If the file_path exists in the existing_data_df, update the corresponding row
-            if mask.any():
-                existing_data_df.loc[mask, 'Amount'] = data_row['Amount']
-                existing_data_df.loc[mask, 'Vendor'] = data_row['Vendor']
-                existing_data_df.loc[mask, 'Date'] = data_row['Date']
-                self.update_progress()
+        # Only rows that already exist in the worksheet are updated, in place, so the row order is kept
+        for column in self._UPDATED_COLUMNS:
+            existing_data_df.loc[mask, column] = existing_file_paths[mask].map(updates_by_file_path[column])
+
+        self.unmatched_pdfs_df = data.loc[~data['File Path'].isin(existing_file_paths[existing_file_paths.notna()])]
+        if not self.unmatched_pdfs_df.empty:
+            print_dataframe(self.unmatched_pdfs_df, "PDFs Without A Matching Invoices Worksheet Row:")
+        self.update_progress()
 
         # Write the updated DataFrame back to the Excel sheet
         # This step overwrites the existing data starting from the specified cell range
-        worksheet.sheet.range('A7').options(index=False).value = existing_data_df.reset_index(drop=True)
+        worksheet.write_dataframe('A7', existing_data_df.reset_index(drop=True))
         self.complete_progress()
 
 
 class TemplateTransactionDetails2UpdateStrategy(UpdateStrategy):
 
+    # Headers are in row 7, data starts at row 8
+    START_ROW = 8
+    # Columns E:H hold the formulas, the positions of 'Account', 'Sub-Account', 'Vendor' and 'Explanation' in the worksheet
+    _FORMULA_COLUMN_POSITIONS = range(4, 8)
+    # The statement columns, when they are the same in the worksheet the rows are the same transactions
+    _TRANSACTION_COLUMNS = ['Date', 'Description', 'Amount']
+
+    def __init__(self, in_place: bool = False, **kwargs):
+        super().__init__(**kwargs)
+        # True only writes the changed cells when the worksheet already holds the same transactions, e.g. the File Names of newly matched invoices
+        self.in_place: bool = in_place
+
+    @staticmethod
+    def build_formulas(start_row: int, last_row: int) -> List[List[str]]:
+        """
+        Build the formulas of columns E:H for every data row, one inner list per row.
+
+        :param start_row: First worksheet row of the data.
+        :param last_row: Last worksheet row of the data.
+        :return: 2-D list of formulas for the range E{start_row}:H{last_row}.
+        """
+        return [
+            [
+                # Account formula set in column 'E'
+                f'=XLOOKUP(G{index}, Table2[[#All],[Vendors]], Table2[[#All],[Account]],,0,1)',
+                # Sub-Account formula set in column 'F'
+                f'=XLOOKUP(G{index}, Table2[[#All],[Vendors]], Table2[[#All],[Code]], "PLEASE REVIEW", 0, 1)',
+                # Vendor formula set in column 'G'
+                f'=TEXTBEFORE(C{index}," ")',
+                # Explanation formula set in column 'H'
+                f'=TEXTJOIN("/", TRUE, "Amex", "IT", G{index}, TEXTAFTER(I{index},"- "))'
+            ]
+            for index in range(start_row, last_row + 1)
+        ]
+
+    def _has_same_transactions(self, existing_data_df: Optional[pd.DataFrame], data: pd.DataFrame) -> bool:
+        if existing_data_df is None or list(existing_data_df.columns) != list(data.columns) or len(existing_data_df.index) != len(data.index):
+            return False
+        return existing_data_df[self._TRANSACTION_COLUMNS].reset_index(drop=True).equals(data[self._TRANSACTION_COLUMNS].reset_index(drop=True))
+
+    def _update_changed_cells(self, worksheet: Worksheet, existing_data_df: pd.DataFrame, data: pd.DataFrame) -> None:
+        existing_values = existing_data_df.reset_index(drop=True).astype(object)
+        new_values = data.reset_index(drop=True).astype(object)
+        # Missing values on both sides are the same empty cell
+        changed = ~((existing_values == new_values) | (existing_values.isna() & new_values.isna()))
+
+        # The formula columns split the value columns into blocks, e.g. A:D and I:I, each block of a run of changed rows is one range assignment
+        value_column_blocks = _group_consecutive_positions([position for position in range(len(data.columns)) if position not in self._FORMULA_COLUMN_POSITIONS])
+        changed_row_positions = [row_position for row_position, row_changed in enumerate(changed.any(axis=1)) if row_changed]
+        for run in _group_consecutive_positions(changed_row_positions):
+            for block in value_column_blocks:
+                if changed.iloc[run, block].values.any():
+                    worksheet.write_values(f'{get_column_letter(block[0] + 1)}{self.START_ROW + run[0]}', new_values.iloc[run, block].values.tolist())
+
     def update_worksheet(self, worksheet: Worksheet, data: pd.DataFrame):
-        self.start_progress_tracking(len(data), "Updating Transaction Details 2 Worksheet:")
+        if self.in_place:
+            existing_data_df = worksheet.read_data_as_dataframe()
+            # The formulas only depend on the row, they are already in place when the rows are the same transactions
+            if self._has_same_transactions(existing_data_df, data):
+                self.start_progress_tracking(1, "Updating Transaction Details 2 Worksheet In Place:")
+                self._update_changed_cells(worksheet, existing_data_df, data)
+                self.update_progress()
+                self.complete_progress()
+                return
+
+        self.start_progress_tracking(2, "Updating Transaction Details 2 Worksheet:")
 
-        start_row = 8  # Headers are in row 7, data starts at row 8
+        start_row = self.START_ROW
         last_row = start_row + len(data) - 1
 
         # Update the DataFrame directly to the Excel worksheet
-        worksheet.sheet.range(f'A{start_row}').options(index=False, header=False).value = data
+        worksheet.write_dataframe(f'A{start_row}', data, header=False)
+        self.update_progress()
 
         # Account formula set in column 'E', Sub-Account in 'F', Vendor in 'G', Explanation in 'H'
-        # Apply the formulas row by row
-        for index in range(start_row, last_row + 1):
-            # Account formula set in column 'E'
-            worksheet.sheet.range(f'E{index}').formula = f'=XLOOKUP(G{index}, Table2[[#All],[Vendors]], Table2[[#All],[Account]],,0,1)'
-            # Sub-Account formula set in column 'F'
-            worksheet.sheet.range(f'F{index}').formula = f'=XLOOKUP(G{index}, Table2[[#All],[Vendors]], Table2[[#All],[Code]], "PLEASE REVIEW", 0, 1)'
-            # Vendor formula set in column 'G'
-            worksheet.sheet.range(f'G{index}').formula = f'=TEXTBEFORE(C{index}," ")'
-            # Explanation formula set in column 'H'
-            worksheet.sheet.range(f'H{index}').formula = f'=TEXTJOIN("/", TRUE, "Amex", "IT", G{index}, TEXTAFTER(I{index},"- "))'
-            self.update_progress()
+        # All formulas are written with a single range assignment, every range call is a round-trip to Excel
+        if last_row >= start_row:
+            worksheet.write_formulas(f'E{start_row}:H{last_row}', self.build_formulas(start_row, last_row))
+        self.update_progress()
 
         self.complete_progress()
 
@@ -75,11 +215,8 @@ class AmexTransactionDetailsUpdateStrategy(UpdateStrategy):
 
     def update_worksheet(self, worksheet: Worksheet, data: Worksheet):
         self.start_progress_tracking(1, "Updating Amex Transaction Details Worksheet:")
-        # last_row = data.sheet.range('A' + str(data.sheet.cells.last_cell.row)).end('up').row
         worksheet_start_row = 'A7'
-        data_last_row_index: int = data.sheet.cells.last_cell.row
-        data_range = f'A7:K{data_last_row_index}'  # Update column range as necessary
-        # Copying range from data Worksheet and pasting it in the location starting at 'A7' in worksheet 7/11/2024
-        data.sheet.range(data_range).copy(worksheet.sheet.range(worksheet_start_row))
+        # Copying range A7:K down to the last row of column A from data Worksheet and pasting it in the location starting at 'A7' in worksheet 7/11/2024
+        data.copy_data_range('A7', 'K', worksheet, worksheet_start_row)  # Update column range as necessary
         self.update_progress()
         self.complete_progress()
@@ -6,10 +6,10 @@ from business_logic.update_strategies import TemplateInvoiceUpdateStrategy, Temp
 
 class WorkbookManager(ABC):
 
-    def __init__(self, workbook_name: str, workbook_path: str):
+    def __init__(self, workbook_name: str, workbook_path: str, backend: str = 'xlwings'):
         self.workbook_name = workbook_name
         self.workbook_path = workbook_path
-        self.workbook = Workbook(workbook_path)
+        self.workbook = Workbook(workbook_path, backend)
 
     @abstractmethod
     def select_worksheet_strategy(self, worksheet_name: str):
@@ -1,8 +1,10 @@
+import os
 import sys
 import typer
 from typing import Optional
 from rich.console import Console
-from automation.amex_automation_orchestrator import AmexAutomationOrchestrator
+from automation.amex_automation_orchestrator import AmexAutomationOrchestrator, SystemConfigurations
+from business_logic.extraction_cache import ExtractionCache
 
 app = typer.Typer()
 console = Console()
@@ -49,10 +51,38 @@ def process_amex(
         )
 ):
     """Processes the AMEX statement by handling both invoices and transaction details."""
-    controller = AmexAutomationOrchestrator(amex_path, amex_statement, amex_start_date, amex_end_date, macro_parameter_1,
-                                            macro_parameter_2)
-    controller.process_invoices_worksheet()
-    controller.process_transaction_details_2_worksheet()
+    controller = AmexAutomationOrchestrator(SystemConfigurations(
+        start_date=amex_start_date, end_date=amex_end_date,
+        macro_parameter_1=macro_parameter_1, macro_parameter_2=macro_parameter_2,
+        amex_workbook_name=amex_statement, amex_template_workbooks_path=amex_path
+    ))
+    try:
+        controller.process_invoices_worksheet()
+        controller.process_transaction_details_2_worksheet()
+    finally:
+        # The timings of a run that failed part way are written too, they show the stage it failed in
+        controller.write_instrumentation_report()
+
+
+@app.command(help="Deletes cached invoice extraction results so the next run extracts the invoice pdfs again.")
+def invalidate_cache(
+        amex_path: str = typer.Option(
+            "K:/B_Amex",
+            help="Directory path of the AMEX statement workbook, the extraction cache is in it unless --cache-path is given."
+        ),
+        cache_path: Optional[str] = typer.Option(
+            None,
+            help="Directory of the invoice extraction cache, defaults to the one process_amex uses inside --amex-path."
+        ),
+        pdf_path: Optional[str] = typer.Option(
+            None,
+            help="Only delete the cached results of this invoice pdf."
+        )
+):
+    """Deletes cached invoice extraction results so the next run extracts the invoice pdfs again."""
+    cache_path = cache_path or os.path.join(amex_path, SystemConfigurations.extraction_cache_folder_name)
+    removed = ExtractionCache(cache_path).invalidate(pdf_path)
+    console.print(f"Removed {removed} cached extraction result(s) from {cache_path}")
 
 
 @app.command(help="Placeholder for a second process. Define functionality here.")
@@ -1,9 +1,11 @@
 import datetime
-import dateparser
 
+from models.pdf_document import PDFDocument
 from utils.custom_exceptions import PDFError
+from utils.date_parsing import date_parsing_service
 
 from dataclasses import dataclass, field
+from typing import Optional
 
 
 @dataclass
@@ -16,6 +18,19 @@ class PDF:
     _total: float = field(default=None, init=False)
     _date: str = field(default=None, init=False)
     vendor: str = field(default=None, init=False)
+    # Parsed text and rasterized pages shared by every extraction step, freed once the PDF has been processed
+    _document: Optional[PDFDocument] = field(default=None, init=False, repr=False)
+
+    @property
+    def document(self) -> PDFDocument:
+        if self._document is None:
+            self._document = PDFDocument(self.pdf_path)
+        return self._document
+
+    def release_document(self) -> None:
+        if self._document is not None:
+            self._document.release()
+            self._document = None
 
     @property
     def total(self):
@@ -38,7 +53,7 @@ class PDF:
         """
         This method sets the date of the PDF to the provided extracted_date.
         The extracted_date can be either a string or a datetime.date object.
-        If it is a string, it will be parsed using the dateparser library.
+        If it is a string, it will be parsed by the date parsing service, falling back to the dateparser library.
         If the parsing fails, a ValueError will be raised.
         If the extracted_date is already a datetime.date object, it will be used directly.
         If the extracted_date is of any other type, a TypeError will be raised.
@@ -62,7 +77,7 @@ class PDF:
         """
         try:
             if isinstance(extracted_date, str):
-                parsed_date = dateparser.parse(extracted_date)
+                parsed_date = date_parsing_service.parse(extracted_date)
                 if not parsed_date:
                     raise ValueError(f"Unable to parse the date string: '{extracted_date}'")
             elif isinstance(extracted_date, datetime.date):
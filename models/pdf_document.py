@@ -0,0 +1,130 @@
+from typing import Dict, List, Optional, Tuple
+
+import pdf2image
+import pdfplumber
+import pytesseract
+
+from utils.instrumentation import instrumentation
+
+
+class PDFDocument:
+    """
+    Per-run cache of the parsed content of a single invoice PDF.
+
+    Every piece of content is filled lazily on first access and then shared between the total, date and vendor extraction
+    steps, so an invoice is parsed by pdfplumber once and rasterized by pdf2image once per run instead of once per step.
+    Pages are parsed, rasterized and OCR'd one at a time, so a caller that stops early never pays for the remaining pages.
+    Rasterized pages are cached per (page, dpi) and OCR text per page, dpi, band and preprocessing,
+    so OCR passes at another resolution or over another band of the page reuse what was already rasterized.
+
+    Attributes
+        - `pdf_path`: The path of the PDF file the cached content belongs to.
+
+    Methods
+        - `page_count` -> int: Number of pages in the PDF.
+        - `get_page_text(page_number)` -> str: Text of a single page extracted by pdfplumber.
+        - `page_texts` -> List[str]: Text of every page extracted by pdfplumber.
+        - `text` -> str: Text of all pages joined by a single space.
+        - `extracted_text` -> str: Text of the pages that have been extracted so far, joined by a single space.
+        - `get_page_image(page_number, poppler_path, dpi)` -> Image: A single page rasterized at the given resolution.
+        - `get_ocr_page_text(page_number, poppler_path, dpi, band, grayscale, threshold)` -> str: Tesseract text of a single page,
+          or of a horizontal band of it, optionally converted to grayscale and thresholded first.
+        - `ocr_text` -> str: OCR text of the pages that have been OCR'd so far, one text per page, joined by a single space.
+        - `release()` -> None: Frees all cached content.
+    """
+
+    # pdf2image's default resolution
+    DEFAULT_DPI = 200
+
+    def __init__(self, pdf_path: str):
+        self.pdf_path = pdf_path
+        self._plumber_pdf = None
+        self._page_texts: Dict[int, str] = {}
+        self._text: Optional[str] = None
+        self._images: Dict[Tuple[int, int], object] = {}
+        # (page number, dpi, band, grayscale, threshold) -> Tesseract text
+        self._ocr_page_texts: Dict[Tuple[int, int, Optional[Tuple[float, float]], bool, Optional[int]], str] = {}
+
+    def _open_plumber_pdf(self):
+        # Kept open until release() so pages can be laid out one at a time
+        if self._plumber_pdf is None:
+            self._plumber_pdf = pdfplumber.open(self.pdf_path)
+        return self._plumber_pdf
+
+    @property
+    def page_count(self) -> int:
+        return len(self._open_plumber_pdf().pages)
+
+    def get_page_text(self, page_number: int) -> str:
+        if page_number not in self._page_texts:
+            self._page_texts[page_number] = self._open_plumber_pdf().pages[page_number].extract_text() or ''
+        return self._page_texts[page_number]
+
+    @property
+    def page_texts(self) -> List[str]:
+        return [self.get_page_text(page_number) for page_number in range(self.page_count)]
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = ' '.join(self.page_texts)
+        return self._text
+
+    @property
+    def extracted_text(self) -> str:
+        return ' '.join(self._page_texts[page_number] for page_number in sorted(self._page_texts))
+
+    def get_page_image(self, page_number: int, poppler_path: Optional[str] = None, dpi: Optional[int] = None):
+        dpi = dpi or self.DEFAULT_DPI
+        if (page_number, dpi) not in self._images:
+            # pdf2image pages are 1-based
+            self._images[(page_number, dpi)] = pdf2image.convert_from_path(self.pdf_path, dpi=dpi, first_page=page_number + 1, last_page=page_number + 1, poppler_path=poppler_path)[0]
+        return self._images[(page_number, dpi)]
+
+    def get_ocr_page_text(self, page_number: int, poppler_path: Optional[str] = None, dpi: Optional[int] = None, band: Optional[Tuple[float, float]] = None,
+                          grayscale: bool = False, threshold: Optional[int] = None) -> str:
+        """
+        :param page_number: 0-based page number.
+        :param poppler_path: The path of the poppler binaries used by pdf2image.
+        :param dpi: Resolution the page is rasterized at, pdf2image's default when None.
+        :param band: (top, bottom) of the band of the page that is OCR'd as fractions of the page height, the whole page when None.
+        :param grayscale: Whether the image is converted to grayscale before OCR.
+        :param threshold: Gray level at or below which a pixel turns black and above which white, no thresholding when None.
+        :return: The Tesseract text.
+        """
+        key = (page_number, dpi or self.DEFAULT_DPI, band, grayscale, threshold)
+        if key not in self._ocr_page_texts:
+            image = self.get_page_image(page_number, poppler_path, dpi)
+            # Cropped first, so the preprocessing and Tesseract only see the band
+            if band is not None:
+                top, bottom = band
+                image = image.crop((0, int(top * image.height), image.width, int(bottom * image.height)))
+            if grayscale or threshold is not None:
+                image = image.convert('L')
+            if threshold is not None:
+                image = image.point(lambda level: 255 if level > threshold else 0)
+            instrumentation.count(f"tesseract_runs: {key[1]} dpi, {'band' if band is not None else 'whole page'}")
+            self._ocr_page_texts[key] = pytesseract.image_to_string(image)
+        return self._ocr_page_texts[key]
+
+    @property
+    def ocr_text(self) -> str:
+        # One text per page: a whole page pass over a band, then the highest resolution read
+        best_keys = {}
+        for key in self._ocr_page_texts:
+            page_number, dpi, band = key[:3]
+            best_key = best_keys.get(page_number)
+            if best_key is None or (band is None, dpi) > (best_key[2] is None, best_key[1]):
+                best_keys[page_number] = key
+        return ' '.join(self._ocr_page_texts[best_keys[page_number]] for page_number in sorted(best_keys))
+
+    def release(self) -> None:
+        if self._plumber_pdf is not None:
+            self._plumber_pdf.close()
+        for image in self._images.values():
+            image.close()
+        self._plumber_pdf = None
+        self._page_texts = {}
+        self._text = None
+        self._images = {}
+        self._ocr_page_texts = {}
@@ -1,38 +1,48 @@
-import xlwings as xw
-
 from models.worksheet import Worksheet
+from models.workbook_backends import WORKBOOK_BACKENDS
+from utils.instrumentation import instrumentation
 
-from typing import Optional
+from contextlib import contextmanager
+from typing import Iterator, Optional
 
 
 class Workbook:
+	"""
+    Holds the worksheets of a workbook file opened through a backend:
+    'xlwings' drives the workbook in Excel, 'openpyxl' edits the file directly without Excel and runs the Python
+    equivalents of the workbook's macros.
+    """
 
-	def __init__(self, workbook_path=None):
+	def __init__(self, workbook_path=None, backend: str = 'xlwings'):
 		self.worksheets = {}
+		# Nested bulk sessions share the outermost one, only it suspends and restores the application
+		self._bulk_session_depth = 0
 
 		if workbook_path is None:
 			print("Workbook not found.")
 		else:
-			self.workbook = xw.Book(workbook_path)
-			self.workbook_name = self.workbook.name
+			if backend not in WORKBOOK_BACKENDS:
+				raise ValueError(f"Unknown workbook backend '{backend}', expected one of {tuple(WORKBOOK_BACKENDS)}")
+			self.workbook = WORKBOOK_BACKENDS[backend](workbook_path)
+			self.workbook_name = self.workbook.workbook_name
 
 		# Automatically add all existing worksheets
-		for sheet in self.workbook.sheets:
-			self.worksheets[sheet.name] = Worksheet(sheet.name, sheet)
+		for sheet_name, sheet in self.workbook.sheets().items():
+			self.worksheets[sheet_name] = Worksheet(sheet_name, sheet)
 
 	def add_worksheet(self, worksheet_name: str) -> None:
 		"""
         Add a worksheet to the workbook that hasn't already been added into the worksheets' dict.
         """
 		if worksheet_name not in self.worksheets:
-			sheet = self.workbook.sheets.add(worksheet_name)
+			sheet = self.workbook.add_sheet(worksheet_name)
 			self.worksheets[worksheet_name] = Worksheet(worksheet_name, sheet)
 		else:
 			print(f"Worksheet '{worksheet_name}' already exists.")
 
 	def remove_worksheet(self, worksheet_name) -> None:
 		if worksheet_name in self.worksheets:
-			self.workbook.sheets[worksheet_name].delete()
+			self.workbook.delete_sheet(worksheet_name)
 			del self.worksheets[worksheet_name]
 		else:
 			print(f"Worksheet '{worksheet_name}' not found.")
@@ -61,17 +71,46 @@ class Workbook:
         :param save_path: String
         :return: None
         """
-		if save_path:
+		with instrumentation.span('save_workbook', 'workbook', workbook=self.workbook_name):
 			self.workbook.save(save_path)
-		else:
-			self.workbook.save()
 
 	def close(self) -> None:
 		self.workbook.close()
 
 	def call_macro_workbook(self, macro_name, macro_parameter_1: Optional[str] = None, macro_parameter_2: Optional[str] = None):
-		macro_vba = self.workbook.app.macro(macro_name)
-		if macro_parameter_1 is not None and macro_parameter_2 is not None:
-			macro_vba(macro_parameter_1, macro_parameter_2)
-		else:
-			macro_vba()
+		with instrumentation.span(f"macro: {macro_name}", 'workbook', workbook=self.workbook_name):
+			if macro_parameter_1 is not None and macro_parameter_2 is not None:
+				self.workbook.run_macro(macro_name, macro_parameter_1, macro_parameter_2)
+			else:
+				self.workbook.run_macro(macro_name)
+		# The macro writes to the sheets behind the worksheets' backs
+		for worksheet in self.worksheets.values():
+			worksheet.invalidate_data_extent()
+
+	@contextmanager
+	def bulk_session(self) -> Iterator['Workbook']:
+		"""
+        Suspend recalculation, screen updates and events for a block of writes, so Excel recalculates the workbook's formulas
+        once at the end instead of after every write. The prior calculation mode, ScreenUpdating and EnableEvents are restored on exit,
+        also when the block raises; the recalculation is skipped then. Nested sessions only take effect at the outermost one.
+
+        :return: Iterator of this Workbook, for use in a with statement.
+        """
+		if self._bulk_session_depth:
+			self._bulk_session_depth += 1
+			try:
+				yield self
+			finally:
+				self._bulk_session_depth -= 1
+			return
+
+		prior_state = self.workbook.suspend_application_updates()
+		self._bulk_session_depth = 1
+		completed = False
+		try:
+			yield self
+			completed = True
+		finally:
+			self._bulk_session_depth = 0
+			with instrumentation.span('bulk_session_restore', 'workbook', workbook=self.workbook_name):
+				self.workbook.restore_application_updates(prior_state, recalculate=completed)
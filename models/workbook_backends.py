@@ -0,0 +1,443 @@
+import os
+import re
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Match, Optional, Pattern, Tuple
+
+import openpyxl
+import pandas as pd
+import xlwings as xw
+from openpyxl.formula.translate import Translator
+from openpyxl.utils.cell import coordinate_from_string, column_index_from_string, range_boundaries, get_column_letter
+
+from models.workbook_macros import PYTHON_MACROS, resize_tables
+from utils.instrumentation import instrumentation
+
+
+class WorksheetBackend(ABC):
+    """
+    The `WorksheetBackend` class is the interface `Worksheet` reads and writes a single sheet through,
+    so the update strategies and processors don't depend on which library holds the workbook.
+
+    Ranges are A1-style addresses. Reads follow the xlwings conventions:
+    a single cell is a value, a single row or column is a flat list, anything else is a list of row lists.
+
+    Methods
+        - `read_range(address)` -> Any: Values of the range.
+        - `read_table(cell)` -> pd.DataFrame: The table whose header row starts at the cell, up to the first empty row.
+        - `write_dataframe(cell, dataframe, header)` -> None: Writes the DataFrame, without its index, starting at the cell.
+        - `write_values(cell, values)` -> None: Writes a 2-D list of values starting at the cell.
+        - `write_formulas(address, formulas)` -> None: Writes a 2-D list of formulas to the range.
+        - `last_data_row(column)` -> int: Row number of the last non-empty cell of the column, 0 when the column is empty.
+        - `copy_range(address, destination, destination_cell)` -> None: Copies the range to another sheet of the same backend.
+        - `resize_tables()` -> None: Resizes every table of the sheet to the rows filled below its headers, keeping at least one data row.
+    """
+
+    @abstractmethod
+    def read_range(self, address: str) -> Any:
+        ...
+
+    @abstractmethod
+    def read_table(self, cell: str) -> pd.DataFrame:
+        ...
+
+    @abstractmethod
+    def write_dataframe(self, cell: str, dataframe: pd.DataFrame, header: bool = True) -> None:
+        ...
+
+    @abstractmethod
+    def write_values(self, cell: str, values: List[List[Any]]) -> None:
+        ...
+
+    @abstractmethod
+    def write_formulas(self, address: str, formulas: List[List[str]]) -> None:
+        ...
+
+    @abstractmethod
+    def last_data_row(self, column: str) -> int:
+        ...
+
+    @abstractmethod
+    def copy_range(self, address: str, destination: 'WorksheetBackend', destination_cell: str) -> None:
+        ...
+
+    @abstractmethod
+    def resize_tables(self) -> None:
+        ...
+
+
+class WorkbookBackend(ABC):
+    """
+    The `WorkbookBackend` class is the interface `Workbook` opens, saves and runs macros on a workbook file through.
+
+    Methods
+        - `sheets()` -> Dict[str, WorksheetBackend]: The sheets of the workbook by name.
+        - `add_sheet(name)` -> WorksheetBackend: Adds an empty sheet.
+        - `delete_sheet(name)` -> None: Deletes the sheet.
+        - `save(save_path)` -> None: Saves to the path, or where the workbook was opened from.
+        - `close()` -> None: Closes the workbook.
+        - `run_macro(macro_name, *macro_parameters)` -> None: Runs the macro of the workbook.
+        - `suspend_application_updates()` -> Any: Stops recalculation, screen updates and events, returns the prior state.
+        - `restore_application_updates(prior_state, recalculate)` -> None: Restores the prior state, recalculating the formulas once first.
+    """
+
+    def __init__(self, workbook_path: str):
+        self.workbook_path = workbook_path
+        self.workbook_name = os.path.basename(workbook_path)
+
+    @abstractmethod
+    def sheets(self) -> Dict[str, WorksheetBackend]:
+        ...
+
+    @abstractmethod
+    def add_sheet(self, name: str) -> WorksheetBackend:
+        ...
+
+    @abstractmethod
+    def delete_sheet(self, name: str) -> None:
+        ...
+
+    @abstractmethod
+    def save(self, save_path: Optional[str] = None) -> None:
+        ...
+
+    @abstractmethod
+    def close(self) -> None:
+        ...
+
+    @abstractmethod
+    def run_macro(self, macro_name: str, *macro_parameters: str) -> None:
+        ...
+
+    @abstractmethod
+    def suspend_application_updates(self) -> Any:
+        ...
+
+    @abstractmethod
+    def restore_application_updates(self, prior_state: Any, recalculate: bool = True) -> None:
+        ...
+
+
+def _count_com_call(operation: str) -> None:
+    instrumentation.count('excel_com_calls')
+    instrumentation.count(f"excel_com_calls: {operation}")
+
+
+class XlwingsWorksheetBackend(WorksheetBackend):
+    """
+    Reads and writes a sheet of a workbook open in Excel, every call is a COM round-trip to the Excel process.
+    """
+
+    def __init__(self, sheet):
+        self.sheet = sheet
+
+    def read_range(self, address: str) -> Any:
+        _count_com_call('read_range')
+        return self.sheet.range(address).value
+
+    def read_table(self, cell: str) -> pd.DataFrame:
+        _count_com_call('read_table')
+        # header True to interpret the first row as column headers for the dataframe, index=False to make sure the first column is not interpreted as an index column
+        return self.sheet.range(cell).options(pd.DataFrame, expand='table', header=True, index=False).value
+
+    def write_dataframe(self, cell: str, dataframe: pd.DataFrame, header: bool = True) -> None:
+        _count_com_call('write_dataframe')
+        self.sheet.range(cell).options(index=False, header=header).value = dataframe
+
+    def write_values(self, cell: str, values: List[List[Any]]) -> None:
+        _count_com_call('write_values')
+        self.sheet.range(cell).value = values
+
+    def write_formulas(self, address: str, formulas: List[List[str]]) -> None:
+        _count_com_call('write_formulas')
+        self.sheet.range(address).formula = formulas
+
+    def last_data_row(self, column: str) -> int:
+        _count_com_call('last_data_row')
+        # Ctrl+Up from the sheet's last row, instead of marshalling the column down to row 1,048,576
+        last_cell = self.sheet.range(f"{column}{self.sheet.cells.last_cell.row}")
+        if last_cell.value is not None:
+            return last_cell.row
+        data_cell = last_cell.end('up')
+        return data_cell.row if data_cell.row > 1 or data_cell.value is not None else 0
+
+    def copy_range(self, address: str, destination: WorksheetBackend, destination_cell: str) -> None:
+        _count_com_call('copy_range')
+        self.sheet.range(address).copy(destination.sheet.range(destination_cell))
+
+    def resize_tables(self) -> None:
+        _count_com_call('resize_tables')
+        for table in self.sheet.tables:
+            header_row_range = table.header_row_range
+            header_row, first_column = header_row_range.row, header_row_range.column
+            # Ctrl+Down from the first data cell finds the last filled row, unless the first data row is the only filled one
+            last_row = header_row + 1
+            if self.sheet.range((header_row + 1, first_column)).value is not None and self.sheet.range((header_row + 2, first_column)).value is not None:
+                last_row = self.sheet.range((header_row + 1, first_column)).end('down').row
+            table.resize(self.sheet.range((header_row, first_column), (last_row, header_row_range.last_cell.column)))
+
+
+class XlwingsWorkbookBackend(WorkbookBackend):
+    """
+    Opens the workbook in Excel through xlwings; macros are the workbook's own VBA macros.
+    """
+
+    def __init__(self, workbook_path: str):
+        super().__init__(workbook_path)
+        self.workbook = xw.Book(workbook_path)
+        self.workbook_name = self.workbook.name
+
+    def sheets(self) -> Dict[str, WorksheetBackend]:
+        _count_com_call('sheets')
+        return {sheet.name: XlwingsWorksheetBackend(sheet) for sheet in self.workbook.sheets}
+
+    def add_sheet(self, name: str) -> WorksheetBackend:
+        _count_com_call('add_sheet')
+        return XlwingsWorksheetBackend(self.workbook.sheets.add(name))
+
+    def delete_sheet(self, name: str) -> None:
+        _count_com_call('delete_sheet')
+        self.workbook.sheets[name].delete()
+
+    def save(self, save_path: Optional[str] = None) -> None:
+        _count_com_call('save')
+        if save_path:
+            self.workbook.save(save_path)
+        else:
+            self.workbook.save()
+
+    def close(self) -> None:
+        _count_com_call('close')
+        self.workbook.close()
+
+    def run_macro(self, macro_name: str, *macro_parameters: str) -> None:
+        _count_com_call('run_macro')
+        macro_vba = self.workbook.app.macro(macro_name)
+        macro_vba(*macro_parameters)
+
+    def suspend_application_updates(self) -> Tuple[str, bool, bool]:
+        _count_com_call('suspend_application_updates')
+        app = self.workbook.app
+        prior_state = (app.calculation, app.screen_updating, app.enable_events)
+        app.calculation = 'manual'
+        app.screen_updating = False
+        app.enable_events = False
+        return prior_state
+
+    def restore_application_updates(self, prior_state: Tuple[str, bool, bool], recalculate: bool = True) -> None:
+        _count_com_call('restore_application_updates')
+        app = self.workbook.app
+        calculation, screen_updating, enable_events = prior_state
+        try:
+            if recalculate:
+                # One recalculation of the XLOOKUP/TEXTJOIN formulas for every write of the session
+                app.calculate()
+        finally:
+            app.calculation = calculation
+            app.screen_updating = screen_updating
+            app.enable_events = enable_events
+
+
+def split_cell(cell: str) -> Tuple[int, int]:
+    """
+    :param cell: A1-style address of a cell, e.g. 'A7'.
+    :return: Tuple(row, column), both 1-based.
+    """
+    column_letters, row = coordinate_from_string(cell)
+    return row, column_index_from_string(column_letters)
+
+
+def _to_cell_value(value: Any) -> Any:
+    # Excel cells hold no NaN or pandas types, missing values are empty cells the same as xlwings writes them
+    if value is None or (not isinstance(value, (list, tuple, dict)) and pd.isna(value)):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    if hasattr(value, 'item') and not isinstance(value, (str, datetime)):
+        return value.item()
+    return value
+
+
+def _text_before_space(worksheet_backend: 'OpenpyxlWorksheetBackend', match: Match) -> Optional[str]:
+    # TEXTBEFORE(C8," "): #N/A, read as an empty cell, when the text has no space
+    row, column = split_cell(match.group(1))
+    text = worksheet_backend._cell_value(row, column)
+    if not isinstance(text, str) or ' ' not in text:
+        return None
+    return text.split(' ', 1)[0]
+
+
+class OpenpyxlWorksheetBackend(WorksheetBackend):
+    """
+    Reads and writes a sheet of a workbook file loaded by openpyxl, without Excel.
+    Formulas are stored as written and are calculated when the file is next opened in Excel.
+
+    Reading a formula cell:
+        - The formulas the automation writes and reads back itself, e.g. the Vendor column of Transaction Details 2,
+          are calculated in Python (`_CALCULATED_FORMULAS`).
+        - Any other formula returns the value Excel last calculated and saved in the file, until the first write to the workbook;
+          after it the saved values may be out of date and the formula reads as an empty cell.
+    """
+
+    # Formula -> its calculation in Python, given the match of the formula
+    _CALCULATED_FORMULAS: List[Tuple[Pattern, Callable[['OpenpyxlWorksheetBackend', Match], Any]]] = [
+        (re.compile(r'=TEXTBEFORE\(([A-Z]+[0-9]+),\s*" "\)', re.IGNORECASE), _text_before_space),
+    ]
+
+    def __init__(self, sheet, values_sheet_getter: Callable[[], Any], values_invalidator: Optional[Callable[[], None]] = None):
+        self.sheet = sheet
+        self._values_sheet_getter = values_sheet_getter
+        self._values_invalidator = values_invalidator or (lambda: None)
+
+    def _cell_value(self, row: int, column: int) -> Any:
+        value = self.sheet.cell(row=row, column=column).value
+        if isinstance(value, str) and value.startswith('='):
+            for formula_regex, calculate in self._CALCULATED_FORMULAS:
+                match = formula_regex.fullmatch(value)
+                if match:
+                    return calculate(self, match)
+            values_sheet = self._values_sheet_getter()
+            return values_sheet.cell(row=row, column=column).value if values_sheet is not None else None
+        return value
+
+    def read_range(self, address: str) -> Any:
+        min_column, min_row, max_column, max_row = range_boundaries(address)
+        values = [[self._cell_value(row, column) for column in range(min_column, max_column + 1)] for row in range(min_row, max_row + 1)]
+        if len(values) == 1 and len(values[0]) == 1:
+            return values[0][0]
+        if len(values) == 1:
+            return values[0]
+        if all(len(row) == 1 for row in values):
+            return [row[0] for row in values]
+        return values
+
+    def _iter_table_rows(self, header_row: int, first_column: int, column_count: int) -> Iterator[List[Any]]:
+        row = header_row + 1
+        while row <= self.sheet.max_row:
+            values = [self._cell_value(row, column) for column in range(first_column, first_column + column_count)]
+            if all(value is None for value in values):
+                break
+            yield values
+            row += 1
+
+    def read_table(self, cell: str) -> pd.DataFrame:
+        header_row, first_column = split_cell(cell)
+        headers = []
+        column = first_column
+        while self.sheet.cell(row=header_row, column=column).value is not None:
+            headers.append(self.sheet.cell(row=header_row, column=column).value)
+            column += 1
+        return pd.DataFrame(list(self._iter_table_rows(header_row, first_column, len(headers))), columns=headers)
+
+    def write_values(self, cell: str, values: List[List[Any]]) -> None:
+        self._values_invalidator()
+        first_row, first_column = split_cell(cell)
+        for row_offset, row_values in enumerate(values):
+            for column_offset, value in enumerate(row_values):
+                # Assigned rather than passed to cell(), which ignores a None value and would leave a cleared cell as it was
+                self.sheet.cell(row=first_row + row_offset, column=first_column + column_offset).value = _to_cell_value(value)
+
+    def write_dataframe(self, cell: str, dataframe: pd.DataFrame, header: bool = True) -> None:
+        rows = dataframe.values.tolist()
+        if header:
+            rows = [list(dataframe.columns)] + rows
+        self.write_values(cell, rows)
+
+    def write_formulas(self, address: str, formulas: List[List[str]]) -> None:
+        self.write_values(address.split(':')[0], formulas)
+
+    def last_data_row(self, column: str) -> int:
+        column_index = column_index_from_string(column)
+        for row in range(self.sheet.max_row, 0, -1):
+            if self.sheet.cell(row=row, column=column_index).value is not None:
+                return row
+        return 0
+
+    def copy_range(self, address: str, destination: WorksheetBackend, destination_cell: str) -> None:
+        destination._values_invalidator()
+        min_column, min_row, max_column, max_row = range_boundaries(address)
+        destination_row, destination_column = split_cell(destination_cell)
+        for row in range(min_row, max_row + 1):
+            for column in range(min_column, max_column + 1):
+                value = self.sheet.cell(row=row, column=column).value
+                target_row, target_column = destination_row + row - min_row, destination_column + column - min_column
+                # Relative references move with the formula, the same as copying the range in Excel
+                if isinstance(value, str) and value.startswith('='):
+                    value = Translator(value, origin=f"{get_column_letter(column)}{row}").translate_formula(f"{get_column_letter(target_column)}{target_row}")
+                destination.sheet.cell(row=target_row, column=target_column).value = value
+
+    def resize_tables(self) -> None:
+        resize_tables(self.sheet)
+
+
+class OpenpyxlWorkbookBackend(WorkbookBackend):
+    """
+    Loads the workbook file with openpyxl, so the pipeline runs without Excel, e.g. on Linux batch nodes.
+    VBA macros can't run here; `run_macro` runs the Python equivalent registered under the macro name in `PYTHON_MACROS`.
+    """
+
+    def __init__(self, workbook_path: str):
+        super().__init__(workbook_path)
+        # keep_vba so saving an .xlsm keeps its macros for the runs that still use Excel
+        self.workbook = openpyxl.load_workbook(workbook_path, keep_vba=workbook_path.lower().endswith('.xlsm'))
+        self._values_workbook = None
+        # Set by the first write, the values Excel saved in the file may no longer be those of the formulas
+        self._values_out_of_date = False
+
+    def _get_values_sheet(self, name: str):
+        if self._values_out_of_date:
+            return None
+        # The values Excel last calculated are only in a second, data_only load of the file
+        if self._values_workbook is None:
+            self._values_workbook = openpyxl.load_workbook(self.workbook_path, data_only=True)
+        return self._values_workbook[name] if name in self._values_workbook.sheetnames else None
+
+    def _invalidate_values(self) -> None:
+        self._values_out_of_date = True
+        if self._values_workbook is not None:
+            self._values_workbook.close()
+            self._values_workbook = None
+
+    def _wrap(self, sheet) -> OpenpyxlWorksheetBackend:
+        return OpenpyxlWorksheetBackend(sheet, lambda: self._get_values_sheet(sheet.title), self._invalidate_values)
+
+    def sheets(self) -> Dict[str, WorksheetBackend]:
+        return {sheet.title: self._wrap(sheet) for sheet in self.workbook.worksheets}
+
+    def add_sheet(self, name: str) -> WorksheetBackend:
+        self._invalidate_values()
+        return self._wrap(self.workbook.create_sheet(name))
+
+    def delete_sheet(self, name: str) -> None:
+        self._invalidate_values()
+        del self.workbook[name]
+
+    def save(self, save_path: Optional[str] = None) -> None:
+        # openpyxl saves the formulas without values, a data_only load of the saved file has none either
+        self._invalidate_values()
+        self.workbook.save(save_path or self.workbook_path)
+
+    def close(self) -> None:
+        self.workbook.close()
+        if self._values_workbook is not None:
+            self._values_workbook.close()
+            self._values_workbook = None
+
+    def run_macro(self, macro_name: str, *macro_parameters: str) -> None:
+        if macro_name not in PYTHON_MACROS:
+            raise NotImplementedError(f"Macro '{macro_name}' has no Python equivalent for the openpyxl backend")
+        self._invalidate_values()
+        PYTHON_MACROS[macro_name](self, *macro_parameters)
+
+    def suspend_application_updates(self) -> None:
+        # No Excel application here, the formulas are calculated when the file is next opened in Excel
+        return None
+
+    def restore_application_updates(self, prior_state: None, recalculate: bool = True) -> None:
+        pass
+
+
+WORKBOOK_BACKENDS: Dict[str, Callable[[str], WorkbookBackend]] = {
+    'xlwings': XlwingsWorkbookBackend,
+    'openpyxl': OpenpyxlWorkbookBackend
+}
@@ -0,0 +1,66 @@
+from typing import Callable, Dict
+
+from openpyxl.utils.cell import range_boundaries, get_column_letter
+
+from utils.invoice_discovery import invoice_discovery
+
+# Python equivalents of the VBA macros of Template - Master.xlsm, run by OpenpyxlWorkbookBackend.run_macro where Excel isn't available
+INVOICES_WORKSHEET_NAME = "Invoices"
+TRANSACTION_DETAILS_2_WORKSHEET_NAME = "Transaction Details 2"
+HEADER_ROW = 7  # Headers are in row 7, data starts at row 8
+INVOICE_COLUMN_COUNT = 5  # 'File Name', 'File Path', 'Amount', 'Vendor', 'Date'
+
+
+def _last_data_row(sheet, column: int, header_row: int) -> int:
+    row = header_row
+    while sheet.cell(row=row + 1, column=column).value is not None:
+        row += 1
+    return row
+
+
+def resize_tables(sheet) -> None:
+    # A table always keeps at least one data row below its headers, the same as an Excel ListObject
+    for table in sheet.tables.values():
+        min_column, min_row, max_column, _ = range_boundaries(table.ref)
+        last_row = max(_last_data_row(sheet, min_column, min_row), min_row + 1)
+        table.ref = f"{get_column_letter(min_column)}{min_row}:{get_column_letter(max_column)}{last_row}"
+        if table.autoFilter is not None:
+            table.autoFilter.ref = table.ref
+
+
+def list_files_in_specific_order(workbook_backend, folder_path: str, sub_folder_name: str) -> None:
+    """
+    ListFilesInSpecificOrder: replace the rows of the Invoices worksheet with the name and path of every invoice pdf
+    in folder_path/sub_folder_name, then resize the worksheet's table to them.
+
+    :param workbook_backend: The OpenpyxlWorkbookBackend of Template - Master.xlsm.
+    :param folder_path: The invoices folder, macro_parameter_1.
+    :param sub_folder_name: The month's sub folder, macro_parameter_2.
+    :return: None
+    """
+    sheet = workbook_backend.workbook[INVOICES_WORKSHEET_NAME]
+    for row in range(HEADER_ROW + 1, sheet.max_row + 1):
+        for column in range(1, INVOICE_COLUMN_COUNT + 1):
+            sheet.cell(row=row, column=column).value = None
+
+    for row, (file_name, file_path) in enumerate(invoice_discovery.discover(folder_path, sub_folder_name), start=HEADER_ROW + 1):
+        sheet.cell(row=row, column=1, value=file_name)
+        sheet.cell(row=row, column=2, value=file_path)
+    resize_tables(sheet)
+
+
+def resize_table(workbook_backend) -> None:
+    """
+    ResizeTable: resize the table of the Transaction Details 2 worksheet to the rows written below its headers.
+
+    :param workbook_backend: The OpenpyxlWorkbookBackend of Template - Master.xlsm.
+    :return: None
+    """
+    resize_tables(workbook_backend.workbook[TRANSACTION_DETAILS_2_WORKSHEET_NAME])
+
+
+# Mapped by the macro names used in SystemConfigurations
+PYTHON_MACROS: Dict[str, Callable[..., None]] = {
+    'ListFilesInSpecificOrder': list_files_in_specific_order,
+    'ResizeTable': resize_table
+}
@@ -1,27 +1,96 @@
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
 import pandas as pd
+from openpyxl.utils.cell import coordinate_from_string
+
+from models.workbook_backends import WorksheetBackend
+from utils.instrumentation import instrumentation
 
 
 class Worksheet:
-    def __init__(self, name, sheet):
+    def __init__(self, name, backend: WorksheetBackend):
         self.name = name
-        self.sheet = sheet
+        self.backend = backend
         self.worksheet_dataframe = pd.DataFrame()
         self.strategy = None
+        # Column -> row of its last non-empty cell, resolved once and kept until the next write to the worksheet
+        self._last_data_rows: Dict[str, int] = {}
+
+    @property
+    def sheet(self):
+        # The library's own sheet object, only for code that is specific to one backend
+        return self.backend.sheet
 
     # We will assume whichever sheet we're interacting with Invoices, Transactions Details 2, and so on the sheet.range starts at 'A7' 6/19/2024
     def read_data_as_dataframe(self):
-        # Use xlwings to read data into a DataFrame, header True to interpret the first row as column headers for the dataframe, index=False to make sure the first column is not interpreted as an index column
-        dataframe = self.worksheet_dataframe = self.sheet.range('A7').options(pd.DataFrame, expand='table', header=True, index=False).value
+        # Read the table starting at 'A7' into a DataFrame, the first row as column headers and no index column
+        dataframe = self.worksheet_dataframe = self.backend.read_table('A7')
 
         if dataframe.empty:
             print("Could not read data from worksheet")
         else:
             return dataframe
 
+    def read_range(self, address: str) -> Any:
+        return self.backend.read_range(address)
+
+    def write_dataframe(self, cell: str, dataframe: pd.DataFrame, header: bool = True) -> None:
+        self.invalidate_data_extent()
+        self.backend.write_dataframe(cell, dataframe, header)
+
+    def write_values(self, cell: str, values: List[List[Any]]) -> None:
+        self.invalidate_data_extent()
+        self.backend.write_values(cell, values)
+
+    def write_formulas(self, address: str, formulas: List[List[str]]) -> None:
+        self.invalidate_data_extent()
+        self.backend.write_formulas(address, formulas)
+
+    def last_data_row(self, column: str = 'A') -> int:
+        if column not in self._last_data_rows:
+            self._last_data_rows[column] = self.backend.last_data_row(column)
+        return self._last_data_rows[column]
+
+    def invalidate_data_extent(self) -> None:
+        # Called before every write, and by Workbook after a macro has changed its sheets
+        self._last_data_rows.clear()
+
+    def data_range(self, first_cell: str, last_column: str, key_column: Optional[str] = None) -> Optional[str]:
+        """
+        The address of the data from first_cell across to last_column, down to the last non-empty row of key_column,
+        instead of down to the sheet's last row.
+
+        :param first_cell: The top left cell, e.g. 'A8'.
+        :param last_column: The rightmost column, e.g. 'K'.
+        :param key_column: The column that is filled on every data row, the first column of first_cell when None.
+        :return: The address e.g. 'A8:K250', None when there is no data below first_cell.
+        """
+        first_column, first_row = coordinate_from_string(first_cell)
+        last_row = self.last_data_row(key_column or first_column)
+        if last_row < first_row:
+            return None
+        return f"{first_cell}:{last_column}{last_row}"
+
+    def read_data_range(self, first_cell: str, last_column: str, key_column: Optional[str] = None) -> Any:
+        address = self.data_range(first_cell, last_column, key_column)
+        return self.read_range(address) if address is not None else None
+
+    def copy_range(self, address: str, destination: 'Worksheet', destination_cell: str) -> None:
+        destination.invalidate_data_extent()
+        self.backend.copy_range(address, destination.backend, destination_cell)
+
+    def copy_data_range(self, first_cell: str, last_column: str, destination: 'Worksheet', destination_cell: str, key_column: Optional[str] = None) -> None:
+        address = self.data_range(first_cell, last_column, key_column)
+        if address is not None:
+            self.copy_range(address, destination, destination_cell)
+
+    def resize_tables(self) -> None:
+        # The rows written below a table's headers only become part of the table once it is resized
+        self.backend.resize_tables()
+
     def set_strategy(self, strategy):
         self.strategy = strategy
 
     def update_sheet(self, data_df) -> None:
-        self.strategy.update_worksheet(self, data_df)
+        with instrumentation.span(type(self.strategy).__name__, 'worksheet_update', worksheet=self.name):
+            self.strategy.update_worksheet(self, data_df)
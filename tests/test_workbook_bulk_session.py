@@ -0,0 +1,82 @@
+import pytest
+
+import models.workbook_backends as workbook_backends
+from models.workbook import Workbook
+
+
+class StubApp:
+    """The Excel application settings a bulk session changes, and the recalculations it asks for."""
+
+    def __init__(self):
+        self.calculation = 'automatic'
+        self.screen_updating = True
+        self.enable_events = True
+        self.calculate_calls = 0
+
+    def calculate(self):
+        self.calculate_calls += 1
+
+    def state(self):
+        return self.calculation, self.screen_updating, self.enable_events
+
+
+class StubBook:
+
+    def __init__(self, app: StubApp):
+        self.app = app
+        self.name = 'Template - Master.xlsm'
+        self.sheets = []
+
+
+@pytest.fixture
+def app(monkeypatch) -> StubApp:
+    app = StubApp()
+    monkeypatch.setattr(workbook_backends.xw, 'Book', lambda workbook_path: StubBook(app))
+    return app
+
+
+@pytest.fixture
+def workbook(app) -> Workbook:
+    return Workbook('Template - Master.xlsm', backend='xlwings')
+
+
+def test_suspends_updates_inside_the_session(app, workbook):
+    with workbook.bulk_session():
+        assert app.state() == ('manual', False, False)
+
+
+def test_restores_prior_state_and_recalculates_once_after_a_normal_exit(app, workbook):
+    with workbook.bulk_session():
+        pass
+
+    assert app.state() == ('automatic', True, True)
+    assert app.calculate_calls == 1
+
+
+def test_nested_session_restores_and_recalculates_only_at_the_outermost_exit(app, workbook):
+    with workbook.bulk_session():
+        with workbook.bulk_session():
+            pass
+        assert app.state() == ('manual', False, False)
+        assert app.calculate_calls == 0
+
+    assert app.state() == ('automatic', True, True)
+    assert app.calculate_calls == 1
+
+
+def test_restores_prior_state_without_recalculating_when_the_block_raises(app, workbook):
+    with pytest.raises(RuntimeError):
+        with workbook.bulk_session():
+            raise RuntimeError("write failed")
+
+    assert app.state() == ('automatic', True, True)
+    assert app.calculate_calls == 0
+
+
+def test_restores_a_prior_state_other_than_the_defaults(app, workbook):
+    app.calculation, app.screen_updating, app.enable_events = 'semiautomatic', False, True
+
+    with workbook.bulk_session():
+        pass
+
+    assert app.state() == ('semiautomatic', False, True)
@@ -0,0 +1,74 @@
+import re
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional, List, Tuple, Pattern
+
+import dateparser
+
+
+class DateParsingService:
+    """
+    The `DateParsingService` class parses the date strings found in invoices and the statement window.
+
+    Each string is first tried against strict `strptime` formats matching the shapes of `GeneralPattern._DATE_PATTERNS`
+    (and the ISO dates written back by `PDF.date`), which are orders of magnitude faster than `dateparser.parse`.
+    Only strings that don't fit any of those shapes fall back to dateparser.
+    Results, including failed parses, are memoized in a bounded LRU cache since the same dates repeat across invoices.
+
+    Methods
+        - `parse(date_text)` -> Optional[datetime]: Parses the date string, returns None if it can't be parsed.
+        - `parse_window(start_date, end_date)` -> Tuple[datetime, datetime]: Parses the statement start and end date.
+
+    Example usage
+    ```
+    start_date, end_date = date_parsing_service.parse_window("01/21/2024", "2/21/2024")
+    parsed_date = date_parsing_service.parse("Feb 6, 2024")
+    ```
+    """
+
+    # Shape of the date string -> strptime formats tried for it, in order; month-first like dateparser's default
+    _STRICT_FORMATS: List[Tuple[Pattern, Tuple[str, ...]]] = [
+        (re.compile(r'\d{1,2}/\d{1,2}/\d{4}'), ('%m/%d/%Y',)),
+        (re.compile(r'\d{1,2}/\d{1,2}/\d{2}'), ('%m/%d/%y',)),
+        (re.compile(r'\d{1,2}-\d{1,2}-\d{4}'), ('%m-%d-%Y',)),
+        (re.compile(r'\d{1,2}-\d{1,2}-\d{2}'), ('%m-%d-%y',)),
+        (re.compile(r'\d{1,2}[/-][A-Za-z]{3}[/-]\d{4}'), ('%d-%b-%Y', '%d/%b/%Y')),
+        (re.compile(r'\d{1,2}[/-][A-Za-z]{3}[/-]\d{2}'), ('%d-%b-%y', '%d/%b/%y')),
+        (re.compile(r'[A-Za-z]{3}\.? \d{1,2}, \d{4}'), ('%b %d, %Y', '%b. %d, %Y')),
+        (re.compile(r'[A-Za-z]+ \d{1,2}, \d{4}'), ('%B %d, %Y',)),
+        (re.compile(r'\d{4}-\d{2}-\d{2}'), ('%Y-%m-%d',))
+    ]
+
+    def __init__(self, cache_size: int = 4096):
+        self._parse_cached = lru_cache(maxsize=cache_size)(self._parse_uncached)
+
+    def _parse_strict(self, date_text: str) -> Optional[datetime]:
+        for shape, date_formats in self._STRICT_FORMATS:
+            if shape.fullmatch(date_text):
+                for date_format in date_formats:
+                    try:
+                        return datetime.strptime(date_text, date_format)
+                    except ValueError:
+                        continue
+        return None
+
+    def _parse_uncached(self, date_text: str) -> Optional[datetime]:
+        # Date patterns match any whitespace, e.g. a line break inside "Feb\n6, 2024"
+        normalized_text = ' '.join(date_text.split())
+        parsed_date = self._parse_strict(normalized_text)
+        if parsed_date is None:
+            parsed_date = dateparser.parse(date_text)
+        return parsed_date
+
+    def parse(self, date_text: str) -> Optional[datetime]:
+        return self._parse_cached(date_text)
+
+    def parse_window(self, start_date: str, end_date: str) -> Tuple[datetime, datetime]:
+        return self.parse(start_date), self.parse(end_date)
+
+    def cache_info(self):
+        return self._parse_cached.cache_info()
+
+
+# Shared by every processor and PDF so the cache is filled once per run. ONLY ONE INSTANCE
+date_parsing_service = DateParsingService()
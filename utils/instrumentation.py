@@ -0,0 +1,233 @@
+import json
+import os
+import threading
+import time
+from contextlib import ContextDecorator
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from tabulate import tabulate
+
+
+class SpanEvent(NamedTuple):
+    name: str
+    category: str
+    start_time: float  # Wall clock, time.time(), so events of worker processes line up with the ones of this process
+    duration: float  # Seconds
+    process_id: int
+    thread_id: int
+    args: Dict[str, Any]
+
+
+class SpanStats:
+    __slots__ = ('category', 'calls', 'total_seconds', 'max_seconds')
+
+    def __init__(self, category: str):
+        self.category = category
+        self.calls = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def add(self, duration: float) -> None:
+        self.calls += 1
+        self.total_seconds += duration
+        self.max_seconds = max(self.max_seconds, duration)
+
+
+class Span(ContextDecorator):
+    """
+    A timed block of a run, used as a context manager or as a function decorator.
+    Every span adds its duration to the statistics of its name; traced spans are also kept as events for the Chrome trace.
+    """
+
+    def __init__(self, instrumentation: 'Instrumentation', name: str, category: str, trace: bool, args: Dict[str, Any]):
+        self._instrumentation = instrumentation
+        self.name = name
+        self.category = category
+        self.trace = trace
+        self.args = args
+        self._start_time = 0.0
+        self._start_counter = 0.0
+
+    def _recreate_cm(self):
+        # A decorated function can run nested or on several threads, every call gets its own span
+        return Span(self._instrumentation, self.name, self.category, self.trace, self.args)
+
+    def __enter__(self) -> 'Span':
+        self._start_time = time.time()
+        self._start_counter = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        self._instrumentation.record_span(self.name, self.category, self._start_time, time.perf_counter() - self._start_counter, self.trace, self.args)
+        return False
+
+
+class _DisabledSpan(ContextDecorator):
+
+    def __enter__(self) -> '_DisabledSpan':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        return False
+
+
+class Instrumentation:
+    """
+    The `Instrumentation` class records where a run spends its time: spans time the stages, the extraction of every pdf
+    and the matching and update strategies, counters count e.g. the regex attempts per pattern and the Excel COM calls.
+
+    Spans of the same name are aggregated into calls, total and max seconds. Spans created with `trace=True` are also kept
+    as events and written as a Chrome trace (chrome://tracing or https://ui.perfetto.dev), so hot inner spans,
+    e.g. every strategy attempt of every invoice, can be aggregated without growing the trace.
+    Worker processes record into their own instance and hand `export()` back to be `merge`d into this one.
+
+    Attributes
+        - `enabled`: False turns every span and counter into a no-op.
+
+    Methods
+        - `span(name, category, trace, **args)` -> Span: Context manager or decorator timing a block.
+        - `count(name, amount)` -> None: Adds to a counter.
+        - `count_many(amounts)` -> None: Adds to several counters at once.
+        - `reset()` -> None: Clears everything recorded so far.
+        - `export()` -> dict: Everything recorded, picklable, for `merge`.
+        - `merge(exported)` -> None: Adds what another instance recorded, e.g. a worker process.
+        - `summary()` -> dict: Span statistics and counters, JSON serializable.
+        - `print_summary()` -> None: Prints the span statistics and counters as tables.
+        - `write_summary_json(path)` -> None: Writes `summary()` as JSON.
+        - `write_chrome_trace(path)` -> None: Writes the traced spans in the Chrome trace event format.
+
+    Example usage
+    ```
+    with instrumentation.span('process_invoices_worksheet', 'stage'):
+        ...
+    instrumentation.count('excel_com_calls')
+    instrumentation.print_summary()
+    ```
+    """
+
+    _DISABLED_SPAN = _DisabledSpan()
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._origin_time = time.time()
+            self._span_stats: Dict[str, SpanStats] = {}
+            self._events: List[SpanEvent] = []
+            self._counters: Dict[str, int] = {}
+
+    def span(self, name: str, category: str = 'stage', trace: bool = True, **args: Any):
+        """
+        :param name: Name of the span, spans of the same name are aggregated.
+        :param category: Category of the span, e.g. 'stage', 'pdf', 'matching', 'worksheet_update'.
+        :param trace: Whether the span is also kept as an event of the Chrome trace.
+        :param args: Extra data of the traced event, e.g. the pdf name.
+        :return: Span, usable as a context manager or decorator.
+        """
+        if not self.enabled:
+            return self._DISABLED_SPAN
+        return Span(self, name, category, trace, args)
+
+    def record_span(self, name: str, category: str, start_time: float, duration: float, trace: bool = True, args: Optional[Dict[str, Any]] = None) -> None:
+        # Spans decorating functions are created once at import, so a later disable is checked here too
+        if not self.enabled:
+            return
+        with self._lock:
+            span_stats = self._span_stats.get(name)
+            if span_stats is None:
+                span_stats = self._span_stats[name] = SpanStats(category)
+            span_stats.add(duration)
+            if trace:
+                self._events.append(SpanEvent(name, category, start_time, duration, os.getpid(), threading.get_ident(), args or {}))
+
+    def count(self, name: str, amount: int = 1) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def count_many(self, amounts: Dict[str, int]) -> None:
+        # Several counters under one lock, e.g. every regex attempt of a search
+        if not self.enabled:
+            return
+        with self._lock:
+            for name, amount in amounts.items():
+                self._counters[name] = self._counters.get(name, 0) + amount
+
+    def export(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'span_stats': {name: (stats.category, stats.calls, stats.total_seconds, stats.max_seconds) for name, stats in self._span_stats.items()},
+                'events': list(self._events),
+                'counters': dict(self._counters)
+            }
+
+    def merge(self, exported: Dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            for name, (category, calls, total_seconds, max_seconds) in exported['span_stats'].items():
+                span_stats = self._span_stats.get(name)
+                if span_stats is None:
+                    span_stats = self._span_stats[name] = SpanStats(category)
+                span_stats.calls += calls
+                span_stats.total_seconds += total_seconds
+                span_stats.max_seconds = max(span_stats.max_seconds, max_seconds)
+            self._events.extend(SpanEvent(*event) for event in exported['events'])
+            for name, amount in exported['counters'].items():
+                self._counters[name] = self._counters.get(name, 0) + amount
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'spans': {
+                    name: {'category': stats.category, 'calls': stats.calls, 'total_seconds': stats.total_seconds, 'max_seconds': stats.max_seconds}
+                    for name, stats in sorted(self._span_stats.items(), key=lambda item: -item[1].total_seconds)
+                },
+                'counters': dict(sorted(self._counters.items()))
+            }
+
+    def print_summary(self) -> None:
+        summary = self.summary()
+        span_rows = [
+            [name, stats['category'], stats['calls'], f"{stats['total_seconds']:.3f}", f"{1000 * stats['total_seconds'] / stats['calls']:.2f}", f"{1000 * stats['max_seconds']:.2f}"]
+            for name, stats in summary['spans'].items()
+        ]
+        print("Run Timing:")
+        print(tabulate(span_rows, headers=["Span", "Category", "Calls", "Total s", "Mean ms", "Max ms"], tablefmt='psql'))
+        if summary['counters']:
+            print("Run Counters:")
+            print(tabulate(list(summary['counters'].items()), headers=["Counter", "Value"], tablefmt='psql'))
+        print("\n")
+
+    def write_summary_json(self, path: str) -> None:
+        with open(path, 'w', encoding='utf-8') as summary_file:
+            json.dump(self.summary(), summary_file, indent=2)
+
+    def write_chrome_trace(self, path: str) -> None:
+        with self._lock:
+            events = list(self._events)
+            counters = dict(self._counters)
+            origin_time = min([self._origin_time] + [event.start_time for event in events])
+        trace_events = [
+            {
+                'name': event.name,
+                'cat': event.category,
+                'ph': 'X',  # Complete event, a start and a duration
+                'ts': (event.start_time - origin_time) * 1_000_000,
+                'dur': event.duration * 1_000_000,
+                'pid': event.process_id,
+                'tid': event.thread_id,
+                'args': {key: str(value) for key, value in event.args.items()}
+            }
+            for event in events
+        ]
+        with open(path, 'w', encoding='utf-8') as trace_file:
+            json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms', 'otherData': {'counters': counters}}, trace_file)
+
+
+# Shared by the orchestrator, the managers, the strategies and the workbook backends so a run is recorded in one place. ONLY ONE INSTANCE
+instrumentation = Instrumentation()
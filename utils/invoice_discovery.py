@@ -0,0 +1,94 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, NamedTuple, Tuple
+
+
+class InvoiceFileEntry(NamedTuple):
+    file_name: str
+    file_path: str
+    modified_time: float
+    size: int
+
+
+class InvoiceDiscovery:
+    """
+    The `InvoiceDiscovery` class lists the invoice pdfs of a month's folder in Python, replacing the `ListFilesInSpecificOrder`
+    VBA macro that walks the share file by file inside Excel and writes every file to the Invoices worksheet first.
+
+    The folder is `os.path.join(macro_parameter_1, macro_parameter_2)`, the same two parameters the macro takes.
+    The directory is listed with `os.scandir`, and the `stat` of every pdf, which is a network round-trip on the share,
+    runs on a thread pool. With `recursive` the sub folders are listed on the same pool too.
+    Invoices are ordered by the macro's rules: oldest modified first, then by file name.
+
+    Attributes
+        - `max_workers`: Number of threads listing folders and reading file modification times.
+        - `recursive`: Whether pdfs in sub folders of the month's folder are listed too.
+
+    Methods
+        - `discover(macro_parameter_1, macro_parameter_2)` -> Iterator[Tuple[str, str]]: (File Name, File Path) of every invoice pdf, in order.
+
+    Example usage
+    ```
+    invoice_discovery = InvoiceDiscovery(max_workers=16)
+    pdf_proc_mng.populate_pdf_proc_mng_df_from_records(invoice_discovery.discover(macro_parameter_1, macro_parameter_2), xlookup_table_worksheet)
+    ```
+    """
+
+    _PDF_EXTENSION = '.pdf'
+
+    def __init__(self, max_workers: int = 16, recursive: bool = False):
+        self.max_workers = max_workers
+        self.recursive = recursive
+
+    @classmethod
+    def _list_folder(cls, folder_path: str) -> Tuple[List[os.DirEntry], List[str]]:
+        with os.scandir(folder_path) as entries:
+            pdf_entries, sub_folder_paths = [], []
+            for entry in entries:
+                if entry.is_file() and entry.name.lower().endswith(cls._PDF_EXTENSION):
+                    pdf_entries.append(entry)
+                elif entry.is_dir():
+                    sub_folder_paths.append(entry.path)
+        return pdf_entries, sub_folder_paths
+
+    @staticmethod
+    def _to_file_entry(entry: os.DirEntry) -> InvoiceFileEntry:
+        entry_stat = entry.stat()
+        return InvoiceFileEntry(entry.name, entry.path, entry_stat.st_mtime, entry_stat.st_size)
+
+    def list_invoice_files(self, folder_path: str) -> List[InvoiceFileEntry]:
+        """
+        List the invoice pdfs of the folder, oldest modified first and by name when modified at the same time.
+
+        :param folder_path: The folder of the month's invoices.
+        :return: List of InvoiceFileEntry in order.
+        """
+        file_entries: List[InvoiceFileEntry] = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending_folders = [folder_path]
+            while pending_folders:
+                listings = list(executor.map(self._list_folder, pending_folders))
+                pending_folders = []
+                for pdf_entries, sub_folder_paths in listings:
+                    file_entries.extend(executor.map(self._to_file_entry, pdf_entries))
+                    if self.recursive:
+                        pending_folders.extend(sub_folder_paths)
+
+        file_entries.sort(key=lambda file_entry: (file_entry.modified_time, file_entry.file_name))
+        return file_entries
+
+    def discover(self, macro_parameter_1: str, macro_parameter_2: str) -> Iterator[Tuple[str, str]]:
+        """
+        Yield the (File Name, File Path) of every invoice pdf of the month's folder in order.
+        Nothing is yielded until the whole folder is listed, the oldest pdf is only known once every pdf is stat'ed.
+
+        :param macro_parameter_1: The invoices folder, e.g. r"H:\\Amex Automation\\t3nas\\APPS\\".
+        :param macro_parameter_2: The month's sub folder, e.g. "[02] Feb 2024".
+        :return: Iterator of (File Name, File Path).
+        """
+        for file_entry in self.list_invoice_files(os.path.join(macro_parameter_1, macro_parameter_2)):
+            yield file_entry.file_name, file_entry.file_path
+
+
+# Shared with the Python equivalent of the macro in models.workbook_macros so both list the invoices the same way. ONLY ONE INSTANCE
+invoice_discovery = InvoiceDiscovery()
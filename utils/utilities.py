@@ -1,4 +1,7 @@
+import json
+import logging
 import time
+from typing import Optional
 
 import pandas as pd
 
@@ -6,12 +9,88 @@ from tabulate import tabulate
 from tqdm import tqdm
 
 
+class ProgressReporting:
+    """
+    The `ProgressReporting` class holds how the run reports its progress, shared by every `ProgressTrackingMixin` and `print_dataframe`.
+
+    Modes
+        - 'bar': tqdm progress bars redrawn at most every `min_interval_seconds`, and the DataFrame tables printed.
+        - 'log': No bars or tables; one JSON line per task start, every `log_interval_seconds` and completion,
+          and one per DataFrame with its row count, to the 'amex_automation.progress' logger, for unattended batch runs.
+        - 'off': Nothing is reported.
+
+    Methods
+        - `set_mode(mode, log_path)` -> None: Switches the mode, with log_path the 'log' mode lines are appended to that file.
+        - `log(event, **fields)` -> None: Writes a JSON line to the progress logger.
+
+    Example usage
+    ```
+    progress_reporting.set_mode('log', 'H:/Amex Automation/progress.log')
+    ```
+    """
+
+    MODES = ('bar', 'log', 'off')
+
+    def __init__(self, mode: str = 'bar', min_interval_seconds: float = 0.1, log_interval_seconds: float = 5.0):
+        self.mode: str = 'bar'
+        self.set_mode(mode)
+        self.min_interval_seconds: float = min_interval_seconds
+        self.log_interval_seconds: float = log_interval_seconds
+        self.logger = logging.getLogger('amex_automation.progress')
+        self._log_handler: Optional[logging.Handler] = None
+
+    def set_mode(self, mode: str, log_path: Optional[str] = None) -> None:
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown progress mode '{mode}', expected one of {self.MODES}")
+        self.mode = mode
+        if log_path is not None:
+            if self._log_handler is not None:
+                self.logger.removeHandler(self._log_handler)
+                self._log_handler.close()
+            self._log_handler = logging.FileHandler(log_path, encoding='utf-8')
+            self.logger.addHandler(self._log_handler)
+            self.logger.setLevel(logging.INFO)
+
+    def log(self, event: str, **fields) -> None:
+        self.logger.info(json.dumps({'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'event': event, **fields}, default=str))
+
+
+# Shared by every progress tracker and print_dataframe call so one switch quiets the whole run. ONLY ONE INSTANCE
+progress_reporting = ProgressReporting()
+
+
 def print_dataframe(df: pd.DataFrame, message: str):
+    if progress_reporting.mode == 'log':
+        progress_reporting.log('dataframe', message=message, rows=len(df.index))
+    if progress_reporting.mode != 'bar':
+        return
     print(message)
     print(tabulate(df, headers='keys', tablefmt='psql'))
     print("\n")
 
 
+class _LogProgress:
+    """Progress of one task written as JSON lines, with the update and close methods of a tqdm bar."""
+
+    def __init__(self, total_steps: int, description: str):
+        self.total_steps = total_steps
+        self.description = description
+        self.completed_steps = 0
+        self._start = self._last_logged = time.perf_counter()
+        progress_reporting.log('progress_start', task=description, total=total_steps)
+
+    def update(self, steps: int) -> None:
+        self.completed_steps += steps
+        now = time.perf_counter()
+        if now - self._last_logged >= progress_reporting.log_interval_seconds:
+            self._last_logged = now
+            progress_reporting.log('progress', task=self.description, completed=self.completed_steps, total=self.total_steps, elapsed_seconds=round(now - self._start, 3))
+
+    def close(self) -> None:
+        progress_reporting.log('progress_complete', task=self.description, completed=self.completed_steps, total=self.total_steps,
+                               elapsed_seconds=round(time.perf_counter() - self._start, 3))
+
+
 class ProgressTrackingMixin:
 
     def __init__(self, **kwargs):
@@ -20,16 +99,18 @@ class ProgressTrackingMixin:
 
     def start_progress_tracking(self, total_steps: int, description: str = ""):
         if self.progress_bar is None:
-            self.progress_bar = tqdm(total=total_steps, desc=description, bar_format='{l_bar}{bar}|{r_bar}{bar}')
+            if progress_reporting.mode == 'bar':
+                # Redraws are throttled by time, so thousands of steps cost a few redraws instead of one each
+                self.progress_bar = tqdm(total=total_steps, desc=description, bar_format='{l_bar}{bar}|{r_bar}{bar}', mininterval=progress_reporting.min_interval_seconds)
+            elif progress_reporting.mode == 'log':
+                self.progress_bar = _LogProgress(total_steps, description)
 
     def update_progress(self):
         steps: int = 1
         if self.progress_bar is not None:
             self.progress_bar.update(steps)
-            time.sleep(0.005)
 
     def complete_progress(self):
         if self.progress_bar is not None:
             self.progress_bar.close()
             self.progress_bar = None
-            time.sleep(1)